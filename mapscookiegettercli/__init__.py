@@ -32,7 +32,8 @@ Import all parts from mapscookiegettercli here
    http://google.github.io/styleguide/pyguide.html
 """
 from ._version import __version__
-from .library.cookiegetter import CookieGetter
+from .library.cookiegetter import CookieGetter, harvest
+from .library.session import HarvestResult
 
 __author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
 __docformat__ = '''google'''
@@ -48,3 +49,5 @@ assert __version__
 
 # assert objects
 assert CookieGetter
+assert harvest
+assert HarvestResult
@@ -36,6 +36,8 @@ from .chrome import Chrome
 from .firefox import Firefox
 from .ie import IE
 from .edge import Edge
+from .service import SharedChromeDriverService
+from .devtools import DevToolsChrome
 
 __author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
 __docformat__ = '''google'''
@@ -52,3 +54,5 @@ assert Chrome
 assert Firefox
 assert IE
 assert Edge
+assert SharedChromeDriverService
+assert DevToolsChrome
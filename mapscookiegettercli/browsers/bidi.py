@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: bidi.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+bidi package
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+"""
+
+import json
+import logging
+from itertools import count
+from queue import Queue, Empty
+from threading import Event, Lock, Thread
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException, TimeoutException
+from selenium.webdriver.remote.command import Command
+
+from mapscookiegettercli.mapscookiegettercliexceptions import WebSocketClosed
+from .websocket import WebSocket
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''bidi'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+NAVIGATION_EVENTS = ('browsingContext.load',
+                     'browsingContext.domContentLoaded',
+                     'browsingContext.fragmentNavigated',
+                     'network.responseCompleted')
+
+COMMAND_TIMEOUT = 30
+
+
+def webdriver_cookie(bidi_cookie):
+    """Converts a cookie as returned by the bidi storage module to the webdriver cookie format
+
+    Args:
+        bidi_cookie (dict): The bidi cookie
+
+    Returns:
+        dict: The cookie in the format returned by the webdriver get_cookies call
+
+    """
+    value = bidi_cookie.get('value', {})
+    cookie = {'name': bidi_cookie.get('name'),
+              'value': value.get('value', '') if isinstance(value, dict) else value,
+              'domain': bidi_cookie.get('domain'),
+              'path': bidi_cookie.get('path', '/'),
+              'secure': bidi_cookie.get('secure', False),
+              'httpOnly': bidi_cookie.get('httpOnly', False)}
+    if bidi_cookie.get('expiry'):
+        cookie['expiry'] = int(bidi_cookie['expiry'])
+    return cookie
+
+
+class BiDiConnection:  # pylint: disable=too-many-instance-attributes
+    """A webdriver bidi connection dispatching command results and pushing events to listeners"""
+
+    def __init__(self, url):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self._websocket = WebSocket(url)
+        self._ids = count(1)
+        self._pending = {}
+        self._listeners = []
+        self._lock = Lock()
+        self._closed = False
+        self._reader = Thread(target=self._read_messages, daemon=True)
+        self._reader.start()
+
+    def _read_messages(self):
+        try:
+            while True:
+                self._dispatch(json.loads(self._websocket.receive()))
+        except (WebSocketClosed, OSError, ValueError):
+            self._logger.debug('Bidi connection closed.')
+        self._closed = True
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for queue in pending.values():
+            queue.put(None)
+
+    def _dispatch(self, message):
+        if message.get('type') == 'event' or 'id' not in message:
+            for listener in list(self._listeners):
+                listener(message)
+            return
+        with self._lock:
+            queue = self._pending.pop(message['id'], None)
+        if queue is not None:
+            queue.put(message)
+
+    def add_listener(self, listener):
+        """Registers a callable that receives every event message"""
+        self._listeners.append(listener)
+
+    def send(self, method, params=None, timeout=COMMAND_TIMEOUT):
+        """Sends a bidi command and waits for its result
+
+        Args:
+            method (str): The bidi method
+            params (dict): The parameters of the method
+            timeout (int): The number of seconds to wait for the result
+
+        Returns:
+            dict: The result of the command
+
+        Raises:
+            WebDriverException: If the command failed or the connection is closed
+
+        """
+        if self._closed:
+            raise WebDriverException('Bidi connection is closed.')
+        message = {'id': next(self._ids), 'method': method, 'params': params or {}}
+        queue = Queue(maxsize=1)
+        with self._lock:
+            self._pending[message['id']] = queue
+        try:
+            self._websocket.send(json.dumps(message))
+            response = queue.get(timeout=timeout)
+        except OSError as error:
+            raise WebDriverException('Bidi connection is closed.') from error
+        except Empty as error:
+            raise TimeoutException('No response for {} in {} seconds.'.format(method, timeout)) from error
+        finally:
+            with self._lock:
+                self._pending.pop(message['id'], None)
+        if response is None:
+            raise WebDriverException('Bidi connection is closed.')
+        if response.get('type') == 'error' or 'error' in response:
+            raise WebDriverException('{} failed: {}'.format(method, response.get('message', response['error'])))
+        return response.get('result', {})
+
+    def close(self):
+        """Closes the connection"""
+        self._websocket.close()
+
+
+class BiDiSession:
+    """Mixin for selenium drivers requesting a bidi websocket and using it when the driver provides one
+
+    If the driver does not return a websocket url the classic protocol is used transparently, the navigation
+    wait degrades to polling and cookies are read per domain.
+    """
+
+    bidi = None
+    _navigated = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connect_bidi()
+
+    def execute(self, driver_command, params=None):
+        """Executes a driver command, asking for a bidi websocket url in the capabilities of a new session"""
+        if driver_command == Command.NEW_SESSION and params and 'capabilities' in params:
+            params['capabilities'].setdefault('alwaysMatch', {})['webSocketUrl'] = True
+        return super().execute(driver_command, params)
+
+    def _connect_bidi(self):
+        url = (self.capabilities or {}).get('webSocketUrl')
+        if not isinstance(url, str):
+            LOGGER.info('Driver does not support webdriver bidi, using the classic protocol.')
+            return
+        try:
+            self.bidi = BiDiConnection(url)
+            self._navigated = Event()
+            self.bidi.add_listener(self._on_event)
+            self.bidi.send('session.subscribe', {'events': list(NAVIGATION_EVENTS)})
+            LOGGER.info('Connected to webdriver bidi at %s.', url)
+        except (WebSocketClosed, WebDriverException, OSError, ValueError):
+            LOGGER.warning('Could not connect to webdriver bidi at %s, using the classic protocol.', url)
+            self.bidi = None
+
+    def _on_event(self, message):
+        if message.get('method') in NAVIGATION_EVENTS:
+            self._navigated.set()
+
+    def wait_for_navigation(self, timeout=0.5):
+        """Blocks until the browser navigates or a response completes, or until the timeout expires
+
+        Args:
+            timeout (float): The maximum number of seconds to wait
+
+        Returns:
+            bool: True if a navigation event was received, False otherwise
+
+        """
+        if self.bidi is None:
+            Event().wait(timeout)
+            return False
+        received = self._navigated.wait(timeout)
+        self._navigated.clear()
+        return received
+
+    def get_cookies(self):
+        """Retrieves the cookies of all domains over bidi or of the current domain over the classic protocol"""
+        if self.bidi is None:
+            return super().get_cookies()
+        result = self.bidi.send('storage.getCookies', {})
+        return [webdriver_cookie(cookie) for cookie in result.get('cookies', [])]
+
+    def quit(self):
+        """Closes the bidi connection and the browser"""
+        if self.bidi is not None:
+            self.bidi.close()
+        super().quit()
+
+
+class BiDiChrome(BiDiSession, webdriver.Chrome):  # pylint: disable=abstract-method
+    """A selenium chrome driver with webdriver bidi support"""
+
+
+class BiDiFirefox(BiDiSession, webdriver.Firefox):  # pylint: disable=abstract-method
+    """A selenium firefox driver with webdriver bidi support"""
@@ -36,6 +36,11 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.options import Options
 from selenium import webdriver
 
+from .bidi import BiDiChrome
+from .devtools import DevToolsChrome
+from .service import AttachedChrome
+from .userdata import UserDataDirectory
+
 __author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
 __docformat__ = '''google'''
 __date__ = '''04-03-2019'''
@@ -50,24 +55,75 @@ LOGGER_BASENAME = '''chrome'''
 LOGGER = logging.getLogger(LOGGER_BASENAME)
 LOGGER.addHandler(logging.NullHandler())
 
+CHROME_ARGUMENTS = ('--disable-extensions',
+                    '--profile-directory=Default',
+                    '--disable-plugins-discovery',
+                    '--start-maximized',
+                    '--disable-infobars')
+
+
+def chrome_arguments(user_data):
+    """The command line arguments of a chrome running on the user data directory of its session
+
+    Chrome is not started incognito since that ignores the disk cache directory and with it the http cache seed,
+    the fresh user data directory of every session already keeps the sessions isolated.
+
+    Args:
+        user_data (UserDataDirectory): The user data directory of the session
+
+    Returns:
+        tuple: The command line arguments
+
+    """
+    return CHROME_ARGUMENTS + ('--user-data-dir={}'.format(user_data),
+                               '--disk-cache-dir={}'.format(user_data.cache_path),
+                               '--disk-cache-size={}'.format(user_data.max_size))
+
 
 class Chrome:  # pylint: disable=too-few-public-methods
-    """Bootstraps a chrome selenium driver with the required settings"""
+    """Bootstraps a chrome selenium driver with the required settings
+
+    If a shared driver service is provided the driver attaches to it instead of starting its own chromedriver.
+    With the devtools engine chrome is driven directly over the devtools protocol without selenium or chromedriver,
+    with the bidi engine selenium also opens a webdriver bidi connection for navigation events.
+    The user data directory of the session is created under user_data_root and removed when the driver quits,
+    its http cache is copied from http_cache_seed if provided.
+    """
 
-    def __new__(cls):
+    def __new__(cls, service=None, engine='selenium', user_data_root=None, http_cache_seed=None):
         logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
                                                 suffix='bootstrapper')
         logger = logging.getLogger(logger_name)
-        options = Options()
-        options.add_argument('--disable-extensions')
-        options.add_argument('--profile-directory=Default')
-        options.add_argument('--incognito')
-        options.add_argument('--disable-plugins-discovery')
-        options.add_argument('--start-maximized')
-        options.add_argument('--disable-infobars')
-        logger.info('Starting up chrome driven by selenium')
-        driver = webdriver.Chrome(executable_path=ChromeDriverManager().install(), chrome_options=options)
+        user_data = UserDataDirectory(user_data_root, cache_seed=http_cache_seed)
+        logger.info('Using user data directory "%s"', user_data)
+        arguments = chrome_arguments(user_data)
+        try:
+            if engine == 'devtools':
+                logger.info('Starting up chrome driven over the devtools protocol')
+                driver = DevToolsChrome(arguments, user_data_dir=user_data.path)
+            elif engine == 'bidi':
+                logger.info('Starting up chrome driven by selenium over webdriver bidi')
+                driver = BiDiChrome(executable_path=ChromeDriverManager().install(),
+                                    chrome_options=cls._get_options(arguments))
+            elif service is not None:
+                logger.info('Starting up chrome driven by the shared chromedriver service')
+                driver = AttachedChrome(service, cls._get_options(arguments))
+            else:
+                logger.info('Starting up chrome driven by selenium')
+                driver = webdriver.Chrome(executable_path=ChromeDriverManager().install(),
+                                          chrome_options=cls._get_options(arguments))
+        except Exception:
+            user_data.cleanup()
+            raise
+        user_data.bind_to_driver(driver)
         logger.info('Deleting all cookies')
         driver.delete_all_cookies()
         logger.info('Returning driver')
         return driver
+
+    @staticmethod
+    def _get_options(arguments):
+        options = Options()
+        for argument in arguments:
+            options.add_argument(argument)
+        return options
@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: devtools.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+devtools package
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from itertools import count
+from queue import Queue, Empty
+from threading import Condition, Lock, Thread
+
+from selenium.common.exceptions import NoSuchWindowException, TimeoutException, WebDriverException
+
+try:
+    import fcntl
+except ImportError:  # windows, where remote debugging over a pipe is not supported
+    fcntl = None  # pylint: disable=invalid-name
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''devtools'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+CHROME_BINARIES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome',
+                   '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome')
+
+BROWSER_DOMAINS = ('Browser.', 'Target.', 'Storage.', 'SystemInfo.')
+
+COMMAND_TIMEOUT = 30
+
+PIPE_TRAMPOLINE = ('import os, sys\n'
+                   'commands, responses = int(sys.argv[1]), int(sys.argv[2])\n'
+                   'os.dup2(commands, 3)\n'
+                   'os.dup2(responses, 4)\n'
+                   'os.close(commands)\n'
+                   'os.close(responses)\n'
+                   'os.execv(sys.argv[3], sys.argv[3:])\n')
+
+WEBDRIVER_COOKIE_KEYS = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly')
+
+
+def webdriver_cookie(cdp_cookie):
+    """Converts a cookie as returned by the devtools protocol to the webdriver cookie format
+
+    Args:
+        cdp_cookie (dict): The devtools protocol cookie
+
+    Returns:
+        dict: The cookie in the format returned by the webdriver get_cookies call
+
+    """
+    cookie = {key: cdp_cookie[key] for key in WEBDRIVER_COOKIE_KEYS if key in cdp_cookie}
+    if not cdp_cookie.get('session', False) and cdp_cookie.get('expires', -1) > 0:
+        cookie['expiry'] = int(cdp_cookie['expires'])
+    return cookie
+
+
+def find_chrome_binary():
+    """Locates a chrome or chromium executable
+
+    Returns:
+        str: The path of the executable
+
+    Raises:
+        WebDriverException: If no executable could be found
+
+    """
+    binary = next((path for path in (shutil.which(name) for name in CHROME_BINARIES) if path), None)
+    if binary is None:
+        raise WebDriverException('Could not find a chrome executable, tried {}'.format(', '.join(CHROME_BINARIES)))
+    return binary
+
+
+class DevToolsPipe:  # pylint: disable=too-many-instance-attributes
+    """A devtools protocol connection to a chrome launched with remote debugging over a pipe
+
+    Chrome reads null terminated json messages on file descriptor 3 and writes its responses and events on file
+    descriptor 4, so neither a websocket implementation nor a free port is required.
+    """
+
+    def __init__(self, arguments, binary=None):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        if sys.platform == 'win32':
+            raise WebDriverException('Remote debugging over a pipe is not supported on windows.')
+        command_read, self._command_write = os.pipe()
+        self._response_read, response_write = os.pipe()
+        # chrome expects the pipes on file descriptors 3 and 4, a short lived interpreter maps them and execs
+        # chrome, as remapping them in a preexec_fn can deadlock when browsers are launched from many threads
+        commands, responses = (self._high_descriptor(descriptor) for descriptor in (command_read, response_write))
+        command = [sys.executable, '-c', PIPE_TRAMPOLINE, str(commands), str(responses),
+                   binary or find_chrome_binary(), '--remote-debugging-pipe'] + list(arguments)
+        try:
+            self.process = subprocess.Popen(command,
+                                            pass_fds=(commands, responses),
+                                            stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.DEVNULL)
+        finally:
+            for descriptor in (commands, responses, command_read, response_write):
+                os.close(descriptor)
+        self._ids = count(1)
+        self._pending = {}
+        self._listeners = []
+        self._lock = Lock()
+        self._closed = False
+        self._reader = Thread(target=self._read_messages, daemon=True)
+        self._reader.start()
+
+    @staticmethod
+    def _high_descriptor(descriptor):
+        """Moves a descriptor above 4 so mapping the pipes to 3 and 4 in the child never overwrites one of them"""
+        return fcntl.fcntl(descriptor, fcntl.F_DUPFD, 5)
+
+    def _read_messages(self):
+        buffer = b''
+        with os.fdopen(self._response_read, 'rb', buffering=0) as responses:
+            while True:
+                chunk = responses.read(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                *messages, buffer = buffer.split(b'\0')
+                for message in messages:
+                    self._dispatch(json.loads(message.decode('utf-8')))
+        self._closed = True
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for queue in pending.values():
+            queue.put(None)
+        for listener in list(self._listeners):
+            listener({'method': 'Inspector.detached', 'params': {'reason': 'Browser connection is closed.'}})
+
+    def _dispatch(self, message):
+        if 'id' in message:
+            with self._lock:
+                queue = self._pending.pop(message['id'], None)
+            if queue is not None:
+                queue.put(message)
+            return
+        for listener in list(self._listeners):
+            listener(message)
+
+    @property
+    def closed(self):
+        """True once the browser closed its end of the pipe"""
+        return self._closed
+
+    def add_listener(self, listener):
+        """Registers a callable that receives every event message chrome sends
+
+        Args:
+            listener: A callable accepting the event message dictionary
+
+        Returns:
+            None
+
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Unregisters a previously added event listener"""
+        self._listeners.remove(listener)
+
+    def send(self, method, params=None, session_id=None, timeout=COMMAND_TIMEOUT):
+        """Sends a devtools protocol command and waits for its result
+
+        Args:
+            method (str): The devtools protocol method
+            params (dict): The parameters of the method
+            session_id (str): The session of the target to send the command to, None for the browser target
+            timeout (int): The number of seconds to wait for the result
+
+        Returns:
+            dict: The result of the command
+
+        Raises:
+            NoSuchWindowException: If the browser is gone
+            WebDriverException: If the command failed
+
+        """
+        if self._closed:
+            raise NoSuchWindowException('Browser connection is closed.')
+        message = {'id': next(self._ids), 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+        queue = Queue(maxsize=1)
+        with self._lock:
+            self._pending[message['id']] = queue
+        try:
+            os.write(self._command_write, json.dumps(message).encode('utf-8') + b'\0')
+            response = queue.get(timeout=timeout)
+        except (OSError, BrokenPipeError) as error:
+            raise NoSuchWindowException('Browser connection is closed.') from error
+        except Empty as error:
+            raise TimeoutException('No response for {} in {} seconds.'.format(method, timeout)) from error
+        finally:
+            with self._lock:
+                self._pending.pop(message['id'], None)
+        if response is None:
+            raise NoSuchWindowException('Browser connection is closed.')
+        if 'error' in response:
+            raise WebDriverException('{} failed: {}'.format(method, response['error'].get('message')))
+        return response.get('result', {})
+
+    def close(self, timeout=10):
+        """Asks the browser to close and terminates it if it does not exit in time"""
+        try:
+            self.send('Browser.close', timeout=timeout)
+        except WebDriverException:
+            pass
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._logger.warning('Chrome did not exit in time, killing it.')
+            self.process.kill()
+            self.process.wait()
+        try:
+            os.close(self._command_write)
+        except OSError:
+            pass
+
+
+class DevToolsChrome:  # pylint: disable=too-many-instance-attributes
+    """A chrome driven directly over the devtools protocol
+
+    Exposes the subset of the webdriver api the cookie getter uses without chromedriver or selenium in between.
+    """
+
+    def __init__(self, arguments=(), binary=None, user_data_dir=None):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self._owns_user_data_dir = user_data_dir is None
+        self.user_data_dir = user_data_dir or tempfile.mkdtemp(prefix='mapscookiegetter-chrome-')
+        arguments = [argument for argument in arguments if not argument.startswith('--user-data-dir=')]
+        arguments += ['--user-data-dir={}'.format(self.user_data_dir),
+                      '--no-first-run',
+                      '--no-default-browser-check']
+        self._sessions = {}
+        self._loaded = set()
+        self._loads = Condition()
+        self._pipe = DevToolsPipe(arguments, binary=binary)
+        self._pipe.add_listener(self._record_load)
+        targets = self._pipe.send('Target.getTargets').get('targetInfos', [])
+        page = next((target for target in targets if target.get('type') == 'page'), None)
+        if page is None:
+            page = self._pipe.send('Target.createTarget', {'url': 'about:blank'})
+        self.current_window_handle = page.get('targetId')
+        self._session_id = self._pipe.send('Target.attachToTarget', {'targetId': self.current_window_handle,
+                                                                     'flatten': True}).get('sessionId')
+        self._sessions[self.current_window_handle] = self._session_id
+        self.switch_to = self
+        self._enable_domains(self._session_id)
+
+    def _enable_domains(self, session_id):
+        for domain in ('Page', 'Network', 'Runtime'):
+            self._pipe.send('{}.enable'.format(domain), session_id=session_id)
+        self._pipe.send('Page.setLifecycleEventsEnabled', {'enabled': True}, session_id=session_id)
+
+    def _record_load(self, message):
+        params = message.get('params', {})
+        if message.get('method') == 'Page.lifecycleEvent':
+            if params.get('name') != 'load' or params.get('frameId') not in self._sessions:
+                return
+            with self._loads:
+                self._loaded.add(params.get('loaderId'))
+                self._loads.notify_all()
+        elif message.get('method') == 'Inspector.detached':
+            with self._loads:
+                self._loads.notify_all()
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        """Executes a devtools protocol command on the browser or the current page as appropriate
+
+        Args:
+            cmd (str): The devtools protocol method
+            cmd_args (dict): The parameters of the method
+
+        Returns:
+            dict: The result of the command
+
+        """
+        session_id = None if cmd.startswith(BROWSER_DOMAINS) else self._session_id
+        return self._pipe.send(cmd, cmd_args, session_id=session_id)
+
+    @property
+    def window_handles(self):
+        """The target ids of all the pages of the browser"""
+        targets = self._pipe.send('Target.getTargets').get('targetInfos', [])
+        return [target.get('targetId') for target in targets if target.get('type') == 'page']
+
+    def window(self, handle):
+        """Directs all subsequent page commands to the page with the provided target id"""
+        if handle not in self._sessions:
+            self._sessions[handle] = self._pipe.send('Target.attachToTarget', {'targetId': handle,
+                                                                               'flatten': True}).get('sessionId')
+            self._enable_domains(self._sessions[handle])
+        self.current_window_handle = handle
+        self._session_id = self._sessions[handle]
+
+    def _evaluate(self, expression):
+        result = self.execute_cdp_cmd('Runtime.evaluate', {'expression': expression,
+                                                           'returnByValue': True,
+                                                           'awaitPromise': True})
+        if 'exceptionDetails' in result:
+            raise WebDriverException('Script failed: {}'.format(result['exceptionDetails'].get('text')))
+        return result.get('result', {}).get('value')
+
+    def get(self, url, timeout=COMMAND_TIMEOUT):
+        """Navigates the current page and waits for the new document to finish loading
+
+        The wait is for the load lifecycle event of the loader the navigation started, so the ready state of the
+        previous document never ends it early. Navigations within the same document do not start a loader and
+        return immediately.
+        """
+        loader_id = self.execute_cdp_cmd('Page.navigate', {'url': url}).get('loaderId')
+        if loader_id is None:
+            return
+        with self._loads:
+            if not self._loads.wait_for(lambda: loader_id in self._loaded or self._pipe.closed, timeout):
+                raise TimeoutException('Page {} did not load in {} seconds.'.format(url, timeout))
+            self._loaded.discard(loader_id)
+        if self._pipe.closed:
+            raise NoSuchWindowException('Browser connection is closed.')
+
+    @property
+    def current_url(self):
+        """The url of the current page"""
+        return self._evaluate('window.location.href')
+
+    @property
+    def page_source(self):
+        """The serialized dom of the current page"""
+        return self._evaluate('document.documentElement ? document.documentElement.outerHTML : ""') or ''
+
+    def execute_script(self, script, *args):
+        """Executes javascript in the current page the way webdriver does, returning the value of its return"""
+        expression = '(function() {{ {script} }}).apply(null, {args})'.format(script=script, args=json.dumps(args))
+        return self._evaluate(expression)
+
+    def get_cookies(self):
+        """The cookies visible to the current page in the webdriver cookie format"""
+        cookies = self.execute_cdp_cmd('Network.getCookies', {}).get('cookies', [])
+        return [webdriver_cookie(cookie) for cookie in cookies]
+
+    def add_cookie(self, cookie_dict):
+        """Adds a cookie in the webdriver cookie format"""
+        cookie = {key: value for key, value in cookie_dict.items() if key != 'expiry'}
+        if 'expiry' in cookie_dict:
+            cookie['expires'] = cookie_dict['expiry']
+        if 'domain' not in cookie:
+            cookie['url'] = self.current_url
+        self.execute_cdp_cmd('Network.setCookie', cookie)
+
+    def delete_all_cookies(self):
+        """Clears all the cookies of the browser"""
+        self.execute_cdp_cmd('Network.clearBrowserCookies', {})
+
+    def close(self):
+        """Closes the current page"""
+        self._pipe.send('Target.closeTarget', {'targetId': self.current_window_handle})
+
+    def quit(self):
+        """Closes the browser and removes its temporary profile"""
+        self._pipe.close()
+        if self._owns_user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
@@ -30,11 +30,17 @@ firefox package
    http://google.github.io/styleguide/pyguide.html
 """
 
+import json
 import logging
+import os
 
 
 from webdriver_manager.firefox import GeckoDriverManager
 from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+
+from .bidi import BiDiFirefox
+from .userdata import UserDataDirectory
 
 __author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
 __docformat__ = '''google'''
@@ -52,15 +58,35 @@ LOGGER.addHandler(logging.NullHandler())
 
 
 class Firefox:  # pylint: disable=too-few-public-methods
-    """Bootstraps a firefox selenium driver with the required settings"""
+    """Bootstraps a firefox selenium driver with the required settings
+
+    With the bidi engine selenium also opens a webdriver bidi connection for navigation events.
+    The profile directory of the session is created under user_data_root and removed when the driver quits,
+    its http cache is copied from http_cache_seed if provided.
+    """
 
-    def __new__(cls):
+    def __new__(cls, engine='selenium', user_data_root=None, http_cache_seed=None):
         logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
                                                 suffix='bootstrapper')
         logger = logging.getLogger(logger_name)
-        logger.info('Starting up firefox driven by selenium')
-        driver = webdriver.Firefox(firefox_profile=webdriver.FirefoxProfile(),
-                                   executable_path=GeckoDriverManager().install())
+        user_data = UserDataDirectory(user_data_root, cache_seed=http_cache_seed)
+        logger.info('Using profile directory "%s"', user_data)
+        with open(os.path.join(user_data.path, 'user.js'), 'w') as preferences:
+            preferences.write('user_pref("browser.cache.disk.capacity", {});\n'.format(user_data.max_size // 1024))
+            preferences.write('user_pref("browser.cache.disk.smart_size.enabled", false);\n')
+            preferences.write('user_pref("browser.cache.disk.parent_directory", {});\n'.format(
+                json.dumps(user_data.cache_path)))
+        options = Options()
+        options.add_argument('-profile')
+        options.add_argument(user_data.path)
+        driver_class = BiDiFirefox if engine == 'bidi' else webdriver.Firefox
+        logger.info('Starting up firefox driven by selenium%s', ' over webdriver bidi' if engine == 'bidi' else '')
+        try:
+            driver = driver_class(options=options, executable_path=GeckoDriverManager().install())
+        except Exception:
+            user_data.cleanup()
+            raise
+        user_data.bind_to_driver(driver)
         logger.info('Deleting all cookies')
         driver.delete_all_cookies()
         logger.info('Returning driver')
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: service.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+service package
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+"""
+
+import json
+import logging
+from threading import Lock
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from webdriver_manager.chrome import ChromeDriverManager
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.remote_connection import ChromeRemoteConnection
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''service'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+
+class SharedChromeDriverService:
+    """A long lived chromedriver service that all the chrome sessions of a process attach to
+
+    The service is started lazily when the first session attaches and health checked over its status endpoint
+    every time a session attaches. A service whose process died is always restarted, one that only stopped
+    answering its status endpoint is restarted once no sessions are attached to it any more, since restarting it
+    would kill the browsers in flight.
+    """
+
+    def __init__(self, executable_path=None, health_check_timeout=2):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self._executable_path = executable_path
+        self.health_check_timeout = health_check_timeout
+        self._service = None
+        self._sessions = 0
+        self._lock = Lock()
+
+    @property
+    def sessions(self):
+        """The number of sessions attached to the service"""
+        return self._sessions
+
+    @property
+    def process(self):
+        """The chromedriver process of the service, None if it is not running"""
+        return self._service.process if self._service is not None else None
+
+    def attach(self):
+        """Registers a new session with the service, starting or restarting the service if required
+
+        Returns:
+            str: The url of the chromedriver service to create the session on
+
+        """
+        with self._lock:
+            if not self.is_running():
+                self._restart()
+            elif not self.is_responding():
+                if self._sessions:
+                    self._logger.warning('Shared chromedriver service is not responding, keeping it for the %d '
+                                         'sessions attached to it.', self._sessions)
+                else:
+                    self._restart()
+            self._sessions += 1
+            return self._service.service_url
+
+    def detach(self):
+        """Unregisters a session that quit from the service"""
+        with self._lock:
+            self._sessions = max(0, self._sessions - 1)
+
+    def is_running(self):
+        """Checks that the chromedriver process is alive
+
+        Returns:
+            bool: True if the chromedriver process is running, False otherwise
+
+        """
+        return self._service is not None and self._service.process.poll() is None
+
+    def is_responding(self):
+        """Checks that the chromedriver service reports itself as ready
+
+        Returns:
+            bool: True if the service can accept new sessions, False otherwise
+
+        """
+        try:
+            with urlopen('{url}/status'.format(url=self._service.service_url),
+                         timeout=self.health_check_timeout) as response:
+                status = json.loads(response.read().decode('utf-8'))
+        except (URLError, OSError, ValueError):
+            return False
+        return status.get('value', {}).get('ready', True)
+
+    def is_healthy(self):
+        """Checks that the chromedriver process is alive and reports itself as ready
+
+        Returns:
+            bool: True if the service can accept new sessions, False otherwise
+
+        """
+        return self.is_running() and self.is_responding()
+
+    def _restart(self):
+        if self._service is not None:
+            self._logger.warning('Shared chromedriver service is not healthy, restarting it.')
+            self._stop()
+        self._service = self._start_service()
+        self._sessions = 0
+        self._logger.info('Started shared chromedriver service at %s.', self._service.service_url)
+
+    def _start_service(self):
+        if self._executable_path is None:
+            self._executable_path = ChromeDriverManager().install()
+        service = Service(self._executable_path)
+        service.start()
+        return service
+
+    def _stop(self):
+        try:
+            self._service.stop()
+        except WebDriverException:
+            self._logger.debug('Shared chromedriver service did not stop cleanly.')
+        self._service = None
+
+    def stop(self):
+        """Stops the shared service, sessions still attached to it are terminated"""
+        with self._lock:
+            if self._service is not None:
+                self._logger.info('Stopping shared chromedriver service.')
+                self._stop()
+            self._sessions = 0
+
+
+class AttachedChrome(webdriver.Chrome):  # pylint: disable=abstract-method
+    """A chrome driver that attaches to an already running chromedriver service instead of spawning its own"""
+
+    def __init__(self, service, options):  # pylint: disable=super-init-not-called
+        self.shared_service = service
+        service_url = service.attach()
+        try:
+            RemoteWebDriver.__init__(self,
+                                     command_executor=ChromeRemoteConnection(remote_server_addr=service_url,
+                                                                             keep_alive=True),
+                                     desired_capabilities=options.to_capabilities())
+        except Exception:
+            service.detach()
+            raise
+        self._is_remote = False
+        self._attached = True
+
+    def quit(self):
+        """Closes the browser leaving the shared chromedriver service running"""
+        try:
+            RemoteWebDriver.quit(self)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.debug('Browser session did not quit cleanly.')
+        finally:
+            if self._attached:
+                self._attached = False
+                self.shared_service.detach()
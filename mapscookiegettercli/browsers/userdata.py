@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: userdata.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+userdata package
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''userdata'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+USER_DATA_PREFIX = 'mapscookiegetter-'
+FAST_USER_DATA_ROOTS = ('/dev/shm',)
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+def default_user_data_root():
+    """The location for browser user data directories, a memory backed file system if one is available
+
+    The MAPS_COOKIE_GETTER_USER_DATA_ROOT environment variable overrides the detection.
+
+    Returns:
+        str: The path of the root directory
+
+    """
+    configured = os.environ.get('MAPS_COOKIE_GETTER_USER_DATA_ROOT')
+    if configured:
+        return configured
+    return next((root for root in FAST_USER_DATA_ROOTS if os.path.isdir(root) and os.access(root, os.W_OK)),
+                tempfile.gettempdir())
+
+
+def is_running(pid):
+    """Checks whether a process is running, always assumed on windows where probing a process terminates it
+
+    Args:
+        pid (int): The id of the process
+
+    Returns:
+        bool: True if the process is running or can not be checked, False otherwise
+
+    """
+    if sys.platform == 'win32':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_user_data_directories(root=None):
+    """Removes user data directories left behind by processes that are not running any more
+
+    Args:
+        root (str): The root to sweep, defaults to the default user data root
+
+    Returns:
+        int: The number of directories removed
+
+    """
+    root = root or default_user_data_root()
+    removed = 0
+    if sys.platform == 'win32':
+        LOGGER.info('Not sweeping "%s", the processes owning user data directories can not be checked on windows.',
+                    root)
+        return removed
+    try:
+        entries = os.listdir(root)
+    except OSError:
+        return removed
+    for entry in entries:
+        if not entry.startswith(USER_DATA_PREFIX):
+            continue
+        pid = entry[len(USER_DATA_PREFIX):].split('-')[0]
+        if not pid.isdigit() or is_running(int(pid)):
+            continue
+        LOGGER.info('Removing user data directory "%s" left behind by process %s.', entry, pid)
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+        removed += 1
+    return removed
+
+
+class UserDataDirectory:
+    """A per session browser user data directory on a fast location, removed when the session ends
+
+    If the fast location does not have max_size bytes free the directory is created in the default temporary
+    location instead. The size cap is enforced through the cache limits of the browsers. If a cache seed is
+    provided it is copied in as the http cache of the session so the browser starts with a warm cache without
+    ever writing to the shared seed.
+    """
+
+    def __init__(self, root=None, max_size=DEFAULT_MAX_SIZE, cache_seed=None):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        root = root or default_user_data_root()
+        free = shutil.disk_usage(root).free
+        if free < max_size:
+            self._logger.warning('Only %d of the %d bytes required are free on "%s", falling back to "%s".',
+                                 free, max_size, root, tempfile.gettempdir())
+            root = tempfile.gettempdir()
+        self.max_size = max_size
+        self.path = tempfile.mkdtemp(prefix='{prefix}{pid}-'.format(prefix=USER_DATA_PREFIX, pid=os.getpid()),
+                                     dir=root)
+        self._logger.debug('Created user data directory "%s".', self.path)
+        self.cache_path = os.path.join(self.path, 'http-cache')
+        self.preserve_cache_to = None
+        if cache_seed and os.path.isdir(cache_seed):
+            self._logger.debug('Seeding http cache from "%s".', cache_seed)
+            shutil.copytree(cache_seed, self.cache_path)
+        else:
+            os.mkdir(self.cache_path)
+
+    def __str__(self):
+        return self.path
+
+    @property
+    def size(self):
+        """The number of bytes currently used by the directory"""
+        total = 0
+        for directory, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(directory, name)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def cleanup(self):
+        """Removes the directory and everything in it, exporting the http cache first if requested"""
+        if self.preserve_cache_to:
+            self._logger.info('Exporting http cache to "%s".', self.preserve_cache_to)
+            shutil.rmtree(self.preserve_cache_to, ignore_errors=True)
+            shutil.copytree(self.cache_path, self.preserve_cache_to)
+        self._logger.debug('Removing user data directory "%s" of %d bytes.', self.path, self.size)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def bind_to_driver(self, driver):
+        """Makes quitting the driver also remove the directory
+
+        Args:
+            driver: The driver whose browser uses the directory
+
+        Returns:
+            The driver
+
+        """
+        original_quit = driver.quit
+
+        def quit_and_cleanup():
+            try:
+                original_quit()
+            finally:
+                self.cleanup()
+
+        driver.quit = quit_and_cleanup
+        driver.user_data_directory = self
+        return driver
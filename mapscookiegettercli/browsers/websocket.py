@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: websocket.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+websocket package
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import socket
+import struct
+from threading import Lock
+from urllib.parse import urlparse
+
+from mapscookiegettercli.mapscookiegettercliexceptions import WebSocketClosed
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''websocket'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class WebSocket:
+    """A minimal websocket client for the local plain text connections browser drivers expose
+
+    Only what the webdriver bidi protocol needs is supported, unencrypted ws urls, text messages, fragmentation
+    and answering pings.
+    """
+
+    def __init__(self, url, timeout=30):
+        parsed = urlparse(url)
+        if parsed.scheme != 'ws':
+            raise ValueError('Only plain ws urls are supported, got {}'.format(url))
+        self._socket = socket.create_connection((parsed.hostname, parsed.port or 80), timeout=timeout)
+        self._socket.settimeout(None)
+        self._send_lock = Lock()
+        self._buffer = b''
+        self._handshake(parsed)
+
+    def _handshake(self, parsed):
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        path = parsed.path or '/'
+        if parsed.query:
+            path = '{}?{}'.format(path, parsed.query)
+        request = ('GET {path} HTTP/1.1\r\n'
+                   'Host: {host}\r\n'
+                   'Upgrade: websocket\r\n'
+                   'Connection: Upgrade\r\n'
+                   'Sec-WebSocket-Key: {key}\r\n'
+                   'Sec-WebSocket-Version: 13\r\n\r\n').format(path=path, host=parsed.netloc, key=key)
+        self._socket.sendall(request.encode('ascii'))
+        while b'\r\n\r\n' not in self._buffer:
+            self._buffer += self._receive_chunk()
+        headers, self._buffer = self._buffer.split(b'\r\n\r\n', 1)
+        lines = headers.decode('latin-1').split('\r\n')
+        if ' 101 ' not in lines[0] + ' ':
+            raise WebSocketClosed('Websocket handshake failed: {}'.format(lines[0]))
+        expected = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+        accept = next((line.split(':', 1)[1].strip() for line in lines[1:]
+                       if line.lower().startswith('sec-websocket-accept:')), None)
+        if accept != expected:
+            raise WebSocketClosed('Websocket handshake returned an invalid accept key.')
+
+    def _receive_chunk(self):
+        chunk = self._socket.recv(65536)
+        if not chunk:
+            raise WebSocketClosed('Connection closed by the remote end.')
+        return chunk
+
+    def _receive_exactly(self, size):
+        while len(self._buffer) < size:
+            self._buffer += self._receive_chunk()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([0x80 | length])
+        elif length < 65536:
+            header += bytes([0x80 | 126]) + struct.pack('!H', length)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack('!Q', length)
+        mask = os.urandom(4)
+        masked = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        with self._send_lock:
+            self._socket.sendall(header + mask + masked)
+
+    def send(self, message):
+        """Sends a text message
+
+        Args:
+            message (str): The message to send
+
+        Returns:
+            None
+
+        """
+        self._send_frame(OPCODE_TEXT, message.encode('utf-8'))
+
+    def receive(self):
+        """Blocks until a complete text message is received
+
+        Returns:
+            str: The message
+
+        Raises:
+            WebSocketClosed: If the remote end closed the connection
+
+        """
+        fragments = []
+        while True:
+            first, second = self._receive_exactly(2)
+            opcode, final = first & 0x0F, first & 0x80
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', self._receive_exactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self._receive_exactly(8))[0]
+            mask = self._receive_exactly(4) if second & 0x80 else None
+            payload = self._receive_exactly(length)
+            if mask:
+                payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+            if opcode == OPCODE_PING:
+                self._send_frame(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_CLOSE:
+                try:
+                    self._send_frame(OPCODE_CLOSE, payload[:2])
+                except OSError:
+                    pass
+                raise WebSocketClosed('Connection closed by the remote end.')
+            if opcode in (OPCODE_TEXT, OPCODE_CONTINUATION):
+                fragments.append(payload)
+                if final:
+                    return b''.join(fragments).decode('utf-8')
+
+    def close(self):
+        """Closes the connection"""
+        try:
+            self._send_frame(OPCODE_CLOSE, b'')
+        except OSError:
+            pass
+        self._socket.close()
@@ -32,7 +32,24 @@ Import all parts from library here
    http://google.github.io/styleguide/pyguide.html
 """
 
-from .cookiegetter import CookieGetter
+from .cookiegetter import CookieGetter, harvest
+from .loginprofile import LoginProfile, LOGIN_PROFILES
+from .keepalive import CookieKeepAlive, KeepAliveRequest
+from .freshness import is_cookie_jar_fresh
+from .session import HarvestConfiguration, HarvestResult, HarvestSession
+from .loader import CookieJarIndex
+from .compaction import CookieFilter, COOKIE_FILTERS
+from .journal import HarvestJournal
+from .distributed import (WorkQueue, WorkQueueServer, RemoteWorkQueue, HarvestWorker, HarvestCoordinator,
+                          create_work_queue)
+from .admission import AdmissionController
+from .ratelimit import LaunchRateLimiter
+from .resources import ResourceSampler, ResourceUsage
+from .metrics import Metrics, METRICS
+from .notifications import (ChangeEvent, NotifyingSink, UnixSocketChangeStream, ServerSentEventsChangeStream,
+                            create_change_stream)
+from .sinks import (CookieSink, FileSink, StdoutSink, SQLiteSink, HttpPostSink, CompositeSink, BatchingSink,
+                    create_sink)
 
 __author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
 __docformat__ = '''google'''
@@ -45,3 +62,41 @@ __status__ = '''Development'''  # "Prototype", "Development", "Production".
 
 # This is to 'use' the module(s), so lint doesn't complain
 assert CookieGetter
+assert harvest
+assert LoginProfile
+assert LOGIN_PROFILES
+assert CookieKeepAlive
+assert KeepAliveRequest
+assert is_cookie_jar_fresh
+assert HarvestConfiguration
+assert HarvestSession
+assert HarvestResult
+assert CookieSink
+assert FileSink
+assert StdoutSink
+assert SQLiteSink
+assert HttpPostSink
+assert CompositeSink
+assert BatchingSink
+assert create_sink
+assert CookieJarIndex
+assert ChangeEvent
+assert NotifyingSink
+assert UnixSocketChangeStream
+assert ServerSentEventsChangeStream
+assert create_change_stream
+assert CookieFilter
+assert COOKIE_FILTERS
+assert HarvestJournal
+assert WorkQueue
+assert WorkQueueServer
+assert RemoteWorkQueue
+assert HarvestWorker
+assert HarvestCoordinator
+assert create_work_queue
+assert AdmissionController
+assert LaunchRateLimiter
+assert ResourceSampler
+assert ResourceUsage
+assert Metrics
+assert METRICS
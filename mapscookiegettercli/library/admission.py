@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: admission.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for admission
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+from threading import Condition, Lock
+from time import monotonic
+
+from mapscookiegettercli.mapscookiegettercliexceptions import AdmissionTimeout
+from .metrics import METRICS
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''admission'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+MEGABYTE = 1024 * 1024
+
+
+def read_meminfo(path='/proc/meminfo'):
+    """Reads the memory statistics of the system
+
+    Args:
+        path (str): The path of the meminfo file
+
+    Returns:
+        dict: The values of the file in bytes, None where the file is not available
+
+    """
+    try:
+        with open(path) as meminfo:
+            lines = meminfo.readlines()
+    except OSError:
+        return None
+    values = {}
+    for line in lines:
+        name, _, value = line.partition(':')
+        fields = value.split()
+        if fields:
+            values[name] = int(fields[0]) * (1024 if fields[1:] == ['kB'] else 1)
+    return values
+
+
+def read_pressure(resource, directory='/proc/pressure'):
+    """Reads the pressure stall information of a resource
+
+    Args:
+        resource (str): "memory", "cpu" or "io"
+        directory (str): The directory of the pressure files
+
+    Returns:
+        dict: The averages of the "some" and "full" lines, like {'some': {'avg10': 0.5, ...}}, None where pressure
+            stall information is not available
+
+    """
+    try:
+        with open('{directory}/{resource}'.format(directory=directory, resource=resource)) as pressure:
+            lines = pressure.readlines()
+    except OSError:
+        return None
+    values = {}
+    for line in lines:
+        kind, *fields = line.split()
+        values[kind] = {name: float(value) for name, value in (field.split('=') for field in fields)}
+    return values
+
+
+class AdmissionController:  # pylint: disable=too-many-instance-attributes
+    """Admits browser launches only while the host has memory headroom and is not under pressure
+
+    A launch is admitted when the available memory, minus the memory reserved for launches admitted within the
+    last settle_time seconds that may not have allocated it yet, still leaves session_memory on top of
+    min_available, and the ten second memory and cpu pressure averages are below their limits. Otherwise the
+    launch waits, checking again every poll_interval seconds. Where /proc/meminfo or the pressure files are not
+    available the respective check passes. The decisions are counted in the admission_* metrics.
+    """
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 min_available=512 * MEGABYTE,
+                 session_memory=300 * MEGABYTE,
+                 max_memory_pressure=10.0,
+                 max_cpu_pressure=80.0,
+                 settle_time=10,
+                 poll_interval=1,
+                 metrics=METRICS,
+                 proc_directory='/proc'):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.min_available = min_available
+        self.session_memory = session_memory
+        self.max_memory_pressure = max_memory_pressure
+        self.max_cpu_pressure = max_cpu_pressure
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.metrics = metrics
+        self.proc_directory = proc_directory
+        self._condition = Condition(Lock())
+        self._reservations = []
+
+    def _headroom(self, now):
+        self._reservations = [admitted_at for admitted_at in self._reservations
+                              if now - admitted_at < self.settle_time]
+        meminfo = read_meminfo('{}/meminfo'.format(self.proc_directory))
+        memory = read_pressure('memory', '{}/pressure'.format(self.proc_directory))
+        cpu = read_pressure('cpu', '{}/pressure'.format(self.proc_directory))
+        reasons = []
+        if meminfo and 'MemAvailable' in meminfo:
+            available = meminfo['MemAvailable'] - len(self._reservations) * self.session_memory
+            self.metrics.set('admission_available_bytes', available)
+            if available - self.session_memory < self.min_available:
+                reasons.append('memory')
+        if memory:
+            self.metrics.set('admission_memory_pressure', memory['some']['avg10'])
+            if memory['some']['avg10'] > self.max_memory_pressure:
+                reasons.append('memory_pressure')
+        if cpu:
+            self.metrics.set('admission_cpu_pressure', cpu['some']['avg10'])
+            if cpu['some']['avg10'] > self.max_cpu_pressure:
+                reasons.append('cpu_pressure')
+        return reasons
+
+    def acquire(self, timeout=None):
+        """Waits until a browser launch can be admitted
+
+        Args:
+            timeout (float): The maximum number of seconds to wait, None to wait until admitted
+
+        Returns:
+            float: The number of seconds the launch waited
+
+        Raises:
+            AdmissionTimeout: If the launch was not admitted within the timeout
+
+        """
+        start = monotonic()
+        waited = False
+        with self._condition:
+            while True:
+                now = monotonic()
+                reasons = self._headroom(now)
+                if not reasons:
+                    self._reservations.append(now)
+                    break
+                if not waited:
+                    self._logger.info('Delaying browser launch, no headroom: %s.', ', '.join(reasons))
+                    for reason in reasons:
+                        self.metrics.increment('admission_delayed_total', reason=reason)
+                    waited = True
+                if timeout is not None and now - start >= timeout:
+                    self.metrics.increment('admission_rejected_total')
+                    raise AdmissionTimeout(', '.join(reasons))
+                self._condition.wait(self.poll_interval if timeout is None
+                                     else min(self.poll_interval, max(timeout - (now - start), 0)))
+        waited_for = monotonic() - start
+        self.metrics.increment('admission_admitted_total')
+        self.metrics.increment('admission_wait_seconds_total', waited_for)
+        return waited_for
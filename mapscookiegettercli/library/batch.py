@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: batch.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for batch
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import BoundedSemaphore
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''batch'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+
+class TeardownPipeline:
+    """Runs cookie persistence and browser teardown in the background while the next browser launches
+
+    The number of teardowns in flight is bounded so that no more than that many finished browsers are kept in
+    memory, submitting more blocks until one of them is gone.
+    """
+
+    def __init__(self, max_in_flight=2):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self._slots = BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='teardown')
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def submit(self, function, *args, **kwargs):
+        """Schedules a teardown, blocking while the maximum number of teardowns is in flight
+
+        Args:
+            function: The callable performing the teardown
+            *args: The positional arguments of the callable
+            **kwargs: The keyword arguments of the callable
+
+        Returns:
+            Future: The future of the scheduled teardown
+
+        """
+        self._slots.acquire()  # pylint: disable=consider-using-with
+        try:
+            future = self._executor.submit(function, *args, **kwargs)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release)
+        self._futures.append(future)
+        return future
+
+    def _release(self, future):
+        self._slots.release()
+        if future.exception() is not None:
+            self._logger.error('Background teardown failed: %s', future.exception())
+
+    def shutdown(self):
+        """Waits for all the scheduled teardowns to finish
+
+        Returns:
+            bool: True if all the teardowns succeeded, False otherwise
+
+        """
+        wait(self._futures)
+        self._executor.shutdown(wait=True)
+        return all(future.exception() is None for future in self._futures)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: benchmark.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for benchmark
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+from math import ceil
+from multiprocessing import get_context
+from statistics import median
+from time import monotonic
+
+from requests.cookies import RequestsCookieJar
+
+from mapscookiegettercli.browsers import Chrome
+from .jarfile import load_cookie_jar, save_cookie_jar
+from .loader import CookieJarIndex, COOKIE_FILE_SUFFIX
+from .loginprofile import MAPS_PROFILE, measure_cache_usage
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''benchmark'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+BENCHMARK_URL = 'https://www.google.com/robots.txt'
+
+
+def percentile(values, fraction):
+    """Calculates the nearest rank percentile of the provided values
+
+    Args:
+        values (list): The measurements
+        fraction (float): The percentile as a fraction, 0.99 for p99
+
+    Returns:
+        float: The value at the percentile, 0.0 if there are no values
+
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered), ceil(fraction * len(ordered))) - 1)]
+
+
+def benchmark_engine(engine, iterations=5, commands=50, url=BENCHMARK_URL):
+    """Measures the startup and per command latency of a chrome engine
+
+    Args:
+        engine (str): The engine to benchmark, "selenium" or "devtools"
+        iterations (int): The number of browsers to start
+        commands (int): The number of commands to time per browser
+        url (str): The page to load before timing the commands
+
+    Returns:
+        dict: The median startup, navigation and command latencies in seconds
+
+    """
+    startups, navigations, latencies = [], [], []
+    for _ in range(iterations):
+        start = monotonic()
+        driver = Chrome(engine=engine)
+        startups.append(monotonic() - start)
+        try:
+            start = monotonic()
+            driver.get(url)
+            navigations.append(monotonic() - start)
+            for _ in range(commands):
+                start = monotonic()
+                _ = driver.current_url
+                latencies.append(monotonic() - start)
+        finally:
+            driver.quit()
+    return {'engine': engine,
+            'startup': median(startups),
+            'navigation': median(navigations),
+            'command': median(latencies),
+            'command_p99': percentile(latencies, 0.99)}
+
+
+def benchmark_http_cache(http_cache_seed, iterations=3, url=MAPS_PROFILE.login_url):
+    """Compares cache hits and bytes downloaded for the sign in page with and without an http cache seed
+
+    Args:
+        http_cache_seed (str): The directory of the http cache seed
+        iterations (int): The number of sessions to measure per variant
+        url (str): The page to load
+
+    Returns:
+        list: A result dictionary per variant with the median hit ratio and bytes downloaded
+
+    """
+    results = []
+    for variant, seed in (('cold', None), ('seeded', http_cache_seed)):
+        ratios, downloads = [], []
+        for _ in range(iterations):
+            driver = Chrome(http_cache_seed=seed)
+            try:
+                driver.get(url)
+                hits, total, transferred = measure_cache_usage(driver)
+            finally:
+                driver.quit()
+            ratios.append(float(hits) / total if total else 0.0)
+            downloads.append(transferred)
+        results.append({'variant': variant, 'hit_ratio': median(ratios), 'downloaded': median(downloads)})
+    return results
+
+
+def resident_memory():
+    """The resident memory of the current process in bytes, the peak one where the current is not available
+
+    Returns:
+        int: The resident set size in bytes
+
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource  # pylint: disable=import-outside-toplevel
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def create_cookie_jars(directory, jars, cookies=40):
+    """Fills a directory with cookie files shaped like harvested ones for benchmarking
+
+    Args:
+        directory (str): The directory to create the cookie files in
+        jars (int): The number of cookie files
+        cookies (int): The number of cookies per cookie file
+
+    Returns:
+        None
+
+    """
+    for index in range(jars):
+        cookie_jar = RequestsCookieJar()
+        for cookie in range(cookies):
+            cookie_jar.set('COOKIE{}'.format(cookie), os.urandom(48).hex(), domain='.google.com', path='/',
+                           secure=True, expires=2000000000)
+        save_cookie_jar(cookie_jar, os.path.join(directory, 'account{}{}'.format(index, COOKIE_FILE_SUFFIX)))
+
+
+def _measure_jar_loading(directory, variant, accessed):
+    baseline = resident_memory()
+    start = monotonic()
+    if variant == 'eager':
+        jars = {entry.name: load_cookie_jar(entry.path) for entry in os.scandir(directory)}
+    else:
+        jars = CookieJarIndex(directory)
+    startup = monotonic() - start
+    start = monotonic()
+    for account in sorted(jars)[:accessed]:
+        _ = jars[account]
+    return {'variant': variant,
+            'startup': startup,
+            'access': monotonic() - start,
+            'rss': resident_memory() - baseline}
+
+
+def benchmark_jar_loading(jars=1000, accessed=10):
+    """Compares startup time and resident memory of unpickling all cookie files with a lazy index
+
+    Every variant runs in a fresh interpreter so the memory measurements do not influence each other.
+
+    Args:
+        jars (int): The number of cookie files to load
+        accessed (int): The number of accounts whose cookie jar is used after startup
+
+    Returns:
+        list: A result dictionary per variant with the startup and access time and the resident memory growth
+
+    """
+    directory = tempfile.mkdtemp(prefix='mapscookiegetter-benchmark-')
+    try:
+        create_cookie_jars(directory, jars)
+        with get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+            return [pool.apply(_measure_jar_loading, (directory, variant, accessed))
+                    for variant in ('eager', 'lazy')]
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    """Runs the requested benchmark and prints the results"""
+    parser = argparse.ArgumentParser(description='Benchmarks of mapscookiegettercli.')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    engines = subparsers.add_parser('engines', help='Compare startup and command latency of the chrome engines.')
+    engines.add_argument('--iterations', type=int, default=5)
+    engines.add_argument('--commands', type=int, default=50)
+    cache = subparsers.add_parser('http-cache', help='Compare the sign in page load with and without a cache seed.')
+    cache.add_argument('seed')
+    cache.add_argument('--iterations', type=int, default=3)
+    jars = subparsers.add_parser('jars', help='Compare loading all cookie files up front with the lazy index.')
+    jars.add_argument('--jars', type=int, default=1000)
+    jars.add_argument('--accessed', type=int, default=10)
+    args = parser.parse_args()
+    if args.benchmark == 'engines':
+        print('{:<10} {:>10} {:>12} {:>10} {:>12}'.format('engine', 'startup', 'navigation', 'command', 'command p99'))
+        for engine in ('selenium', 'devtools'):
+            result = benchmark_engine(engine, args.iterations, args.commands)
+            print('{engine:<10} {startup:>9.3f}s {navigation:>11.3f}s {command:>9.4f}s {command_p99:>11.4f}s'.format(
+                **result))
+    elif args.benchmark == 'http-cache':
+        print('{:<10} {:>10} {:>12}'.format('variant', 'hit ratio', 'downloaded'))
+        for result in benchmark_http_cache(args.seed, args.iterations):
+            print('{variant:<10} {hit_ratio:>10.0%} {downloaded:>12}'.format(**result))
+    elif args.benchmark == 'jars':
+        print('{:<10} {:>10} {:>10} {:>12}'.format('variant', 'startup', 'access', 'rss growth'))
+        for result in benchmark_jar_loading(args.jars, args.accessed):
+            print('{variant:<10} {startup:>9.3f}s {access:>9.3f}s {rss:>12}'.format(**result))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
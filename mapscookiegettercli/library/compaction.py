@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: compaction.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for compaction
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+
+from .freshness import AUTH_COOKIE_NAMES
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''compaction'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+LOCATION_SHARING_COOKIE_NAMES = AUTH_COOKIE_NAMES + ('SIDCC', 'NID', 'OSID',
+                                                     '__Secure-1PSID', '__Secure-3PSID',
+                                                     '__Secure-1PAPISID', '__Secure-3PAPISID',
+                                                     '__Secure-1PSIDTS', '__Secure-3PSIDTS',
+                                                     '__Secure-1PSIDCC', '__Secure-3PSIDCC')
+
+
+def cookies_size(cookies):
+    """The number of bytes of the names and values of webdriver cookies
+
+    Args:
+        cookies (list): The cookies in the webdriver cookie format
+
+    Returns:
+        int: The total length of the names and values
+
+    """
+    return sum(len(cookie['name']) + len(str(cookie['value'])) for cookie in cookies)
+
+
+def _site(domain):
+    domain = domain.lstrip('.')
+    return domain[len('www.'):] if domain.startswith('www.') else domain
+
+
+class CookieFilter:
+    """Compacts the cookies of a harvest before they are persisted
+
+    Only the cookies named in keep are retained, all of them if keep is None, and a cookie set both for the
+    domain and for its www host, like ".google.com" and "www.google.com", is kept once, preferring the domain
+    wide one, so lookups by name on the requests cookie jar do not run into conflicts.
+    """
+
+    def __init__(self, name, keep=None, required=AUTH_COOKIE_NAMES):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.name = name
+        self.keep = frozenset(keep) if keep is not None else None
+        self.required = tuple(required)
+
+    def __repr__(self):
+        return '{name}({filter})'.format(name=self.__class__.__name__, filter=self.name)
+
+    def apply(self, cookies):
+        """Filters and deduplicates webdriver cookies and logs the size before and after
+
+        Args:
+            cookies (list): The cookies in the webdriver cookie format
+
+        Returns:
+            list: The compacted cookies
+
+        """
+        kept = {}
+        for cookie in cookies:
+            if self.keep is not None and cookie['name'] not in self.keep:
+                continue
+            key = (_site(cookie.get('domain', '')), cookie.get('path', '/'), cookie['name'])
+            if key not in kept or cookie.get('domain', '').startswith('.'):
+                kept[key] = cookie
+        compacted = list(kept.values())
+        self._logger.info('Cookie filter %s kept %d of %d cookies, %d of %d bytes.', self.name,
+                          len(compacted), len(cookies), cookies_size(compacted), cookies_size(cookies))
+        missing = set(self.required) - {cookie['name'] for cookie in compacted}
+        if missing:
+            self._logger.warning('Required cookies %s are missing.', ', '.join(sorted(missing)))
+        return compacted
+
+
+DEDUPLICATE_FILTER = CookieFilter('deduplicate')
+
+LOCATION_SHARING_FILTER = CookieFilter('location-sharing', keep=LOCATION_SHARING_COOKIE_NAMES)
+
+COOKIE_FILTERS = {cookie_filter.name: cookie_filter for cookie_filter in (DEDUPLICATE_FILTER,
+                                                                          LOCATION_SHARING_FILTER)}
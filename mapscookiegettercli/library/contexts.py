@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: contexts.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for contexts
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+
+from mapscookiegettercli.browsers.devtools import webdriver_cookie
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''contexts'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+
+class BrowserContext:
+    """An isolated browser context in a running chrome hosting the login session of a single account"""
+
+    def __init__(self, driver, account):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self._driver = driver
+        self.account = account
+        self.context_id = driver.execute_cdp_cmd('Target.createBrowserContext', {}).get('browserContextId')
+        target = driver.execute_cdp_cmd('Target.createTarget', {'url': 'about:blank',
+                                                                'browserContextId': self.context_id})
+        self.target_id = target.get('targetId')
+        self.window_handle = next((handle for handle in driver.window_handles
+                                   if handle.endswith(self.target_id)),
+                                  self.target_id)
+        self._logger.info('Created browser context %s for account %s.', self.context_id, self.account)
+
+    def activate(self):
+        """Directs all subsequent driver commands to the window of this context"""
+        self._driver.switch_to.window(self.window_handle)
+
+    def get_cookies(self):
+        """Retrieves the cookies of all domains from this context only
+
+        Returns:
+            list: The cookies of the context in the webdriver cookie format
+
+        """
+        response = self._driver.execute_cdp_cmd('Storage.getCookies', {'browserContextId': self.context_id})
+        return [webdriver_cookie(cookie) for cookie in response.get('cookies', [])]
+
+    def dispose(self):
+        """Closes the window of the context and discards all its state"""
+        self._logger.info('Disposing browser context %s of account %s.', self.context_id, self.account)
+        self._driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': self.context_id})
@@ -32,16 +32,28 @@ Main code for cookiegetter
 """
 
 import logging
+import os
 import sys
-import pickle
+from functools import partial
 from pathlib import Path
-from time import sleep
+from statistics import median
+from time import sleep, time
 
-from requests import Session
 from selenium.common.exceptions import NoSuchWindowException
 
 from mapscookiegettercli.mapscookiegettercliexceptions import UnsupportedOS, UnsupportedDefaultBrowser
-from mapscookiegettercli.browsers import Chrome, Firefox, IE, Edge
+from mapscookiegettercli.browsers import SharedChromeDriverService
+from mapscookiegettercli.browsers.userdata import default_user_data_root, sweep_user_data_directories
+from .loginprofile import MAPS_PROFILE
+from .contexts import BrowserContext
+from .jarfile import last_verified
+from .journal import COMPLETED
+from .session import HarvestConfiguration, HarvestResult, HarvestSession, launch_driver
+from .batch import TeardownPipeline
+from .pool import DriverPool
+from .locking import HarvestLock, SingleFlight, cookie_file_lock
+from .sinks import BatchingSink, CompositeSink, FileSink
+from .notifications import NotifyingSink
 
 __author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
 __docformat__ = '''google'''
@@ -58,28 +70,106 @@ LOGGER_BASENAME = '''cookiegetter'''
 LOGGER = logging.getLogger(LOGGER_BASENAME)
 LOGGER.addHandler(logging.NullHandler())
 
-MAPS_LOGIN = ('https://accounts.google.com/signin/v2/identifier?'
-              'hl=en&'
-              'passive=true&'
-              'continue=https%3A%2F%2Fwww.google.com%2Fmaps%2F%4040.7484986%2C-73.9857129%2C15z%3Fhl%3Den&'
-              'service=local&'
-              'flowName=GlifWebSignIn&'
-              'flowEntry=ServiceLogin')
+MAPS_LOGIN = MAPS_PROFILE.login_url
 
-LOGGED_IN_HEURISTIC = 'Find local businesses, view maps and get driving directions in Google Maps.'
+ENGINES = {'selenium': ('chrome', 'firefox', 'ie', 'edge'),
+           'devtools': ('chrome',),
+           'bidi': ('chrome', 'firefox')}
 
 
-class CookieGetter:  # pylint: disable=too-few-public-methods
-    """Object able to retrieve the cookies from an interactive login session to a google maps service"""
+class CookieGetter:
+    """Object able to retrieve the cookies from an interactive login session to a google maps service
 
-    def __init__(self):
+    The detected os and browser and all the settings are kept in an immutable configuration and every harvest
+    keeps its state in its own HarvestSession, so a single cookie getter can serve concurrent harvests from
+    many threads. Unless a driver service is provided, the chrome sessions driven by selenium attach to a shared
+    chromedriver service of the cookie getter that is started on first use and stopped by close. The resources
+    used by the browser of every session are only sampled if a resource sampling interval in seconds is provided.
+    """
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 login_profile=MAPS_PROFILE,
+                 driver_service=None,
+                 engine='selenium',
+                 user_data_root=None,
+                 http_cache_seed=None,
+                 browser=None,
+                 driver_factory=None,
+                 sinks=None,
+                 change_streams=None,
+                 cookie_filter=None,
+                 admission=None,
+                 launch_limiter=None,
+                 resource_sampling_interval=None):
         logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
                                                 suffix=self.__class__.__name__)
         self._logger = logging.getLogger(logger_name)
-        self.os = self._identify_os()  # pylint: disable=invalid-name
-        self._logger.info('Identified OS as %s', self.os)
-        self.default_browser = self._identify_default_browser(self.os)
-        self._logger.info('Identified default browser as %s', self.default_browser)
+        identified_os = self._identify_os()
+        self._logger.info('Identified OS as %s', identified_os)
+        default_browser = browser or self._identify_default_browser(identified_os)
+        self._logger.info('Identified default browser as %s', default_browser)
+        self._logger.info('Using login profile %s', login_profile.name)
+        user_data_root = user_data_root or default_user_data_root()
+        sweep_user_data_directories(user_data_root)
+        if default_browser not in ENGINES.get(engine, ()):
+            self._logger.warning('Engine %s is not supported on %s, using selenium.', engine, default_browser)
+            engine = 'selenium'
+        self._single_flight = SingleFlight()
+        self._owned_driver_service = None
+        if driver_service is None and driver_factory is None and (default_browser, engine) == ('chrome', 'selenium'):
+            driver_service = self._owned_driver_service = SharedChromeDriverService()
+        self.configuration = HarvestConfiguration(os=identified_os,
+                                                  default_browser=default_browser,
+                                                  login_profile=login_profile,
+                                                  engine=engine,
+                                                  driver_service=driver_service,
+                                                  user_data_root=user_data_root,
+                                                  http_cache_seed=http_cache_seed,
+                                                  driver_factory=driver_factory,
+                                                  sink=self._combine_sinks(sinks, change_streams),
+                                                  cookie_filter=cookie_filter,
+                                                  admission=admission,
+                                                  launch_limiter=launch_limiter,
+                                                  resource_sampling_interval=resource_sampling_interval)
+
+    @staticmethod
+    def _combine_sinks(sinks, change_streams):
+        sinks = list(sinks or [FileSink()])
+        sink = sinks[0] if len(sinks) == 1 else CompositeSink(sinks)
+        return NotifyingSink(sink, change_streams) if change_streams else sink
+
+    @property
+    def sink(self):
+        """The sink the harvested cookies are written to"""
+        return self.configuration.sink
+
+    def close(self):
+        """Closes the sinks of the cookie getter and stops its shared driver service"""
+        try:
+            self.sink.close()
+        finally:
+            if self._owned_driver_service is not None:
+                self._owned_driver_service.stop()
+
+    @property
+    def os(self):  # pylint: disable=invalid-name
+        """The identified operating system"""
+        return self.configuration.os
+
+    @property
+    def default_browser(self):
+        """The browser used for the harvests"""
+        return self.configuration.default_browser
+
+    @property
+    def login_profile(self):
+        """The login profile used for the harvests"""
+        return self.configuration.login_profile
+
+    @property
+    def engine(self):
+        """The engine driving the browser"""
+        return self.configuration.engine
 
     @staticmethod
     def _identify_os():
@@ -154,50 +244,283 @@ class CookieGetter:  # pylint: disable=too-few-public-methods
                        'unknown')
         return browser
 
-    def _get_driver(self):
-        browsers = {'chrome': Chrome,
-                    'firefox': Firefox,
-                    'ie': IE,
-                    'edge': Edge}
-        return browsers.get(self.default_browser)()
+    def _get_driver(self, http_cache_seed=None):
+        return launch_driver(self.configuration, http_cache_seed)
+
+    def warm_up_http_cache(self, seed_path, settle_time=5):
+        """Loads the sign in page once and exports the resulting http cache as a seed for future sessions
+
+        Args:
+            seed_path (str): The directory to export the http cache seed to
+            settle_time (int): The number of seconds to let the sign in page load its resources
+
+        Returns:
+
+        """
+        harvest_session = HarvestSession(self.configuration, None, driver=self._get_driver(http_cache_seed=seed_path))
+        if getattr(harvest_session.driver, 'user_data_directory', None) is None:
+            self._logger.warning('Browser %s does not support an http cache seed.', self.default_browser)
+            harvest_session.driver.quit()
+            return
+        self._logger.info('Warming up the http cache with the sign in page.')
+        harvest_session.driver.get(self.login_profile.login_url)
+        sleep(settle_time)
+        harvest_session.log_cache_usage()
+        harvest_session.driver.user_data_directory.preserve_cache_to = seed_path
+        harvest_session.driver.quit()
 
-    def run(self, cookie_file_name='location_sharing.cookies'):
+    def run(self, cookie_file_name='location_sharing.cookies', reseed=False, wait_for_lock=True, save=True):
         """Executes the process and saves the cookies
 
+        Only one harvest per cookie file runs at a time. Concurrent calls on the same cookie getter join the
+        harvest in flight if they save alike, other cookie getters and processes wait for it to finish and reuse
+        its result, or give up if wait_for_lock is False.
+
         Args:
-            cookie_file_name (str): The path and name of the exported cookie file
+            cookie_file_name (str): The path and name of the exported cookie file, None to not use a file at all
+            reseed (bool): If True the last known cookies from the cookie file are loaded into the browser and
+                the interactive login is skipped if they are still accepted
+            wait_for_lock (bool): If False raise HarvestInProgress instead of waiting for another process
+            save (bool): If False the cookies are only returned and not written to the sinks
 
         Returns:
+            HarvestResult: The harvested cookie jar and its metadata, None if the browser was closed manually
 
         """
-        driver = self._get_driver()
-        self._logger.info('Starting interactive login process.')
+        if cookie_file_name is None:
+            return self._run(None, reseed, save)
+        return self._single_flight.do((os.path.abspath(cookie_file_name), save),
+                                      self._run_locked, cookie_file_name, reseed, wait_for_lock, save)
+
+    def _run_locked(self, cookie_file_name, reseed, wait_for_lock, save):
+        requested_at = time()
+        with HarvestLock(cookie_file_name, wait=wait_for_lock) as lock:
+            if lock.waited and os.path.exists(cookie_file_name) and last_verified(cookie_file_name) >= requested_at:
+                self._logger.info('Cookies in "%s" were harvested while waiting, reusing them.', cookie_file_name)
+                return HarvestResult.from_cookie_file(cookie_file_name)
+            return self._run(cookie_file_name, reseed, save)
+
+    def _run(self, cookie_file_name, reseed, save):
+        harvest_session = HarvestSession(self.configuration, cookie_file_name)
         try:
-            driver.get(MAPS_LOGIN)
-            while LOGGED_IN_HEURISTIC not in driver.page_source:
-                sleep(0.5)
-            session = self._get_session(driver)
-            self._save_cookies(session, cookie_file_name)
-            self._logger.info('Terminating browser session.')
-            driver.close()
-            driver.quit()
+            harvest_session.harvest(reseed and cookie_file_name is not None)
+            if save:
+                harvest_session.save()
         except NoSuchWindowException:
             self._logger.warning('Window disappeared, seems like it was closed manually')
+        finally:
+            if harvest_session.driver is not None:
+                harvest_session.terminate()
+        return harvest_session.result
+
+    def run_account(self, account, cookie_file_name=None, reseed=False, save=True):
+        """Harvests the cookies of a single account in a browser of its own, holding the lock of its cookie file
+
+        Args:
+            account (str): The name of the account
+            cookie_file_name (str): The path of the exported cookie file of the account
+            reseed (bool): If True the last known cookies of the account are tried before an interactive login
+            save (bool): If False the cookies are only returned and not written to the sinks
+
+        Returns:
+            HarvestResult: The harvested cookie jar and its metadata
+
+        """
+        with cookie_file_lock(cookie_file_name):
+            harvest_session = HarvestSession(self.configuration, cookie_file_name, account)
+            try:
+                harvest_session.harvest(reseed and cookie_file_name is not None)
+                if save:
+                    harvest_session.save()
+            finally:
+                if harvest_session.driver is not None:
+                    harvest_session.terminate()
+        return harvest_session.result
+
+    def run_batch(self,  # pylint: disable=too-many-arguments
+                  accounts,
+                  reseed=False,
+                  max_pending_teardowns=2,
+                  preloaded_browsers=0,
+                  batch_size=16,
+                  journal=None):
+        """Executes the process for many accounts with a browser each, overlapping teardown with the next launch
+
+        Saving the cookies and terminating the browser of an account happen in the background while the browser
+        of the next account is already launching, with at most max_pending_teardowns browsers waiting to go away.
+        With preloaded browsers a pool keeps that many browsers parked on a loaded sign in page so the next
+        account gets a ready login form immediately. With a journal the state of every account is persisted, so a
+        restarted batch only harvests the accounts that did not complete yet. The lock of the cookie file of an
+        account is held from its harvest until its cookies are written.
+
+        Args:
+            accounts (dict): A mapping of account names to the path of their exported cookie file
+            reseed (bool): If True the last known cookies of every account are tried before an interactive login
+            max_pending_teardowns (int): The maximum number of browsers being torn down at any time
+            preloaded_browsers (int): The number of browsers to keep parked on the sign in page
+            batch_size (int): The number of results written to the sinks together
+            journal (HarvestJournal): The journal to resume from and record the progress of the batch in
+
+        Returns:
+            dict: The HarvestResult of every account that was harvested
+
+        """
+        if journal is not None:
+            batch, accounts = accounts, journal.schedule(accounts)
+        pool = None
+        if preloaded_browsers and accounts:
+            pool = DriverPool(self._get_driver, self.login_profile.login_url, preloaded_browsers,
+                              demand=len(accounts))
+        try:
+            results = self._run_batch(accounts, reseed, max_pending_teardowns, pool, batch_size, journal)
+        finally:
+            if pool is not None:
+                pool.close()
+                self._logger.info('Median time to interactive of pooled browsers was %.2f seconds.',
+                                  median(pool.time_to_interactive or [0.0]))
+        if journal is not None and journal.is_finished(batch):
+            self._logger.info('All the accounts of the batch completed, clearing the journal.')
+            journal.clear()
+        return results
+
+    def _run_batch(self,  # pylint: disable=too-many-arguments
+                   accounts,
+                   reseed,
+                   max_pending_teardowns,
+                   pool,
+                   batch_size,
+                   journal):
+        results, locks = {}, {}
+        # an account only completes, and lets go of its cookie file, once the batch holding its cookies was written
+        sink = BatchingSink(self.sink, batch_size=batch_size, on_written=partial(self._batch_written, journal, locks))
+        try:
+            with TeardownPipeline(max_pending_teardowns) as pipeline:
+                for account, cookie_file_name in accounts.items():
+                    locks[account] = cookie_file_lock(cookie_file_name)
+                    harvest_session = self._harvest_account(account, cookie_file_name, reseed, pool, pipeline, journal,
+                                                            locks)
+                    if harvest_session is None:
+                        continue
+                    results[account] = harvest_session.result
+                    teardown = pipeline.submit(harvest_session.save_and_terminate, sink)
+                    if journal is not None:
+                        teardown.add_done_callback(partial(self._journal_teardown, journal, account))
+        finally:
+            try:
+                sink.flush()
+            finally:
+                for lock in list(locks.values()):
+                    lock.release()
+        return results
+
+    @staticmethod
+    def _batch_written(journal, locks, results):
+        for result in results:
+            if journal is not None:
+                journal.complete(result.account)
+            lock = locks.pop(result.account, None)
+            if lock is not None:
+                lock.release()
+
+    @staticmethod
+    def _journal_teardown(journal, account, teardown):
+        if teardown.exception() is not None and journal.state(account) != COMPLETED:
+            journal.fail(account, teardown.exception())
+
+    def _harvest_account(self,  # pylint: disable=too-many-arguments
+                         account,
+                         cookie_file_name,
+                         reseed,
+                         pool,
+                         pipeline,
+                         journal,
+                         locks):
+        self._logger.info('Harvesting cookies for account %s.', account)
+        locks[account].acquire()
+        if journal is not None:
+            journal.start(account)
+        harvest_session = HarvestSession(self.configuration, cookie_file_name, account,
+                                         driver=pool.acquire() if pool else None)
+        try:
+            harvest_session.harvest(reseed)
+        except NoSuchWindowException:
+            self._logger.warning('Window of account %s disappeared, seems like it was closed manually', account)
+            if journal is not None:
+                journal.fail(account, 'window closed')
+            if harvest_session.driver is not None:
+                pipeline.submit(harvest_session.terminate)
+            locks.pop(account).release()
+            return None
+        except Exception as error:
+            if journal is not None:
+                journal.fail(account, error)
+            if harvest_session.driver is not None:
+                pipeline.submit(harvest_session.terminate)
+            locks.pop(account).release()
+            raise
+        return harvest_session
+
+    def run_accounts(self, accounts, reseed=False):
+        """Executes the process for many accounts sharing a single browser
+
+        With chrome every account logs in inside its own isolated browser context of the same browser process so
+        cookies never leak between accounts, holding the lock of its cookie file until they are saved. Other
+        browsers fall back to a browser per account.
 
-    def _get_session(self, driver):
-        self._logger.info('Log in successful, getting session cookies.')
-        session = Session()
-        self._logger.info('Transferring cookies to a requests session.')
-        for cookie in driver.get_cookies():
-            for invalid in ['httpOnly', 'expiry']:
+        Args:
+            accounts (dict): A mapping of account names to the path of their exported cookie file
+            reseed (bool): If True the last known cookies of every account are tried before an interactive login
+
+        Returns:
+            dict: The HarvestResult of every account that was harvested
+
+        """
+        if self.default_browser != 'chrome':
+            self._logger.info('Browser contexts are only supported on chrome, using a browser per account.')
+            return self.run_batch(accounts, reseed=reseed)
+        results = {}
+        driver = self._get_driver()
+        try:
+            main_window = driver.current_window_handle
+            for account, cookie_file_name in accounts.items():
+                context = BrowserContext(driver, account)
+                harvest_session = HarvestSession(self.configuration, cookie_file_name, account, driver=driver)
+                lock = cookie_file_lock(cookie_file_name)
                 try:
-                    del cookie[invalid]
-                except KeyError:
-                    pass
-            session.cookies.set(**cookie)
-        return session
-
-    def _save_cookies(self, session, file_name):
-        self._logger.info('Saving the requests session to pickled file "%s".', file_name)
-        with open(file_name, 'wb') as ofile:
-            pickle.dump(session.cookies, ofile)
+                    lock.acquire()
+                    context.activate()
+                    if not (reseed and cookie_file_name is not None and harvest_session.reseed()):
+                        harvest_session.login()
+                    harvest_session.extract(context.get_cookies())
+                    harvest_session.log_measurements()
+                    harvest_session.save()
+                    results[account] = harvest_session.result
+                finally:
+                    lock.release()
+                    context.dispose()
+                    driver.switch_to.window(main_window)
+        except NoSuchWindowException:
+            self._logger.warning('Window disappeared, seems like it was closed manually')
+        finally:
+            self._logger.info('Terminating browser session.')
+            driver.quit()
+        return results
+
+
+def harvest(cookie_file_name=None, reseed=False, **settings):
+    """Harvests the cookies of an interactive login and returns them without a file round trip
+
+    Args:
+        cookie_file_name (str): If provided the cookies are also saved to this file and reused for reseeding
+        reseed (bool): If True the cookies of the cookie file are tried before an interactive login
+        **settings: The settings of the CookieGetter, like login_profile, engine, browser or sinks
+
+    Returns:
+        HarvestResult: The harvested cookie jar and its metadata, None if the browser was closed manually
+
+    """
+    getter = CookieGetter(**settings)
+    try:
+        return getter.run(cookie_file_name, reseed=reseed)
+    finally:
+        getter.close()
@@ -0,0 +1,648 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: distributed.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for distributed
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+from contextlib import ExitStack, contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Event, Thread
+from time import time
+
+from requests import Session
+from requests.exceptions import RequestException
+
+from mapscookiegettercli.mapscookiegettercliexceptions import WorkQueueUnavailable
+from .jarfile import cookie_jar_from_records
+from .locking import HarvestLock
+from .session import HarvestResult
+from .sinks import SQLiteSink, result_record
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''distributed'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+QUEUED = 'queued'
+LEASED = 'leased'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class WorkQueue:
+    """A queue of account harvests shared by a coordinator and many workers through a sqlite database
+
+    A worker claims a job with a lease it has to renew with heartbeats, a job whose lease expired, because its
+    worker died or hung, is handed to the next worker claiming one until it ran out of attempts. The results of
+    all the workers are stored in the cookie_jars table of the same database, the table the SQLiteSink writes.
+
+    The database is in write ahead log mode, which relies on shared memory between the processes using it, so only
+    processes on the host of the database, which has to be on a local file system, use it directly. Workers on
+    other hosts lease the jobs over http from a WorkQueueServer serving the queue.
+    """
+
+    def __init__(self, database, lease_duration=60, max_attempts=3):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.database = database
+        self.lease_duration = lease_duration
+        self.max_attempts = max_attempts
+        connection = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+        finally:
+            connection.close()
+        with self._transaction() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS jobs '
+                               '(account TEXT PRIMARY KEY, cookie_file_name TEXT, state TEXT, worker TEXT, '
+                               'lease_expires REAL, attempts INTEGER, error TEXT, updated_at REAL)')
+        self._store = SQLiteSink(database)
+
+    @contextmanager
+    def _transaction(self):
+        connection = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+    def enqueue(self, accounts):
+        """Queues the harvest of accounts, replacing the previous state of the ones that are not queued or leased
+
+        Jobs still queued or leased to a worker are left alone so queueing an account again never has it
+        harvested twice.
+
+        Args:
+            accounts (dict): A mapping of account names to the path of their exported cookie file
+
+        Returns:
+            None
+
+        """
+        now = time()
+        with self._transaction() as connection:
+            connection.executemany('INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, NULL, 0, 0, NULL, ?)',
+                                   [(account, cookie_file_name, QUEUED, now)
+                                    for account, cookie_file_name in accounts.items()])
+            connection.executemany('UPDATE jobs SET cookie_file_name = ?, state = ?, worker = NULL, lease_expires = 0, '
+                                   'attempts = 0, error = NULL, updated_at = ? WHERE account = ? '
+                                   'AND state NOT IN (?, ?)',
+                                   [(cookie_file_name, QUEUED, now, account, QUEUED, LEASED)
+                                    for account, cookie_file_name in accounts.items()])
+        self._logger.info('Queued %d accounts.', len(accounts))
+
+    def claim(self, worker):
+        """Claims the oldest queued job, or one whose lease expired, for a worker
+
+        Args:
+            worker (str): The name of the worker
+
+        Returns:
+            tuple: The account and cookie file name of the claimed job, None if there is nothing to claim
+
+        """
+        now = time()
+        with self._transaction() as connection:
+            exhausted = connection.execute('UPDATE jobs SET state = ?, error = ?, updated_at = ? '
+                                           'WHERE state = ? AND lease_expires < ? AND attempts >= ?',
+                                           (FAILED, 'lease expired on the last attempt', now,
+                                            LEASED, now, self.max_attempts)).rowcount
+            row = connection.execute('SELECT account, cookie_file_name, state FROM jobs '
+                                     'WHERE state = ? OR (state = ? AND lease_expires < ?) '
+                                     'ORDER BY updated_at LIMIT 1', (QUEUED, LEASED, now)).fetchone()
+            if row is not None:
+                connection.execute('UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, '
+                                   'attempts = attempts + 1, updated_at = ? WHERE account = ?',
+                                   (LEASED, worker, now + self.lease_duration, now, row[0]))
+        if exhausted:
+            self._logger.warning('%d jobs failed for good, their lease expired on the last of %d attempts.',
+                                 exhausted, self.max_attempts)
+        if row is None:
+            return None
+        account, cookie_file_name, state = row
+        if state == LEASED:
+            self._logger.warning('Lease of account %s expired, reclaimed by worker %s.', account, worker)
+        return account, cookie_file_name
+
+    def heartbeat(self, worker, account):
+        """Extends the lease of a job
+
+        Args:
+            worker (str): The name of the worker holding the lease
+            account (str): The account of the job
+
+        Returns:
+            bool: True if the lease was extended, False if the worker does not hold it any more
+
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute('UPDATE jobs SET lease_expires = ? WHERE account = ? AND worker = ? '
+                                        'AND state = ?', (time() + self.lease_duration, account, worker, LEASED))
+            return cursor.rowcount == 1
+
+    def store(self, result):
+        """Stores the result of a job in the results table
+
+        Args:
+            result (HarvestResult): The result to store
+
+        Returns:
+            None
+
+        """
+        self._store.write(result)
+
+    def complete(self, worker, account):
+        """Marks a job as completed
+
+        Args:
+            worker (str): The name of the worker holding the lease
+            account (str): The account of the job
+
+        Returns:
+            bool: True if the job was completed, False if the worker lost the lease to another one
+
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute('UPDATE jobs SET state = ?, updated_at = ? WHERE account = ? AND worker = ? '
+                                        'AND state = ?', (COMPLETED, time(), account, worker, LEASED))
+            return cursor.rowcount == 1
+
+    def fail(self, worker, account, error):
+        """Queues a failed job again, or marks it as failed once it ran out of attempts
+
+        Args:
+            worker (str): The name of the worker holding the lease
+            account (str): The account of the job
+            error (str): A description of the failure
+
+        Returns:
+            None
+
+        """
+        with self._transaction() as connection:
+            connection.execute('UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, '
+                               'updated_at = ? WHERE account = ? AND worker = ? AND state = ?',
+                               (self.max_attempts, FAILED, QUEUED, str(error), time(), account, worker, LEASED))
+
+    def counts(self):
+        """The number of jobs in every state
+
+        Returns:
+            dict: The number of jobs per state
+
+        """
+        with self._transaction() as connection:
+            return dict(connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    def is_done(self):
+        """Checks whether every job either completed or failed for good
+
+        Returns:
+            bool: True if there is no queued or leased job left
+
+        """
+        counts = self.counts()
+        return not counts.get(QUEUED) and not counts.get(LEASED)
+
+    def results(self):
+        """The latest stored result of every account
+
+        Returns:
+            dict: The HarvestResult of every account with a stored result
+
+        """
+        with self._transaction() as connection:
+            rows = connection.execute('SELECT account, cookie_file_name, harvested_at, browser, engine, '
+                                      'login_profile, cookies FROM cookie_jars WHERE rowid IN '
+                                      '(SELECT MAX(rowid) FROM cookie_jars GROUP BY account)').fetchall()
+        columns = ('account', 'cookie_file_name', 'harvested_at', 'browser', 'engine', 'login_profile', 'cookies')
+        records = [dict(zip(columns, row), cookies=json.loads(row[-1])) for row in rows]
+        return {record['account']: result_from_record(record) for record in records}
+
+
+def result_from_record(record):
+    """Creates a harvest result from its json serializable form
+
+    Args:
+        record (dict): The metadata and the cookies of the result as returned by result_record
+
+    Returns:
+        HarvestResult: The result
+
+    """
+    result = HarvestResult(cookie_jar_from_records(record['cookies']),
+                           account=record['account'],
+                           cookie_file_name=record['cookie_file_name'],
+                           browser=record['browser'],
+                           engine=record['engine'],
+                           login_profile=record['login_profile'])
+    result.harvested_at = record['harvested_at']
+    return result
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class WorkQueueServer:
+    """Serves a work queue over http so workers on other hosts can lease its jobs
+
+    Every operation of the queue a worker uses is a POST of a json object with its arguments to /<operation>,
+    answered with a json object. There is no authentication, the server has to listen on a trusted network.
+    """
+
+    def __init__(self, queue, host='127.0.0.1', port=0):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.queue = queue
+        self._operations = {'claim': self._claim,
+                            'heartbeat': self._heartbeat,
+                            'store': self._store,
+                            'complete': self._complete,
+                            'fail': self._fail,
+                            'status': self._status}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Dispatches the requests of the workers to the queue"""
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """Performs an operation on the queue"""
+                operation = server._operations.get(self.path.strip('/'))  # pylint: disable=protected-access
+                if operation is None:
+                    self.send_error(404)
+                    return
+                try:
+                    arguments = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    body = json.dumps(operation(**arguments)).encode('utf-8')
+                except (ValueError, TypeError, KeyError) as error:
+                    self.send_error(400, str(error))
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                server._logger.debug(format, *args)  # pylint: disable=protected-access
+
+        self._server = _ThreadingHTTPServer((host, port), Handler)
+        Thread(target=self._server.serve_forever, name='work-queue-server', daemon=True).start()
+        self._logger.info('Serving the work queue at %s.', self.url)
+
+    @property
+    def url(self):
+        """The url workers lease the jobs from"""
+        host, port = self._server.server_address[:2]
+        return 'http://{host}:{port}'.format(host=host, port=port)
+
+    def _claim(self, worker):
+        job = self.queue.claim(worker)
+        return {'job': list(job) if job is not None else None}
+
+    def _heartbeat(self, worker, account):
+        return {'extended': self.queue.heartbeat(worker, account)}
+
+    def _store(self, result):
+        self.queue.store(result_from_record(result))
+        return {}
+
+    def _complete(self, worker, account):
+        return {'completed': self.queue.complete(worker, account)}
+
+    def _fail(self, worker, account, error):
+        self.queue.fail(worker, account, error)
+        return {}
+
+    def _status(self):
+        return {'counts': self.queue.counts(), 'lease_duration': self.queue.lease_duration}
+
+    def close(self):
+        """Stops serving the queue"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RemoteWorkQueue:
+    """The side of a work queue a worker uses, leasing the jobs over http from a WorkQueueServer"""
+
+    def __init__(self, url, timeout=30):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._session = Session()
+        self.lease_duration = self._call('status')['lease_duration']
+
+    def _call(self, operation, **arguments):
+        try:
+            response = self._session.post('{url}/{operation}'.format(url=self.url, operation=operation),
+                                          json=arguments,
+                                          timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (RequestException, ValueError) as error:
+            raise WorkQueueUnavailable('{operation} on {url} failed: {error}'.format(operation=operation,
+                                                                                    url=self.url,
+                                                                                    error=error)) from error
+
+    def claim(self, worker):
+        """Claims the oldest queued job, or a job whose lease expired
+
+        Args:
+            worker (str): The name of the worker claiming the job
+
+        Returns:
+            tuple: The account and cookie file name of the job, None if there is no job to claim
+
+        """
+        job = self._call('claim', worker=worker)['job']
+        return tuple(job) if job is not None else None
+
+    def heartbeat(self, worker, account):
+        """Extends the lease of a job
+
+        Args:
+            worker (str): The name of the worker holding the lease
+            account (str): The account of the job
+
+        Returns:
+            bool: True if the lease was extended, False if the worker does not hold it any more
+
+        """
+        return self._call('heartbeat', worker=worker, account=account)['extended']
+
+    def store(self, result):
+        """Stores the result of a job with the queue
+
+        Args:
+            result (HarvestResult): The result to store
+
+        Returns:
+            None
+
+        """
+        self._call('store', result=result_record(result))
+
+    def complete(self, worker, account):
+        """Marks a job as completed
+
+        Args:
+            worker (str): The name of the worker holding the lease
+            account (str): The account of the job
+
+        Returns:
+            bool: True if the job was completed, False if the worker lost the lease to another one
+
+        """
+        return self._call('complete', worker=worker, account=account)['completed']
+
+    def fail(self, worker, account, error):
+        """Queues a failed job again, or marks it as failed once it ran out of attempts
+
+        Args:
+            worker (str): The name of the worker holding the lease
+            account (str): The account of the job
+            error (str): A description of the failure
+
+        Returns:
+            None
+
+        """
+        self._call('fail', worker=worker, account=account, error=str(error))
+
+    def counts(self):
+        """The number of jobs in every state
+
+        Returns:
+            dict: The number of jobs per state
+
+        """
+        return self._call('status')['counts']
+
+    def is_done(self):
+        """Checks whether every job either completed or failed for good
+
+        Returns:
+            bool: True if there is no queued or leased job left
+
+        """
+        counts = self.counts()
+        return not counts.get(QUEUED) and not counts.get(LEASED)
+
+
+def create_work_queue(specification):
+    """Creates the work queue a worker leases its jobs from
+
+    Args:
+        specification (str): The http url of a WorkQueueServer or the path of a local sqlite database
+
+    Returns:
+        The work queue
+
+    """
+    if specification.startswith(('http://', 'https://')):
+        return RemoteWorkQueue(specification)
+    return WorkQueue(specification)
+
+
+class HarvestWorker:
+    """Claims jobs from a work queue and harvests them with a cookie getter until the queue is done
+
+    The queue is either the local WorkQueue or a RemoteWorkQueue leasing the jobs from a coordinator on another
+    host. While a harvest runs a heartbeat renews its lease every third of the lease duration. The cookies are only
+    stored with the queue, the coordinator writes them to their final destination.
+    """
+
+    def __init__(self, queue, cookie_getter, name=None, poll_interval=1):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.queue = queue
+        self.cookie_getter = cookie_getter
+        self.name = name or '{host}-{pid}'.format(host=socket.gethostname(), pid=os.getpid())
+        self.poll_interval = poll_interval
+        self._stopped = Event()
+
+    def _heartbeat(self, account, done):
+        while not done.wait(self.queue.lease_duration / 3.0):
+            if not self.queue.heartbeat(self.name, account):
+                self._logger.warning('Worker %s lost the lease of account %s.', self.name, account)
+                return
+
+    def work(self, account, cookie_file_name):
+        """Harvests a claimed job, keeping its lease alive, and stores the result
+
+        Args:
+            account (str): The account of the job
+            cookie_file_name (str): The cookie file of the account
+
+        Returns:
+            bool: True if the job completed, False otherwise
+
+        """
+        done = Event()
+        heartbeat = Thread(target=self._heartbeat, args=(account, done), name='lease-heartbeat', daemon=True)
+        heartbeat.start()
+        try:
+            result = self.cookie_getter.run_account(account, cookie_file_name, save=False)
+            if result is None:
+                raise ValueError('No cookies were harvested')
+            self.queue.store(result)
+        except Exception as error:  # pylint: disable=broad-except
+            self._logger.error('Harvest of account %s failed: %s', account, error)
+            self.queue.fail(self.name, account, error)
+            return False
+        finally:
+            done.set()
+            heartbeat.join()
+        if not self.queue.complete(self.name, account):
+            self._logger.warning('Account %s was reclaimed by another worker while %s harvested it.',
+                                 account, self.name)
+        return True
+
+    def run(self):
+        """Works on jobs until the queue is done or unreachable, or the worker is stopped
+
+        Returns:
+            int: The number of jobs the worker completed
+
+        """
+        completed = 0
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            try:
+                job = self.queue.claim(self.name)
+            except WorkQueueUnavailable as error:
+                self._logger.warning('Worker %s stopping, the work queue went away: %s', self.name, error)
+                break
+            if job is None:
+                if self.queue.is_done():
+                    break
+                self._stopped.wait(self.poll_interval)
+                continue
+            self._logger.info('Worker %s harvesting account %s.', self.name, job[0])
+            completed += self.work(*job)
+        self._logger.info('Worker %s completed %d jobs.', self.name, completed)
+        return completed
+
+    def stop(self):
+        """Stops the worker after its current job"""
+        self._stopped.set()
+
+
+class HarvestCoordinator:
+    """Distributes the harvests of accounts to workers and collects their results into a single sink
+
+    With a listen address, "<host>:<port>", the queue is served over http while the coordinator runs, for workers
+    on other hosts.
+    """
+
+    def __init__(self, queue, poll_interval=1, listen=None):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.listen = listen
+
+    def run(self, accounts, sink=None, stopped=None):
+        """Queues the accounts, waits for the workers to finish and writes the results to the sink
+
+        The results are written holding the locks of their cookie files, like every other harvest writing them.
+
+        Args:
+            accounts (dict): A mapping of account names to the path of their exported cookie file
+            sink (CookieSink): The sink the results are written to, None to only return them
+            stopped (Event): An event that ends the wait early when set
+
+        Returns:
+            dict: The HarvestResult of every account that was harvested
+
+        """
+        started = time()
+        self.queue.enqueue(accounts)
+        stopped = stopped or Event()
+        server = None
+        if self.listen:
+            host, _, port = self.listen.rpartition(':')
+            server = WorkQueueServer(self.queue, host or '127.0.0.1', int(port))
+        try:
+            while not self.queue.is_done() and not stopped.is_set():
+                self._logger.debug('Jobs per state: %s', self.queue.counts())
+                stopped.wait(self.poll_interval)
+        finally:
+            if server is not None:
+                server.close()
+        counts = self.queue.counts()
+        self._logger.info('%d accounts completed, %d failed.', counts.get(COMPLETED, 0), counts.get(FAILED, 0))
+        results = {account: result for account, result in self.queue.results().items()
+                   if account in accounts and result.harvested_at >= started}
+        if sink is not None and results:
+            # locked in a stable order so two coordinators writing overlapping accounts can not deadlock
+            with ExitStack() as locks:
+                for cookie_file_name in sorted({result.cookie_file_name for result in results.values()
+                                                if result.cookie_file_name}):
+                    locks.enter_context(HarvestLock(cookie_file_name))
+                sink.write_batch(list(results.values()))
+        return results
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: freshness.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for freshness
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+from pickle import UnpicklingError
+from time import time
+
+from .jarfile import last_verified, load_cookie_jar
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''freshness'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+AUTH_COOKIE_NAMES = ('SID', 'HSID', 'SSID', 'APISID', 'SAPISID')
+
+DEFAULT_MARGIN = 24 * 60 * 60
+
+
+def is_cookie_jar_fresh(file_name, margin=DEFAULT_MARGIN, max_age=None, auth_cookie_names=AUTH_COOKIE_NAMES):
+    """Checks whether an exported cookie jar is still valid for at least the provided margin
+
+    The jar is considered fresh if all the authentication cookies are present and none of them expires within
+    the margin and, if a maximum age is provided, the cookies were harvested or verified less than that many
+    seconds ago.
+    Authentication cookies without an expiry are assumed to expire max_age seconds after they were verified,
+    without a maximum age their lifetime is unknown and the jar is considered stale.
+
+    Args:
+        file_name (str): The path of the exported cookie file
+        margin (int): The number of seconds the authentication cookies should still be valid for
+        max_age (int): The maximum age of the cookies in seconds, None to ignore the age of the cookies
+        auth_cookie_names (tuple): The names of the cookies required for an authenticated session
+
+    Returns:
+        bool: True if the jar can be used as is, False if the cookies need to be harvested again
+
+    """
+    now = time()
+    try:
+        verified = last_verified(file_name)
+        cookie_jar = load_cookie_jar(file_name)
+    except (OSError, EOFError, UnpicklingError):
+        LOGGER.info('No usable cookie jar found at "%s".', file_name)
+        return False
+    if max_age is not None and now - verified > max_age:
+        LOGGER.info('Cookie jar "%s" was verified %d seconds ago, more than %d.', file_name, now - verified, max_age)
+        return False
+    cookies = {cookie.name: cookie for cookie in cookie_jar if cookie.name in auth_cookie_names}
+    missing = sorted(set(auth_cookie_names) - set(cookies))
+    if missing:
+        LOGGER.info('Cookie jar "%s" lacks authentication cookies %s.', file_name, ', '.join(missing))
+        return False
+    unknown = sorted(name for name, cookie in cookies.items() if not cookie.expires)
+    if unknown and max_age is None:
+        LOGGER.info('Authentication cookies %s of "%s" have no expiry and no maximum age was provided.',
+                    ', '.join(unknown), file_name)
+        return False
+    expiring = sorted(name for name, cookie in cookies.items()
+                      if (cookie.expires or verified + max_age) < now + margin)
+    if expiring:
+        LOGGER.info('Authentication cookies %s of "%s" expire within %d seconds.',
+                    ', '.join(expiring), file_name, margin)
+        return False
+    LOGGER.info('Cookie jar "%s" is valid for at least %d more seconds.', file_name, margin)
+    return True
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: jarfile.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for jarfile
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+from requests.cookies import RequestsCookieJar
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''jarfile'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+VERIFIED_SUFFIX = '.verified'
+
+
+def load_cookie_jar(file_name):
+    """Loads a pickled cookie jar as exported by the cookie getter
+
+    Args:
+        file_name (str): The path of the pickled cookie file
+
+    Returns:
+        RequestsCookieJar: The cookie jar stored in the file
+
+    """
+    LOGGER.debug('Loading cookie jar from "%s".', file_name)
+    with open(file_name, 'rb') as ifile:
+        return pickle.load(ifile)
+
+
+def save_cookie_jar(cookie_jar, file_name):
+    """Pickles a cookie jar to the provided file in the format locationsharinglib expects
+
+    The jar is written to a temporary file next to the target that is renamed into place, so readers never see
+    a partially written file.
+
+    Args:
+        cookie_jar (RequestsCookieJar): The cookie jar to save
+        file_name (str): The path of the pickled cookie file
+
+    Returns:
+        None
+
+    """
+    LOGGER.debug('Saving cookie jar to "%s".', file_name)
+    directory, name = os.path.split(os.path.abspath(file_name))
+    descriptor, temporary_name = tempfile.mkstemp(prefix='.{name}.'.format(name=name), dir=directory)
+    try:
+        with os.fdopen(descriptor, 'wb') as ofile:
+            pickle.dump(cookie_jar, ofile)
+            ofile.flush()
+            os.fsync(ofile.fileno())
+        os.replace(temporary_name, file_name)
+    except BaseException:
+        os.unlink(temporary_name)
+        raise
+
+
+def mark_verified(file_name):
+    """Records that the cookies of a cookie file were found still valid without rewriting the file
+
+    The time is kept in a "<cookie file>.verified" file next to it so the modification time of the cookie file,
+    that consumers watch, only changes when its content does.
+
+    Args:
+        file_name (str): The path of the pickled cookie file
+
+    Returns:
+        None
+
+    """
+    with open(file_name + VERIFIED_SUFFIX, 'a'):
+        pass
+    os.utime(file_name + VERIFIED_SUFFIX)
+
+
+def last_verified(file_name):
+    """The last time the cookies of a cookie file were harvested or verified
+
+    Args:
+        file_name (str): The path of the pickled cookie file
+
+    Returns:
+        float: The later of the modification time of the cookie file and the time it was last verified
+
+    Raises:
+        OSError: If the cookie file does not exist
+
+    """
+    modified = os.path.getmtime(file_name)
+    try:
+        return max(modified, os.path.getmtime(file_name + VERIFIED_SUFFIX))
+    except OSError:
+        return modified
+
+
+def cookie_records(cookie_jar):
+    """Converts a cookie jar to its canonical form, a sorted list of json serializable cookies
+
+    Args:
+        cookie_jar (RequestsCookieJar): The cookie jar to convert
+
+    Returns:
+        list: The cookies as dictionaries with name, value, domain, path, secure and expires, sorted by domain,
+            path and name
+
+    """
+    records = [{'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'secure': cookie.secure,
+                'expires': cookie.expires} for cookie in cookie_jar]
+    return sorted(records, key=lambda record: (record['domain'], record['path'], record['name']))
+
+
+def cookie_jar_from_records(records):
+    """Creates a cookie jar from cookies in their canonical form
+
+    Args:
+        records (list): The cookies as returned by cookie_records
+
+    Returns:
+        RequestsCookieJar: The cookie jar holding the cookies
+
+    """
+    cookie_jar = RequestsCookieJar()
+    for record in records:
+        cookie_jar.set(**record)
+    return cookie_jar
+
+
+def cookie_jar_hash(cookie_jar):
+    """Calculates a hash of the canonical form of a cookie jar
+
+    Args:
+        cookie_jar (RequestsCookieJar): The cookie jar to hash
+
+    Returns:
+        str: The hex sha256 digest of the cookies
+
+    """
+    return hashlib.sha256(json.dumps(cookie_records(cookie_jar), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def diff_cookie_jars(old_cookie_jar, new_cookie_jar):
+    """Compares two cookie jars cookie by cookie
+
+    Args:
+        old_cookie_jar (RequestsCookieJar): The previous cookie jar
+        new_cookie_jar (RequestsCookieJar): The current cookie jar
+
+    Returns:
+        dict: The "added", "removed" and "changed" cookies as sorted lists of "domain path name" strings
+
+    """
+    def index(cookie_jar):
+        return {'{domain} {path} {name}'.format(**record): record for record in cookie_records(cookie_jar)}
+
+    old, new = index(old_cookie_jar), index(new_cookie_jar)
+    return {'added': sorted(set(new) - set(old)),
+            'removed': sorted(set(old) - set(new)),
+            'changed': sorted(key for key in set(old) & set(new) if old[key] != new[key])}
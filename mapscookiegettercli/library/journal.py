@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: journal.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for journal
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import json
+import logging
+import os
+import tempfile
+from collections import namedtuple, OrderedDict
+from threading import Lock
+from time import time
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''journal'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+JobState = namedtuple('JobState', ('account', 'state', 'updated_at', 'attempts', 'retry_at', 'error'))
+
+
+class HarvestJournal:  # pylint: disable=too-many-instance-attributes
+    """An append-only journal of the state of the harvest of every account of a batch
+
+    Every state change is appended as a line of json and synced to disk before the harvest proceeds, so after a
+    crash or restart the batch resumes with the accounts that were queued, interrupted while running or whose
+    backoff after a failure expired, and skips the completed ones. Failures back off exponentially from
+    backoff up to max_backoff seconds. Once the journal holds compact_after records more than it has jobs it is
+    rewritten with only the current state of every job, and once every account of a batch completed it is
+    cleared for the next one. A torn record left by a crash in the middle of a write is dropped by compacting the
+    journal when it is replayed.
+    """
+
+    def __init__(self, path, compact_after=1000, backoff=60, max_backoff=3600):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.path = path
+        self.compact_after = compact_after
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = Lock()
+        self._jobs = OrderedDict()
+        self._records = 0
+        self._replay()
+
+    def _replay(self):
+        try:
+            with open(self.path) as journal:
+                lines = journal.readlines()
+        except FileNotFoundError:
+            return
+        torn = False
+        for line in lines:
+            try:
+                job = JobState(**json.loads(line))
+            except (ValueError, TypeError):
+                self._logger.warning('Ignoring a torn record in journal "%s".', self.path)
+                torn = True
+                continue
+            self._jobs[job.account] = job
+        self._records = len(lines)
+        self._logger.info('Replayed %d records of journal "%s" into %d jobs.', len(lines), self.path, len(self._jobs))
+        if torn:
+            self._rewrite(list(self._jobs.values()))
+
+    @property
+    def jobs(self):
+        """The current state of every job in the journal"""
+        with self._lock:
+            return dict(self._jobs)
+
+    def _append(self, job):
+        with self._lock:
+            self._jobs[job.account] = job
+            with open(self.path, 'a') as journal:
+                journal.write(json.dumps(job._asdict(), sort_keys=True) + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+            self._records += 1
+            if self._records - len(self._jobs) >= self.compact_after:
+                self._rewrite(self._jobs.values())
+
+    def _rewrite(self, jobs):
+        directory, name = os.path.split(os.path.abspath(self.path))
+        descriptor, temporary_name = tempfile.mkstemp(prefix='.{name}.'.format(name=name), dir=directory)
+        with os.fdopen(descriptor, 'w') as journal:
+            for job in jobs:
+                journal.write(json.dumps(job._asdict(), sort_keys=True) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temporary_name, self.path)
+        self._records = len(self._jobs)
+        self._logger.debug('Compacted journal "%s" to %d records.', self.path, self._records)
+
+    def compact(self):
+        """Rewrites the journal with only the current state of every job"""
+        with self._lock:
+            self._rewrite(list(self._jobs.values()))
+
+    def clear(self):
+        """Forgets all the jobs, starting the next batch from scratch"""
+        with self._lock:
+            self._jobs.clear()
+            self._rewrite([])
+
+    def state(self, account):
+        """The state of the job of an account
+
+        Args:
+            account (str): The name of the account
+
+        Returns:
+            str: The state of the job, None if the account is not in the journal
+
+        """
+        with self._lock:
+            job = self._jobs.get(account)
+        return job.state if job is not None else None
+
+    def _job(self, account):
+        return self._jobs.get(account) or JobState(account, QUEUED, time(), 0, 0, None)
+
+    def schedule(self, accounts, now=None):
+        """Queues the accounts that need a harvest and returns the ones to run now
+
+        Args:
+            accounts (dict): A mapping of account names to the path of their exported cookie file
+            now (float): The current time, used to check the backoff of failed accounts
+
+        Returns:
+            dict: The accounts to harvest now, interrupted ones first
+
+        """
+        now = time() if now is None else now
+        interrupted, due = OrderedDict(), OrderedDict()
+        for account, cookie_file_name in accounts.items():
+            job = self._jobs.get(account)
+            if job is None:
+                self._append(JobState(account, QUEUED, now, 0, 0, None))
+                due[account] = cookie_file_name
+            elif job.state == COMPLETED:
+                self._logger.info('Account %s was already harvested in this batch, skipping.', account)
+            elif job.state == FAILED and job.retry_at > now:
+                self._logger.info('Account %s is backing off until %.0f, skipping.', account, job.retry_at)
+            elif job.state == RUNNING:
+                self._logger.info('Harvest of account %s was interrupted, running it again.', account)
+                interrupted[account] = cookie_file_name
+            else:
+                due[account] = cookie_file_name
+        interrupted.update(due)
+        return interrupted
+
+    def start(self, account):
+        """Records that the harvest of an account started
+
+        Args:
+            account (str): The name of the account
+
+        Returns:
+            None
+
+        """
+        job = self._job(account)
+        self._append(job._replace(state=RUNNING, updated_at=time(), attempts=job.attempts + 1))
+
+    def complete(self, account):
+        """Records that the harvest of an account completed
+
+        Args:
+            account (str): The name of the account
+
+        Returns:
+            None
+
+        """
+        self._append(self._job(account)._replace(state=COMPLETED, updated_at=time(), retry_at=0, error=None))
+
+    def fail(self, account, error):
+        """Records that the harvest of an account failed and when to retry it
+
+        Args:
+            account (str): The name of the account
+            error (str): A description of the failure
+
+        Returns:
+            float: The time after which the account is retried
+
+        """
+        job = self._job(account)
+        now = time()
+        retry_at = now + min(self.backoff * 2 ** max(job.attempts - 1, 0), self.max_backoff)
+        self._append(job._replace(state=FAILED, updated_at=now, retry_at=retry_at, error=str(error)))
+        return retry_at
+
+    def is_finished(self, accounts):
+        """Checks whether every one of the accounts completed
+
+        Args:
+            accounts (iterable): The names of the accounts of the batch
+
+        Returns:
+            bool: True if all the accounts completed, False otherwise
+
+        """
+        with self._lock:
+            return all(getattr(self._jobs.get(account), 'state', None) == COMPLETED for account in accounts)
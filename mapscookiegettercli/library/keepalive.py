@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: keepalive.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for keepalive
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+from pickle import UnpicklingError
+from threading import Event
+from urllib.parse import urlsplit
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from mapscookiegettercli.mapscookiegettercliexceptions import KeepAliveFailed
+from .jarfile import load_cookie_jar
+from .loginprofile import SIGN_IN_PATHS
+from .session import HarvestResult
+from .sinks import FileSink
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''keepalive'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+DEFAULT_INTERVAL = 6 * 60 * 60
+
+
+class KeepAliveRequest:  # pylint: disable=too-few-public-methods
+    """A lightweight request that makes google rotate or extend the session cookies"""
+
+    def __init__(self, url, method='GET', data=None):
+        self.url = url
+        self.method = method
+        self.data = data
+
+    def __repr__(self):
+        return '{name}({method} {url})'.format(name=self.__class__.__name__, method=self.method, url=self.url)
+
+
+KEEP_ALIVE_REQUESTS = (KeepAliveRequest('https://accounts.google.com/RotateCookies',
+                                        method='POST',
+                                        data='[000,"-0000000000000000000"]'),
+                       KeepAliveRequest('https://myaccount.google.com/?hl=en'))
+
+
+class CookieKeepAlive:  # pylint: disable=too-many-instance-attributes
+    """Extends the lifetime of an exported cookie jar over plain http without starting a browser
+
+    A session is signed out when a request fails or ends up, after its redirects, on a path starting with one of
+    the signed out paths. Only if the session can not be extended any more the provided cookie getter is used to
+    perform a full interactive browser login. With a cookie getter the refreshed cookies are written through its
+    sinks.
+    """
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 cookie_file_name='location_sharing.cookies',
+                 keep_alive_requests=KEEP_ALIVE_REQUESTS,
+                 signed_out_paths=SIGN_IN_PATHS,
+                 cookie_getter=None,
+                 timeout=30):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.cookie_file_name = cookie_file_name
+        self.keep_alive_requests = keep_alive_requests
+        self.signed_out_paths = tuple(signed_out_paths)
+        self.cookie_getter = cookie_getter
+        self.timeout = timeout
+        self._session = Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._stopped = Event()
+        self._file_sink = FileSink()
+
+    def refresh(self):
+        """Performs the keep alive requests with the stored cookies and writes back the refreshed jar
+
+        Returns:
+            RequestsCookieJar: The refreshed cookie jar
+
+        Raises:
+            KeepAliveFailed: If any of the requests shows that the session is not valid any more
+
+        """
+        try:
+            cookie_jar = load_cookie_jar(self.cookie_file_name)
+        except (OSError, EOFError, UnpicklingError) as error:
+            raise KeepAliveFailed('Could not load cookie jar "{}": {}'.format(self.cookie_file_name, error)) from error
+        self._session.cookies.clear()
+        self._session.cookies.update(cookie_jar)
+        for request in self.keep_alive_requests:
+            self._logger.debug('Performing keep alive request %s.', request)
+            try:
+                response = self._session.request(request.method,
+                                                 request.url,
+                                                 data=request.data,
+                                                 timeout=self.timeout)
+            except RequestException as error:
+                raise KeepAliveFailed('Keep alive request {} failed: {}'.format(request, error)) from error
+            if not response.ok or urlsplit(response.url).path.startswith(self.signed_out_paths):
+                raise KeepAliveFailed('Keep alive request {} shows a signed out session.'.format(request))
+        sink = self.cookie_getter.sink if self.cookie_getter is not None else self._file_sink
+        sink.write(HarvestResult(self._session.cookies.copy(), cookie_file_name=self.cookie_file_name))
+        self._logger.info('Refreshed cookie jar "%s" over http.', self.cookie_file_name)
+        return self._session.cookies
+
+    def keep_alive(self):
+        """Refreshes the cookie jar and escalates to a browser login if that is not possible
+
+        Returns:
+            bool: True if the jar was refreshed over http, False if a browser login was required
+
+        Raises:
+            KeepAliveFailed: If the jar could not be refreshed and there is no cookie getter to escalate to
+
+        """
+        try:
+            self.refresh()
+            return True
+        except KeepAliveFailed as error:
+            if self.cookie_getter is None:
+                raise
+            self._logger.warning('%s Escalating to a browser login.', error)
+        self.cookie_getter.run(self.cookie_file_name)
+        return False
+
+    def run(self, interval=DEFAULT_INTERVAL):
+        """Keeps the cookie jar alive every interval seconds until stopped
+
+        Args:
+            interval (int): The number of seconds between refreshes
+
+        Returns:
+            None
+
+        """
+        self._stopped.clear()
+        while not self._stopped.is_set():
+            self.keep_alive()
+            self._stopped.wait(interval)
+
+    def stop(self):
+        """Stops a running keep alive loop"""
+        self._stopped.set()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: loader.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for loader
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+import mmap
+import os
+import pickle
+from collections import namedtuple, OrderedDict
+from threading import Lock
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''loader'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+COOKIE_FILE_SUFFIX = '.cookies'
+
+JarEntry = namedtuple('JarEntry', ('account', 'path', 'size', 'modified', 'protocol'))
+
+
+def read_pickle_protocol(path):
+    """Reads the protocol of a pickle file from its header without unpickling it
+
+    Args:
+        path (str): The path of the pickle file
+
+    Returns:
+        int: The pickle protocol, 0 for the header-less protocols before 2 and None for an empty file
+
+    """
+    with open(path, 'rb') as ifile:
+        header = ifile.read(2)
+    if not header:
+        return None
+    if header[0:1] == pickle.PROTO:
+        return header[1]
+    return 0
+
+
+def file_identity(stat):
+    """The identity of a version of a file, changing whenever the file is rewritten or replaced
+
+    The float modification time alone misses rewrites within its resolution, the inode catches atomic
+    replacements and the size the rewrites that keep the inode and the time.
+
+    Args:
+        stat (os.stat_result): The status of the file
+
+    Returns:
+        tuple: The inode, the modification time in nanoseconds and the size of the file
+
+    """
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _load_mapped(path):
+    with open(path, 'rb') as ifile:
+        identity = file_identity(os.fstat(ifile.fileno()))
+        with mmap.mmap(ifile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return identity, pickle.loads(mapped)
+
+
+class CookieJarIndex:
+    """A lazily loading index of a directory of cookie files as exported by the cookie getter
+
+    Building the index only lists the directory and reads the pickle header of every file, the cookie jar of an
+    account is unpickled from a memory map of its file on first use. At most max_resident cookie jars are kept
+    loaded, the least recently used one is dropped when that is exceeded, and a cookie jar is loaded again if its
+    file was replaced since it was loaded.
+    """
+
+    def __init__(self, directory, max_resident=64):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.directory = directory
+        self.max_resident = max_resident
+        self._lock = Lock()
+        self._resident = OrderedDict()
+        self._entries = {}
+        self.refresh()
+
+    def refresh(self):
+        """Indexes the cookie files of the directory again, picking up added and removed accounts"""
+        entries = {}
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(COOKIE_FILE_SUFFIX) or not entry.is_file():
+                continue
+            account = entry.name[:-len(COOKIE_FILE_SUFFIX)]
+            stat = entry.stat()
+            protocol = read_pickle_protocol(entry.path)
+            if protocol is None:
+                self._logger.warning('Skipping empty cookie file "%s".', entry.path)
+                continue
+            entries[account] = JarEntry(account, entry.path, stat.st_size, stat.st_mtime, protocol)
+        with self._lock:
+            self._entries = entries
+            for account in set(self._resident) - set(entries):
+                del self._resident[account]
+        self._logger.debug('Indexed %d cookie files in "%s".', len(entries), self.directory)
+
+    @property
+    def accounts(self):
+        """The accounts with a cookie file in the directory"""
+        return sorted(self._entries)
+
+    @property
+    def resident(self):
+        """The accounts with a loaded cookie jar, least recently used first"""
+        with self._lock:
+            return list(self._resident)
+
+    def entry(self, account):
+        """The index entry of an account
+
+        Args:
+            account (str): The name of the account
+
+        Returns:
+            JarEntry: The path, size, modification time and pickle protocol of the cookie file of the account
+
+        """
+        return self._entries[account]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, account):
+        return account in self._entries
+
+    def __iter__(self):
+        return iter(self.accounts)
+
+    def __getitem__(self, account):
+        return self.get(account)
+
+    def get(self, account):
+        """Gets the cookie jar of an account, loading it if it is not resident
+
+        Args:
+            account (str): The name of the account
+
+        Returns:
+            RequestsCookieJar: The cookie jar of the account
+
+        Raises:
+            KeyError: If the account has no cookie file in the directory
+
+        """
+        entry = self._entries[account]
+        identity = file_identity(os.stat(entry.path))
+        with self._lock:
+            cached = self._resident.get(account)
+            if cached is not None and cached[0] == identity:
+                self._resident.move_to_end(account)
+                return cached[1]
+        self._logger.debug('Loading the cookie jar of account %s from "%s".', account, entry.path)
+        identity, cookie_jar = _load_mapped(entry.path)
+        with self._lock:
+            self._resident[account] = (identity, cookie_jar)
+            self._resident.move_to_end(account)
+            while len(self._resident) > self.max_resident:
+                self._resident.popitem(last=False)
+        return cookie_jar
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: locking.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for locking
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+import os
+from threading import Event, Lock
+from time import sleep, time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # pylint: disable=invalid-name
+
+from mapscookiegettercli.mapscookiegettercliexceptions import HarvestInProgress
+from mapscookiegettercli.browsers.userdata import is_running
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''locking'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+DEFAULT_STALE_AFTER = 60 * 60
+POLL_INTERVAL = 0.5
+
+
+class HarvestLock:
+    """An exclusive cross process lock for the harvest of a cookie file
+
+    The lock is an flock on a lock file next to the cookie file, which the kernel releases when its owner
+    exits, so a held flock always belongs to a live harvest and is never broken. The lock file also holds the pid
+    of the owner and the time it was taken for diagnostics. Without fcntl, on windows, those contents are the
+    only lock and one whose owner is not running any more or that is older than stale_after seconds is
+    considered stale and broken by replacing the lock file.
+    """
+
+    def __init__(self, cookie_file_name, wait=True, stale_after=DEFAULT_STALE_AFTER):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.path = '{}.lock'.format(cookie_file_name)
+        self.wait = wait
+        self.stale_after = stale_after
+        self.waited = False
+        self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def _holder(self):
+        try:
+            with open(self.path) as lock_file:
+                pid, taken_at = lock_file.read().split()
+            return int(pid), float(taken_at)
+        except (OSError, ValueError):
+            return None, None
+
+    def _is_stale(self):
+        pid, taken_at = self._holder()
+        if pid is None:
+            return False
+        if not is_running(pid):
+            self._logger.warning('Lock "%s" is held by process %s that is not running, breaking it.', self.path, pid)
+            return True
+        if time() - taken_at > self.stale_after:
+            self._logger.warning('Lock "%s" is held for more than %d seconds, breaking it.', self.path,
+                                 self.stale_after)
+            return True
+        return False
+
+    def _try_lock(self):
+        lock_file = open(self.path, 'a+')  # pylint: disable=consider-using-with
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif os.fstat(lock_file.fileno()).st_size and not self._is_stale():
+                raise BlockingIOError
+            if os.fstat(lock_file.fileno()).st_ino != os.stat(self.path).st_ino:
+                raise BlockingIOError
+        except (BlockingIOError, FileNotFoundError):
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write('{} {}'.format(os.getpid(), time()))
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def acquire(self):
+        """Acquires the lock, waiting for it if configured to
+
+        Raises:
+            HarvestInProgress: If the lock is held by another harvest and waiting is disabled
+
+        """
+        while not self._try_lock():
+            if fcntl is None and self._is_stale():
+                try:
+                    os.unlink(self.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            if not self.wait:
+                raise HarvestInProgress(self.path)
+            if not self.waited:
+                self._logger.info('Waiting for the harvest holding "%s" to finish.', self.path)
+            self.waited = True
+            sleep(POLL_INTERVAL)
+
+    def release(self):
+        """Releases the lock"""
+        if self._file is None:
+            return
+        try:
+            if os.fstat(self._file.fileno()).st_ino == os.stat(self.path).st_ino:
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._file.close()
+        self._file = None
+
+
+class NoLock:
+    """Stands in for the lock of a harvest without a cookie file, there is nothing to protect"""
+
+    waited = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def acquire(self):
+        """Does nothing"""
+
+    def release(self):
+        """Does nothing"""
+
+
+def cookie_file_lock(cookie_file_name, wait=True):
+    """Creates the lock of the harvest of a cookie file
+
+    Args:
+        cookie_file_name (str): The path of the cookie file, None for a harvest without one
+        wait (bool): If False acquiring raises HarvestInProgress instead of waiting for another harvest
+
+    Returns:
+        HarvestLock: The lock of the cookie file, a NoLock without one
+
+    """
+    return HarvestLock(cookie_file_name, wait=wait) if cookie_file_name is not None else NoLock()
+
+
+class SingleFlight:
+    """Coalesces concurrent in process calls for the same key into a single execution
+
+    The first caller for a key executes the function, callers arriving while it runs wait for it and get its
+    result or its exception.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+
+    def do(self, key, function, *args, **kwargs):  # pylint: disable=invalid-name
+        """Executes the function unless an execution for the key is already in flight
+
+        Args:
+            key: The key identifying equivalent calls
+            function: The callable to execute
+            *args: The positional arguments of the callable
+            **kwargs: The keyword arguments of the callable
+
+        Returns:
+            The result of the single execution
+
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': Event(), 'result': None, 'error': None}
+        if not leader:
+            LOGGER.info('Joining the harvest in flight for %s.', key)
+            call['done'].wait()
+        else:
+            try:
+                call['result'] = function(*args, **kwargs)
+            except Exception as error:  # pylint: disable=broad-except
+                call['error'] = error
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['done'].set()
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: loginprofile.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for loginprofile
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+from urllib.parse import quote, urlencode
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''loginprofile'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+SIGN_IN_URL = 'https://accounts.google.com/signin/v2/identifier'
+SIGN_IN_HOST = 'accounts.google.com'
+SIGN_IN_PATHS = ('/ServiceLogin', '/signin', '/v3/signin', '/InteractiveLogin')
+
+LOGGED_IN_HEURISTIC = 'Find local businesses, view maps and get driving directions in Google Maps.'
+
+PAGE_WEIGHT_SCRIPT = ('return window.performance.getEntries()'
+                      '.filter(function(entry) {return "transferSize" in entry;})'
+                      '.reduce(function(total, entry) {return total + entry.transferSize;}, 0);')
+
+CACHE_USAGE_SCRIPT = ('var entries = window.performance.getEntriesByType("navigation")'
+                      '.concat(window.performance.getEntriesByType("resource"));'
+                      'return [entries.filter(function(entry) {'
+                      'return entry.transferSize === 0 && entry.decodedBodySize > 0;}).length,'
+                      'entries.length,'
+                      'entries.reduce(function(total, entry) {return total + (entry.transferSize || 0);}, 0)];')
+
+
+class LoginProfile:
+    """Pairs the page the sign in flow continues to with the predicate that recognises it as logged in
+
+    The predicate is either a string that must be part of the page source of the continue target or a
+    callable accepting the driver and returning a boolean.
+    """
+
+    def __init__(self, name, continue_url, logged_in_predicate, service='local'):
+        self.name = name
+        self.continue_url = continue_url
+        self.service = service
+        self._predicate = logged_in_predicate
+
+    def __repr__(self):
+        return '{name}({profile!r}, {url!r})'.format(name=self.__class__.__name__,
+                                                     profile=self.name,
+                                                     url=self.continue_url)
+
+    @property
+    def login_url(self):
+        """The sign in url that continues to the target of the profile after a successful login"""
+        parameters = [('hl', 'en'),
+                      ('passive', 'true'),
+                      ('continue', self.continue_url),
+                      ('service', self.service),
+                      ('flowName', 'GlifWebSignIn'),
+                      ('flowEntry', 'ServiceLogin')]
+        return '{url}?{query}'.format(url=SIGN_IN_URL, query=urlencode(parameters, quote_via=quote))
+
+    def is_logged_in(self, driver):
+        """Evaluates the logged in predicate of the profile against the driver
+
+        Args:
+            driver: The selenium driver of the interactive login session
+
+        Returns:
+            bool: True if the driver has reached the continue target after a login, False otherwise
+
+        """
+        if callable(self._predicate):
+            return bool(self._predicate(driver))
+        return self._predicate in driver.page_source
+
+
+def _on_continue_target(continue_url):
+    def predicate(driver):
+        current_url = driver.current_url
+        return SIGN_IN_HOST not in current_url and current_url.startswith(continue_url)
+    return predicate
+
+
+def measure_page_weight(driver):
+    """Sums the bytes transferred for the document currently loaded in the driver and its resources
+
+    Args:
+        driver: The selenium driver to measure
+
+    Returns:
+        int: The number of bytes transferred, 0 if the browser does not expose resource timings
+
+    """
+    try:
+        return int(driver.execute_script(PAGE_WEIGHT_SCRIPT) or 0)
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.debug('Could not retrieve resource timings from the browser.')
+        return 0
+
+
+def measure_cache_usage(driver):
+    """Counts the resources of the current document served from the http cache and the bytes downloaded
+
+    Args:
+        driver: The selenium driver to measure
+
+    Returns:
+        tuple: The number of cache hits, the number of resources and the bytes transferred over the network
+
+    """
+    try:
+        hits, total, transferred = driver.execute_script(CACHE_USAGE_SCRIPT)
+        return int(hits), int(total), int(transferred)
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.debug('Could not retrieve resource timings from the browser.')
+        return 0, 0, 0
+
+
+MAPS_PROFILE = LoginProfile('maps',
+                            'https://www.google.com/maps/@40.7484986,-73.9857129,15z?hl=en',
+                            LOGGED_IN_HEURISTIC)
+
+LIGHTWEIGHT_PROFILE = LoginProfile('lightweight',
+                                   'https://www.google.com/robots.txt',
+                                   _on_continue_target('https://www.google.com/robots.txt'))
+
+LOGIN_PROFILES = {profile.name: profile for profile in (MAPS_PROFILE, LIGHTWEIGHT_PROFILE)}
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: metrics.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for metrics
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+import os
+import tempfile
+from threading import Lock
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''metrics'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+METRIC_PREFIX = 'maps_cookie_getter_'
+
+
+class Metrics:
+    """A thread safe set of counters and gauges that can be exported in the prometheus text format"""
+
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self._lock = Lock()
+        self._types = {}
+        self._values = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        """Increments a counter
+
+        Args:
+            name (str): The name of the counter
+            value (float): The amount to add
+            **labels: The labels of the series
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self._types.setdefault(name, 'counter')
+            key = self._key(name, labels)
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Sets a gauge
+
+        Args:
+            name (str): The name of the gauge
+            value (float): The current value
+            **labels: The labels of the series
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self._types.setdefault(name, 'gauge')
+            self._values[self._key(name, labels)] = value
+
+    def get(self, name, **labels):
+        """The current value of a series, 0 if it was never recorded"""
+        with self._lock:
+            return self._values.get(self._key(name, labels), 0)
+
+    def to_prometheus(self):
+        """The metrics in the prometheus text exposition format
+
+        Returns:
+            str: A type line and the series of every metric
+
+        """
+        lines = []
+        with self._lock:
+            for name in sorted(self._types):
+                lines.append('# TYPE {prefix}{name} {type}'.format(prefix=self.prefix, name=name,
+                                                                   type=self._types[name]))
+                for (series, labels), value in sorted(self._values.items()):
+                    if series != name:
+                        continue
+                    label_text = ','.join('{}="{}"'.format(label, label_value) for label, label_value in labels)
+                    lines.append('{prefix}{name}{labels} {value}'.format(prefix=self.prefix,
+                                                                         name=name,
+                                                                         labels='{' + label_text + '}'
+                                                                         if label_text else '',
+                                                                         value=value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file_name):
+        """Writes the metrics atomically to a file, like one read by the node exporter textfile collector
+
+        Args:
+            file_name (str): The path of the file
+
+        Returns:
+            None
+
+        """
+        directory, name = os.path.split(os.path.abspath(file_name))
+        descriptor, temporary_name = tempfile.mkstemp(prefix='.{name}.'.format(name=name), dir=directory)
+        with os.fdopen(descriptor, 'w') as ofile:
+            ofile.write(self.to_prometheus())
+        os.replace(temporary_name, file_name)
+
+
+METRICS = Metrics()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: notifications.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for notifications
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import json
+import logging
+import os
+import socket
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pickle import UnpicklingError
+from queue import Queue, Empty
+from socketserver import ThreadingMixIn
+from threading import Condition, Lock, Thread
+from time import time
+
+from .jarfile import cookie_jar_hash, load_cookie_jar
+from .sinks import CookieSink
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''notifications'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+HEARTBEAT_INTERVAL = 15
+
+
+class ChangeEvent(namedtuple('ChangeEvent', ('account', 'cookie_file_name', 'version', 'hash', 'changed_at'))):
+    """A cookie jar that changed, its version counts the changes of the account since the publisher started"""
+
+    __slots__ = ()
+
+    def to_json(self):
+        """The event as a json object"""
+        return json.dumps(self._asdict(), sort_keys=True)
+
+
+class ChangeStream:
+    """Distributes change events to every connected consumer, each consumer is served from its own queue"""
+
+    def __init__(self):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self._subscribers = set()
+        self._condition = Condition(Lock())
+        self.closed = False
+
+    def subscribe(self):
+        """Registers a consumer
+
+        Returns:
+            Queue: The queue the events for the consumer are put in, None marks the end of the stream
+
+        """
+        queue = Queue()
+        with self._condition:
+            self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        """Removes a consumer
+
+        Args:
+            queue (Queue): The queue returned when subscribing
+
+        Returns:
+            None
+
+        """
+        with self._condition:
+            self._subscribers.discard(queue)
+            self._condition.notify_all()
+
+    def publish(self, event):
+        """Sends an event to every consumer
+
+        Args:
+            event (ChangeEvent): The event to send
+
+        Returns:
+            None
+
+        """
+        with self._condition:
+            subscribers = list(self._subscribers)
+        self._logger.debug('Publishing %s to %d consumers.', event, len(subscribers))
+        for queue in subscribers:
+            queue.put(event)
+
+    def close(self, timeout=2):
+        """Ends the stream, giving the consumers up to timeout seconds to receive the events still queued
+
+        Args:
+            timeout (float): The number of seconds to wait for the consumers
+
+        Returns:
+            None
+
+        """
+        self.closed = True
+        with self._condition:
+            for queue in self._subscribers:
+                queue.put(None)
+            self._condition.wait_for(lambda: not self._subscribers, timeout)
+
+    def _serve(self, send):
+        queue = self.subscribe()
+        try:
+            while True:
+                try:
+                    event = queue.get(timeout=HEARTBEAT_INTERVAL)
+                except Empty:
+                    event = ''
+                if event is None:
+                    break
+                send(event)
+        except OSError as error:
+            self._logger.debug('Consumer went away: %s', error)
+        finally:
+            self.unsubscribe(queue)
+
+
+class UnixSocketChangeStream(ChangeStream):
+    """Streams the change events as lines of json to every client of a unix socket, empty lines are heartbeats"""
+
+    def __init__(self, path):
+        super(UnixSocketChangeStream, self).__init__()
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)  # pylint: disable=no-member
+        self._socket.bind(path)
+        self._socket.listen(16)
+        self._socket.settimeout(0.5)
+        Thread(target=self._accept, name='change-stream-accept', daemon=True).start()
+
+    def _accept(self):
+        while not self.closed:
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            connection.settimeout(None)
+            Thread(target=self._handle, args=(connection,), name='change-stream-client', daemon=True).start()
+
+    def _handle(self, connection):
+        def send(event):
+            connection.sendall(((event.to_json() if event else '') + '\n').encode('utf-8'))
+
+        with connection:
+            self._serve(send)
+
+    def close(self, timeout=2):
+        super(UnixSocketChangeStream, self).close(timeout)
+        self._socket.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ServerSentEventsChangeStream(ChangeStream):
+    """Streams the change events as server sent events to every client of the /events path of a local http server"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super(ServerSentEventsChangeStream, self).__init__()
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Serves the event stream"""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Streams the events until the client disconnects or the stream is closed"""
+                if self.path != '/events':
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+
+                def send(event):
+                    if event:
+                        message = 'id: {version}\nevent: cookies\ndata: {data}\n\n'.format(version=event.version,
+                                                                                          data=event.to_json())
+                    else:
+                        message = ': heartbeat\n\n'
+                    self.wfile.write(message.encode('utf-8'))
+                    self.wfile.flush()
+
+                stream._serve(send)  # pylint: disable=protected-access
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                stream._logger.debug(format, *args)  # pylint: disable=protected-access
+
+        self._server = _ThreadingHTTPServer((host, port), Handler)
+        Thread(target=self._server.serve_forever, name='change-stream-server', daemon=True).start()
+
+    @property
+    def url(self):
+        """The url of the event stream"""
+        host, port = self._server.server_address[:2]
+        return 'http://{host}:{port}/events'.format(host=host, port=port)
+
+    def close(self, timeout=2):
+        super(ServerSentEventsChangeStream, self).close(timeout)
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def create_change_stream(specification):
+    """Creates a change stream from a short textual specification
+
+    Args:
+        specification (str): "unix:<socket path>" or "sse:<host>:<port>"
+
+    Returns:
+        ChangeStream: The change stream described
+
+    """
+    kind, _, argument = specification.partition(':')
+    if kind == 'unix' and argument:
+        return UnixSocketChangeStream(argument)
+    if kind == 'sse':
+        host, _, port = argument.rpartition(':')
+        return ServerSentEventsChangeStream(host or '127.0.0.1', int(port or 0))
+    raise ValueError('Unknown change stream specification "{specification}".'.format(specification=specification))
+
+
+class NotifyingSink(CookieSink):
+    """Writes the results to a sink and publishes a change event for every cookie jar whose content changed
+
+    The event is published after the sink has written the cookie jar, so consumers that reload on an event always
+    find the new cookies in place. The content hash of a cookie jar is compared with the last published one, or
+    with the existing cookie file the first time an account is seen, so an unchanged jar publishes nothing.
+    """
+
+    def __init__(self, sink, streams):
+        super(NotifyingSink, self).__init__()
+        self.sink = sink
+        self.streams = tuple(streams)
+        self._lock = Lock()
+        self._hashes = {}
+        self._versions = {}
+
+    @staticmethod
+    def _key(result):
+        return result.account or os.path.abspath(result.cookie_file_name or '')
+
+    @staticmethod
+    def _file_hash(cookie_file_name):
+        try:
+            return cookie_jar_hash(load_cookie_jar(cookie_file_name))
+        except (OSError, EOFError, UnpicklingError):
+            return None
+
+    def write_batch(self, results):
+        for result in results:
+            key = self._key(result)
+            if key not in self._hashes and result.cookie_file_name:
+                digest = self._file_hash(result.cookie_file_name)
+                with self._lock:
+                    self._hashes.setdefault(key, digest)
+        self.sink.write_batch(results)
+        for result in results:
+            key = self._key(result)
+            digest = cookie_jar_hash(result.cookie_jar)
+            with self._lock:
+                if self._hashes.get(key) == digest:
+                    self._logger.debug('Cookie jar of %s did not change, not publishing.', key)
+                    continue
+                self._hashes[key] = digest
+                self._versions[key] = version = self._versions.get(key, 0) + 1
+            event = ChangeEvent(result.account, result.cookie_file_name, version, digest, time())
+            for stream in self.streams:
+                stream.publish(event)
+
+    def close(self):
+        try:
+            self.sink.close()
+        finally:
+            for stream in self.streams:
+                stream.close()
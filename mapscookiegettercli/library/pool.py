@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: pool.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for pool
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+from collections import deque
+from threading import Condition, Thread
+from time import monotonic
+
+from selenium.common.exceptions import WebDriverException
+
+from .loginprofile import SIGN_IN_HOST
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''pool'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+DEFAULT_MAX_AGE = 10 * 60
+
+
+class ParkedDriver:  # pylint: disable=too-few-public-methods
+    """A browser of the pool parked on a loaded sign in page"""
+
+    def __init__(self, driver, url):
+        self.driver = driver
+        self.url = url
+        self.loaded_at = monotonic()
+
+    @property
+    def age(self):
+        """The number of seconds since the sign in page was loaded"""
+        return monotonic() - self.loaded_at
+
+
+class DriverPool:  # pylint: disable=too-many-instance-attributes
+    """Keeps a number of browsers parked on an already loaded sign in page ready to be handed out
+
+    A background thread refills the pool whenever a browser is handed out. With a demand, the number of browsers
+    that will be acquired, the pool never holds more browsers than are still to be acquired. Parked browsers whose
+    page is older than max_age seconds or that navigated away from the sign in page are reloaded before being
+    handed out and dead ones are replaced. Browsers are never returned to the pool once used, released browsers are
+    terminated.
+    """
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 driver_factory,
+                 login_url,
+                 size=1,
+                 max_age=DEFAULT_MAX_AGE,
+                 demand=None):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self._driver_factory = driver_factory
+        self.login_url = login_url
+        self.size = size
+        self.max_age = max_age
+        self.remaining = demand
+        self.time_to_interactive = []
+        self._parked = deque()
+        self._launching = 0
+        self._closed = False
+        self._condition = Condition()
+        self._filler = Thread(target=self._fill, name='driver-pool', daemon=True)
+        self._filler.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _target(self):
+        return self.size if self.remaining is None else min(self.size, self.remaining)
+
+    def _fill(self):
+        while True:
+            with self._condition:
+                while not self._closed and len(self._parked) + self._launching >= self._target():
+                    self._condition.wait()
+                if self._closed:
+                    return
+                self._launching += 1
+            parked = self._launch_and_park()
+            with self._condition:
+                self._launching -= 1
+                if parked is None:
+                    self._condition.wait(1)
+                elif self._closed:
+                    self._quit(parked.driver)
+                else:
+                    self._parked.append(parked)
+                    self._condition.notify_all()
+
+    def _launch_and_park(self):
+        try:
+            driver = self._driver_factory()
+        except Exception:  # pylint: disable=broad-except
+            self._logger.exception('Could not launch a browser for the pool.')
+            return None
+        try:
+            return self._park(driver)
+        except Exception:  # pylint: disable=broad-except
+            self._logger.exception('Could not load the sign in page in a browser of the pool, terminating it.')
+            self._quit(driver)
+            return None
+
+    def _park(self, driver):
+        self._logger.debug('Parking browser on the sign in page.')
+        driver.get(self.login_url)
+        return ParkedDriver(driver, self.login_url)
+
+    def _is_stale(self, parked):
+        if parked.age > self.max_age:
+            self._logger.info('Parked sign in page is %d seconds old, reloading it.', parked.age)
+            return True
+        return SIGN_IN_HOST not in parked.driver.current_url
+
+    def _count_acquired(self, count):
+        if self.remaining is not None:
+            self.remaining -= count
+        self._condition.notify_all()
+
+    def acquire(self, timeout=None):
+        """Hands out a browser with the sign in page loaded, waiting for one if the pool is empty
+
+        Args:
+            timeout (float): The maximum number of seconds to wait, None to wait forever
+
+        Returns:
+            A selenium driver with the sign in page loaded, or None if the timeout expired
+
+        """
+        requested_at = monotonic()
+        while True:
+            with self._condition:
+                if not self._condition.wait_for(lambda: self._parked or self._closed, timeout):
+                    return None
+                if self._closed:
+                    return None
+                parked = self._parked.popleft()
+                self._count_acquired(1)
+            try:
+                if self._is_stale(parked):
+                    parked = self._park(parked.driver)
+            except WebDriverException:
+                self._logger.warning('Parked browser is gone, discarding it.')
+                self._quit(parked.driver)
+                with self._condition:
+                    self._count_acquired(-1)
+                continue
+            parked.driver.preloaded_url = parked.url
+            waited = monotonic() - requested_at
+            self.time_to_interactive.append(waited)
+            self._logger.info('Handed out a ready sign in page after %.2f seconds.', waited)
+            return parked.driver
+
+    def release(self, driver):
+        """Terminates a browser handed out by the pool"""
+        self._quit(driver)
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except WebDriverException:
+            self._logger.debug('Browser did not quit cleanly.')
+
+    def close(self):
+        """Stops refilling the pool and terminates all the parked browsers"""
+        with self._condition:
+            self._closed = True
+            parked, self._parked = list(self._parked), deque()
+            self._condition.notify_all()
+        for browser in parked:
+            self._quit(browser.driver)
+        self._filler.join()
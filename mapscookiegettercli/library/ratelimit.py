@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: ratelimit.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for ratelimit
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+from threading import Lock
+from time import monotonic, sleep
+
+from .metrics import METRICS
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''ratelimit'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+
+class LaunchRateLimiter:
+    """A token bucket spacing out browser launches, independent of how many sessions run at the same time
+
+    The bucket holds up to burst tokens and refills with rate tokens per second, every launch takes one. Launches
+    arriving at an empty bucket reserve the next tokens in the order they arrive and sleep until those are due,
+    so a burst of launches is spread evenly over time instead of starting all the browsers at once.
+    """
+
+    def __init__(self, rate=1.0, burst=1, metrics=METRICS):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.rate = float(rate)
+        self.burst = burst
+        self.metrics = metrics
+        self._lock = Lock()
+        self._tokens = float(burst)
+        self._updated_at = monotonic()
+
+    def reserve(self):
+        """Takes a token, going into debt if the bucket is empty
+
+        Returns:
+            float: The number of seconds to wait before the launch may start
+
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self):
+        """Waits until a launch may start
+
+        Returns:
+            float: The number of seconds the launch waited
+
+        """
+        delay = self.reserve()
+        if delay:
+            self._logger.debug('Throttling browser launch for %.2f seconds.', delay)
+            self.metrics.increment('launch_throttled_total')
+            self.metrics.increment('launch_throttle_wait_seconds_total', delay)
+            sleep(delay)
+        return delay
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: reseed.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for reseed
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+from itertools import groupby
+
+from selenium.common.exceptions import WebDriverException
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''reseed'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+DOMAIN_LANDING_PAGE = 'https://{host}/robots.txt'
+
+
+def browser_cookies(cookie_jar):
+    """Converts the cookies of a requests cookie jar to the webdriver cookie format
+
+    Args:
+        cookie_jar (RequestsCookieJar): The jar to convert
+
+    Returns:
+        list: A list of webdriver cookie dictionaries
+
+    """
+    cookies = []
+    for cookie in cookie_jar:
+        browser_cookie = {'name': cookie.name,
+                          'value': cookie.value,
+                          'domain': cookie.domain,
+                          'path': cookie.path,
+                          'secure': bool(cookie.secure)}
+        if cookie.expires:
+            browser_cookie['expiry'] = int(cookie.expires)
+        cookies.append(browser_cookie)
+    return cookies
+
+
+def _set_cookies_over_cdp(driver, cookies):
+    cdp_cookies = []
+    for cookie in cookies:
+        cdp_cookie = {key: value for key, value in cookie.items() if key != 'expiry'}
+        if 'expiry' in cookie:
+            cdp_cookie['expires'] = cookie['expiry']
+        cdp_cookies.append(cdp_cookie)
+    driver.execute_cdp_cmd('Network.setCookies', {'cookies': cdp_cookies})
+
+
+def _add_cookies_per_domain(driver, cookies):
+    def host(cookie):
+        return cookie['domain'].lstrip('.')
+    for domain, domain_cookies in groupby(sorted(cookies, key=host), key=host):
+        LOGGER.debug('Adding cookies for domain %s.', domain)
+        driver.get(DOMAIN_LANDING_PAGE.format(host=domain))
+        for cookie in domain_cookies:
+            driver.add_cookie(cookie)
+
+
+def reseed_driver(driver, cookie_jar):
+    """Loads the cookies of a previously exported jar into a fresh browser
+
+    Chrome drivers get all the cookies in bulk over the devtools protocol, every other driver gets them added
+    per domain after visiting a lightweight page of that domain as webdriver requires.
+
+    Args:
+        driver: The selenium driver to seed
+        cookie_jar (RequestsCookieJar): The jar with the last known cookies
+
+    Returns:
+        int: The number of cookies seeded
+
+    """
+    cookies = browser_cookies(cookie_jar)
+    if hasattr(driver, 'execute_cdp_cmd'):
+        try:
+            _set_cookies_over_cdp(driver, cookies)
+            LOGGER.info('Seeded %d cookies over the devtools protocol.', len(cookies))
+            return len(cookies)
+        except WebDriverException:
+            LOGGER.debug('Bulk seeding over the devtools protocol failed, adding cookies per domain.')
+    _add_cookies_per_domain(driver, cookies)
+    LOGGER.info('Seeded %d cookies per domain.', len(cookies))
+    return len(cookies)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: resources.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for resources
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+import os
+from collections import namedtuple
+from threading import Event, Lock, Thread
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''resources'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+PROC_DIRECTORY = '/proc'
+DEFAULT_SAMPLING_INTERVAL = 10.0
+
+ResourceUsage = namedtuple('ResourceUsage', ('peak_rss', 'cpu_seconds', 'read_bytes', 'write_bytes', 'processes'))
+
+ProcessSample = namedtuple('ProcessSample', ('rss', 'cpu_seconds', 'read_bytes', 'write_bytes'))
+
+
+def _read(path):
+    with open(path, 'rb') as ifile:
+        return ifile.read()
+
+
+def parent_pids(proc_directory=PROC_DIRECTORY):
+    """Maps every running process to its parent
+
+    Args:
+        proc_directory (str): The mount point of procfs
+
+    Returns:
+        dict: The parent pid of every pid
+
+    """
+    parents = {}
+    for name in os.listdir(proc_directory):
+        if not name.isdigit():
+            continue
+        try:
+            stat = _read(os.path.join(proc_directory, name, 'stat'))
+        except OSError:
+            continue
+        # the command name is in parentheses and may contain spaces, the fields after it are split safely
+        parents[int(name)] = int(stat[stat.rindex(b')') + 2:].split()[1])
+    return parents
+
+
+def descendants(roots, parents):
+    """Finds the processes started by the root processes, directly or indirectly
+
+    Args:
+        roots (iterable): The pids of the root processes
+        parents (dict): The parent pid of every pid
+
+    Returns:
+        set: The pids of the roots and all their descendants that are running
+
+    """
+    children = {}
+    for pid, parent in parents.items():
+        children.setdefault(parent, []).append(pid)
+    tree, pending = set(), [pid for pid in roots if pid in parents]
+    while pending:
+        pid = pending.pop()
+        if pid not in tree:
+            tree.add(pid)
+            pending.extend(children.get(pid, ()))
+    return tree
+
+
+def sample_process(pid, proc_directory=PROC_DIRECTORY):
+    """Reads the resident memory, cpu time and storage io of a process
+
+    Args:
+        pid (int): The pid of the process
+        proc_directory (str): The mount point of procfs
+
+    Returns:
+        ProcessSample: The sample, None if the process is gone. Io counters are 0 where they are not readable.
+
+    """
+    directory = os.path.join(proc_directory, str(pid))
+    try:
+        stat = _read(os.path.join(directory, 'stat'))
+        statm = _read(os.path.join(directory, 'statm'))
+    except OSError:
+        return None
+    fields = stat[stat.rindex(b')') + 2:].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK'))
+    rss = int(statm.split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    counters = {}
+    try:
+        for line in _read(os.path.join(directory, 'io')).decode('ascii').splitlines():
+            name, _, value = line.partition(':')
+            counters[name] = int(value)
+    except OSError:
+        pass
+    return ProcessSample(rss, cpu_seconds, counters.get('read_bytes', 0), counters.get('write_bytes', 0))
+
+
+def driver_root_pids(driver, proc_directory=PROC_DIRECTORY):
+    """Finds the processes behind a driver, its driver service, devtools browser or profile directory users
+
+    The process of a driver service shared with other sessions is left out, its tree holds the browsers of all of
+    them.
+
+    Args:
+        driver: The driver of a harvest
+        proc_directory (str): The mount point of procfs
+
+    Returns:
+        set: The pids of the root processes of the driver
+
+    """
+    roots = set()
+    shared_process = getattr(getattr(driver, 'shared_service', None), 'process', None)
+    shared_pid = getattr(shared_process, 'pid', None)
+    for owner in (getattr(driver, 'service', None), getattr(driver, '_pipe', None)):
+        process = getattr(owner, 'process', None)
+        if getattr(process, 'pid', None) and process.pid != shared_pid:
+            roots.add(process.pid)
+    user_data_directory = getattr(driver, 'user_data_directory', None)
+    if user_data_directory is not None:
+        marker = user_data_directory.path.encode('utf-8')
+        for name in os.listdir(proc_directory):
+            if not name.isdigit():
+                continue
+            try:
+                if marker in _read(os.path.join(proc_directory, name, 'cmdline')):
+                    roots.add(int(name))
+            except OSError:
+                continue
+    roots.discard(shared_pid)
+    return roots
+
+
+class ResourceSampler:  # pylint: disable=too-many-instance-attributes
+    """Samples the process tree behind a driver in the background and accounts the resources it uses
+
+    The peak resident memory is the largest sum over the tree seen in a sample. The cpu time and io of a process
+    are the last values sampled before it exited, summed over every process that was part of the tree. The root
+    processes are looked up once, every sample still reads the parent of every process so sampling is meant to
+    be coarse. Sampling is only available where procfs is.
+    """
+
+    def __init__(self, driver, interval=DEFAULT_SAMPLING_INTERVAL, proc_directory=PROC_DIRECTORY):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.driver = driver
+        self.interval = interval
+        self.proc_directory = proc_directory
+        self._lock = Lock()
+        self._stopped = Event()
+        self._roots = None
+        self._processes = {}
+        self._peak_rss = 0
+        self._thread = None
+
+    @staticmethod
+    def is_supported(proc_directory=PROC_DIRECTORY):
+        """Checks whether process trees can be sampled on this host"""
+        return os.path.isdir(os.path.join(proc_directory, 'self'))
+
+    def sample(self):
+        """Takes a sample of the process tree"""
+        with self._lock:
+            if self._roots is None:
+                self._roots = driver_root_pids(self.driver, self.proc_directory)
+            tree = descendants(self._roots, parent_pids(self.proc_directory))
+            rss = 0
+            for pid in tree:
+                sample = sample_process(pid, self.proc_directory)
+                if sample is None:
+                    continue
+                self._processes[pid] = sample
+                rss += sample.rss
+            self._peak_rss = max(self._peak_rss, rss)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sample()
+            except OSError as error:
+                self._logger.debug('Sampling failed: %s', error)
+
+    def start(self):
+        """Takes a first sample and keeps sampling in the background"""
+        self.sample()
+        self._thread = Thread(target=self._run, name='resource-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling
+
+        Returns:
+            ResourceUsage: The resources used by the process tree
+
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.usage
+
+    @property
+    def usage(self):
+        """The resources used by the process tree up to the last sample"""
+        with self._lock:
+            samples = list(self._processes.values())
+            return ResourceUsage(peak_rss=self._peak_rss,
+                                 cpu_seconds=sum(sample.cpu_seconds for sample in samples),
+                                 read_bytes=sum(sample.read_bytes for sample in samples),
+                                 write_bytes=sum(sample.write_bytes for sample in samples),
+                                 processes=len(samples))
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: session.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for session
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import logging
+from collections import namedtuple
+from pickle import UnpicklingError
+from time import sleep, monotonic, time
+
+from requests import Session
+from selenium.common.exceptions import NoSuchWindowException, WebDriverException
+
+from mapscookiegettercli.browsers import Chrome, Firefox, IE, Edge
+from .jarfile import load_cookie_jar
+from .loginprofile import SIGN_IN_HOST, measure_page_weight, measure_cache_usage
+from .metrics import METRICS
+from .reseed import reseed_driver
+from .resources import ResourceSampler
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''session'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+POLL_INTERVAL = 0.5
+
+
+class HarvestConfiguration(namedtuple('HarvestConfiguration', ('os',
+                                                               'default_browser',
+                                                               'login_profile',
+                                                               'engine',
+                                                               'driver_service',
+                                                               'user_data_root',
+                                                               'http_cache_seed',
+                                                               'driver_factory',
+                                                               'sink',
+                                                               'cookie_filter',
+                                                               'admission',
+                                                               'launch_limiter',
+                                                               'resource_sampling_interval'))):
+    """The immutable detection results and settings shared by all the harvests of a cookie getter
+
+    Being a tuple it can be shared between threads freely, every harvest keeps its own state in a HarvestSession.
+    """
+
+    __slots__ = ()
+
+
+class HarvestResult:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """The outcome of a harvest, the cookie jar and metadata about how it was obtained
+
+    Consumers in the same process can use the cookie jar directly, for example by updating the cookies of the
+    requests session used with locationsharinglib, without going through the cookie file.
+    """
+
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 cookie_jar,
+                 account=None,
+                 cookie_file_name=None,
+                 browser=None,
+                 engine=None,
+                 login_profile=None,
+                 timings=None,
+                 reused=False,
+                 resources=None):
+        self.cookie_jar = cookie_jar
+        self.account = account
+        self.cookie_file_name = cookie_file_name
+        self.browser = browser
+        self.engine = engine
+        self.login_profile = login_profile
+        self.timings = timings or {}
+        self.reused = reused
+        self.resources = resources
+        self.harvested_at = time()
+
+    def __repr__(self):
+        return '{name}(account={account!r}, cookies={cookies}, reused={reused})'.format(
+            name=self.__class__.__name__, account=self.account, cookies=len(self.cookie_jar), reused=self.reused)
+
+    @classmethod
+    def from_cookie_file(cls, cookie_file_name, account=None):
+        """Creates a result from a cookie file harvested by another process
+
+        Args:
+            cookie_file_name (str): The path of the cookie file
+            account (str): The account the cookie file belongs to
+
+        Returns:
+            HarvestResult: A result marked as reused
+
+        """
+        return cls(load_cookie_jar(cookie_file_name), account=account, cookie_file_name=cookie_file_name, reused=True)
+
+
+def launch_driver(configuration, http_cache_seed=None):
+    """Starts a browser as described by the configuration, once the launch rate and the admission controller allow it
+
+    Args:
+        configuration (HarvestConfiguration): The configuration of the harvest
+        http_cache_seed (str): An http cache seed overriding the one of the configuration
+
+    Returns:
+        A selenium driver or a driver exposing the same interface
+
+    """
+    if configuration.launch_limiter is not None:
+        configuration.launch_limiter.acquire()
+    if configuration.admission is not None:
+        configuration.admission.acquire()
+    if configuration.driver_factory is not None:
+        return configuration.driver_factory()
+    http_cache_seed = http_cache_seed or configuration.http_cache_seed
+    if configuration.default_browser == 'chrome':
+        return Chrome(service=configuration.driver_service,
+                      engine=configuration.engine,
+                      user_data_root=configuration.user_data_root,
+                      http_cache_seed=http_cache_seed)
+    if configuration.default_browser == 'firefox':
+        return Firefox(engine=configuration.engine,
+                       user_data_root=configuration.user_data_root,
+                       http_cache_seed=http_cache_seed)
+    return {'ie': IE, 'edge': Edge}.get(configuration.default_browser)()
+
+
+class HarvestSession:  # pylint: disable=too-many-instance-attributes
+    """The state of a single harvest, its driver, timings and resulting session
+
+    A harvest session is used by one thread only, all the state shared between harvests is in the configuration.
+    """
+
+    def __init__(self, configuration, cookie_file_name, account=None, driver=None):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+        self.configuration = configuration
+        self.cookie_file_name = cookie_file_name
+        self.account = account
+        self.driver = driver
+        self.session = None
+        self.timings = {}
+        self.resources = None
+        self._started_at = monotonic()
+        self._signed_in_at = None
+        self._sampler = None
+        self._result = None
+
+    def _mark(self, name):
+        self.timings[name] = monotonic() - self._started_at
+
+    @property
+    def login_profile(self):
+        """The login profile of the harvest"""
+        return self.configuration.login_profile
+
+    def launch(self):
+        """Starts the browser of the session unless one was provided
+
+        Returns:
+            The driver of the session
+
+        """
+        if self.driver is None:
+            self.driver = launch_driver(self.configuration)
+            self._mark('launched')
+        interval = self.configuration.resource_sampling_interval
+        if interval and self._sampler is None and ResourceSampler.is_supported():
+            self._sampler = ResourceSampler(self.driver, interval)
+            self._sampler.start()
+        return self.driver
+
+    def harvest(self, reseed=False):
+        """Gets the cookies of a logged in session, reusing the last known cookies if requested and still valid
+
+        Args:
+            reseed (bool): If True the cookies of the cookie file are tried before an interactive login
+
+        Returns:
+            Session: A requests session holding the harvested cookies
+
+        """
+        self.launch()
+        if not (reseed and self.reseed()):
+            self.login()
+        self.extract(self.driver.get_cookies())
+        self.log_measurements()
+        return self.session
+
+    def reseed(self):
+        """Loads the last known cookies into the browser and checks if they are still accepted
+
+        The cookies are checked by loading the sign in page of the login profile, which only continues to its
+        target for a signed in session, so the continue target being public does not pass dead cookies.
+
+        Returns:
+            bool: True if the browser is logged in with the reseeded cookies, False otherwise
+
+        """
+        try:
+            cookie_jar = load_cookie_jar(self.cookie_file_name)
+        except (OSError, EOFError, UnpicklingError):
+            self._logger.info('No usable cookies found in "%s" to reseed the browser with.', self.cookie_file_name)
+            return False
+        self._logger.info('Reseeding the browser with the cookies from "%s".', self.cookie_file_name)
+        self._signed_in_at = monotonic()
+        if getattr(self.driver, 'preloaded_url', None) is not None:
+            self.driver.preloaded_url = None
+        try:
+            reseed_driver(self.driver, cookie_jar)
+            self.driver.get(self.login_profile.login_url)
+            logged_in = (SIGN_IN_HOST not in self.driver.current_url and
+                         self.login_profile.is_logged_in(self.driver))
+        except WebDriverException as error:
+            self._logger.warning('Reseeding the browser failed: %s', error.msg)
+            logged_in = False
+        if logged_in:
+            self._logger.info('Reseeded cookies are still valid, skipping interactive login.')
+            self._mark('signed_in')
+            return True
+        self._logger.info('Reseeded cookies were not accepted, falling back to interactive login.')
+        self._signed_in_at = None
+        self.driver.delete_all_cookies()
+        return False
+
+    def login(self):
+        """Loads the sign in page, unless preloaded, and waits for the interactive login to complete"""
+        self._logger.info('Starting interactive login process.')
+        driver = self.driver
+        if getattr(driver, 'preloaded_url', None) != self.login_profile.login_url:
+            driver.get(self.login_profile.login_url)
+        self._mark('sign_in_page')
+        self.log_cache_usage()
+        wait_for_navigation = getattr(driver, 'wait_for_navigation', None)
+        while not self.login_profile.is_logged_in(driver):
+            if self._signed_in_at is None and SIGN_IN_HOST not in driver.current_url:
+                self._signed_in_at = monotonic()
+            if wait_for_navigation:
+                wait_for_navigation(POLL_INTERVAL)
+            else:
+                sleep(POLL_INTERVAL)
+        self._mark('signed_in')
+
+    def extract(self, cookies):
+        """Transfers browser cookies to a requests session, compacting them with the configured cookie filter
+
+        Args:
+            cookies (list): The cookies in the webdriver cookie format
+
+        Returns:
+            Session: The requests session holding the cookies
+
+        """
+        self._logger.info('Log in successful, getting session cookies.')
+        if self.configuration.cookie_filter is not None:
+            cookies = self.configuration.cookie_filter.apply(cookies)
+        session = Session()
+        self._logger.info('Transferring cookies to a requests session.')
+        for cookie in cookies:
+            cookie = dict(cookie)
+            cookie.pop('httpOnly', None)
+            expiry = cookie.pop('expiry', None)
+            if expiry is not None:
+                cookie['expires'] = int(expiry)
+            session.cookies.set(**cookie)
+        self.session = session
+        self._mark('cookies')
+        return session
+
+    @property
+    def result(self):
+        """The result of the harvest, None if no cookies were extracted yet
+
+        The result is completed with the resource usage of the browser once the session is terminated.
+        """
+        if self.session is None:
+            return None
+        if self._result is None:
+            self._result = HarvestResult(self.session.cookies,
+                                         account=self.account,
+                                         cookie_file_name=self.cookie_file_name,
+                                         browser=self.configuration.default_browser,
+                                         engine=self.configuration.engine,
+                                         login_profile=self.login_profile.name,
+                                         timings=self.timings,
+                                         resources=self.resources)
+        return self._result
+
+    def save(self, sink=None):
+        """Writes the result of the session to the sink of the configuration, or to the provided one
+
+        Args:
+            sink (CookieSink): A sink to use instead of the one of the configuration, like a batching one
+
+        Returns:
+            None
+
+        """
+        (sink or self.configuration.sink).write(self.result)
+        self._mark('saved')
+
+    def terminate(self):
+        """Closes the browser of the session"""
+        self._logger.info('Terminating browser session.')
+        if self._sampler is not None:
+            self._sampler.sample()
+        try:
+            self.driver.close()
+        except NoSuchWindowException:
+            pass
+        self.driver.quit()
+        self._mark('terminated')
+        if self._sampler is not None:
+            self.record_resources(self._sampler.stop())
+
+    def record_resources(self, usage):
+        """Attaches the resource usage of the browser to the result and the metrics
+
+        Args:
+            usage (ResourceUsage): The resources used by the process tree of the driver
+
+        Returns:
+            None
+
+        """
+        self.resources = usage
+        if self._result is not None:
+            self._result.resources = usage
+        self._logger.info('Browser session used %d processes, %d bytes peak rss, %.2f cpu seconds, '
+                          '%d bytes read and %d bytes written.', usage.processes, usage.peak_rss,
+                          usage.cpu_seconds, usage.read_bytes, usage.write_bytes)
+        browser = self.configuration.default_browser
+        METRICS.increment('sessions_total', browser=browser)
+        METRICS.increment('session_cpu_seconds_total', usage.cpu_seconds, browser=browser)
+        METRICS.increment('session_read_bytes_total', usage.read_bytes, browser=browser)
+        METRICS.increment('session_write_bytes_total', usage.write_bytes, browser=browser)
+        peak_rss = max(usage.peak_rss, METRICS.get('session_peak_rss_bytes', browser=browser))
+        METRICS.set('session_peak_rss_bytes', peak_rss, browser=browser)
+
+    def save_and_terminate(self, sink=None):
+        """Saves the cookies and closes the browser even if saving failed
+
+        Args:
+            sink (CookieSink): A sink to use instead of the one of the configuration
+
+        Returns:
+            None
+
+        """
+        try:
+            self.save(sink)
+        finally:
+            self.terminate()
+
+    def log_cache_usage(self):
+        """Logs how much of the current page was served from the http cache"""
+        hits, total, transferred = measure_cache_usage(self.driver)
+        self._logger.info('Sign in page: %d of %d resources served from the http cache (%.0f%%), %d bytes downloaded.',
+                          hits, total, 100.0 * hits / total if total else 0.0, transferred)
+
+    def log_measurements(self):
+        """Logs the weight of the continue target and the time from leaving the sign in page to the cookies"""
+        time_to_cookies = monotonic() - self._signed_in_at if self._signed_in_at is not None else 0.0
+        self._logger.info('Profile %s: %d bytes transferred for the continue target, %.2f seconds to cookies.',
+                          self.login_profile.name, measure_page_weight(self.driver), time_to_cookies)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# File: sinks.py
+#
+# Copyright 2019 Costas Tyfoxylos
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to
+#  deal in the Software without restriction, including without limitation the
+#  rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+#  sell copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+#  all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Main code for sinks
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pickle import UnpicklingError
+from threading import Lock
+from time import monotonic
+
+from requests import Session
+
+from mapscookiegettercli.mapscookiegettercliexceptions import SinkFailed
+from .jarfile import (cookie_records, cookie_jar_hash, diff_cookie_jars, load_cookie_jar, mark_verified,
+                      save_cookie_jar)
+
+__author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
+__docformat__ = '''google'''
+__date__ = '''04-03-2019'''
+__copyright__ = '''Copyright 2019, Costas Tyfoxylos'''
+__credits__ = ["Costas Tyfoxylos"]
+__license__ = '''MIT'''
+__maintainer__ = '''Costas Tyfoxylos'''
+__email__ = '''<costas.tyf@gmail.com>'''
+__status__ = '''Development'''  # "Prototype", "Development", "Production".
+
+LOGGER_BASENAME = '''sinks'''
+LOGGER = logging.getLogger(LOGGER_BASENAME)
+LOGGER.addHandler(logging.NullHandler())
+
+
+def result_record(result):
+    """Converts a harvest result to a json serializable dictionary
+
+    Args:
+        result (HarvestResult): The result to convert
+
+    Returns:
+        dict: The metadata and the cookies of the result
+
+    """
+    return {'account': result.account,
+            'cookie_file_name': result.cookie_file_name,
+            'harvested_at': result.harvested_at,
+            'browser': result.browser,
+            'engine': result.engine,
+            'login_profile': result.login_profile,
+            'cookies': cookie_records(result.cookie_jar)}
+
+
+class CookieSink:
+    """The interface of a destination for harvested cookies
+
+    Sinks only need to implement write_batch, the results of a batch are written in one go, like a single
+    transaction or request, where the destination supports it.
+    """
+
+    def __init__(self):
+        logger_name = u'{base}.{suffix}'.format(base=LOGGER_BASENAME,
+                                                suffix=self.__class__.__name__)
+        self._logger = logging.getLogger(logger_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, result):
+        """Writes a single harvest result
+
+        Args:
+            result (HarvestResult): The result to write
+
+        Returns:
+            None
+
+        """
+        self.write_batch([result])
+
+    def write_batch(self, results):
+        """Writes many harvest results
+
+        Args:
+            results (list): The HarvestResults to write
+
+        Returns:
+            None
+
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Releases any resources held by the sink"""
+
+
+class FileSink(CookieSink):
+    """Pickles every cookie jar atomically to its cookie file, the format locationsharinglib expects
+
+    Results without a cookie file are written to "<account>.cookies" in the directory, if one is provided, and
+    skipped otherwise. A cookie jar with the same content hash as the existing file is not written again, the time
+    the cookies were verified is recorded next to the file instead, so the modification time consumers watch is
+    left alone. When the content did change the added, removed and changed cookies are logged.
+    """
+
+    def __init__(self, directory=None, skip_unchanged=True):
+        super(FileSink, self).__init__()
+        self.directory = directory
+        self.skip_unchanged = skip_unchanged
+
+    def _file_name(self, result):
+        if result.cookie_file_name:
+            return result.cookie_file_name
+        if self.directory and result.account:
+            return os.path.join(self.directory, '{account}.cookies'.format(account=result.account))
+        return None
+
+    def write_batch(self, results):
+        for result in results:
+            file_name = self._file_name(result)
+            if file_name is None:
+                self._logger.debug('No cookie file for account %s, skipping.', result.account)
+                continue
+            if self.skip_unchanged and not self._changed(result.cookie_jar, file_name):
+                self._logger.info('Cookies in "%s" did not change, marking them as verified.', file_name)
+                mark_verified(file_name)
+                continue
+            self._logger.info('Saving the cookies to pickled file "%s".', file_name)
+            save_cookie_jar(result.cookie_jar, file_name)
+
+    def _changed(self, cookie_jar, file_name):
+        try:
+            existing = load_cookie_jar(file_name)
+        except (OSError, EOFError, UnpicklingError):
+            return True
+        if cookie_jar_hash(existing) == cookie_jar_hash(cookie_jar):
+            return False
+        difference = diff_cookie_jars(existing, cookie_jar)
+        self._logger.info('Cookies in "%s" changed, added: %s, removed: %s, changed: %s.', file_name,
+                          ', '.join(difference['added']) or 'none',
+                          ', '.join(difference['removed']) or 'none',
+                          ', '.join(difference['changed']) or 'none')
+        return True
+
+
+class StdoutSink(CookieSink):
+    """Writes every result as a line of json to a stream, standard output by default, to be piped to a consumer"""
+
+    def __init__(self, stream=None):
+        super(StdoutSink, self).__init__()
+        self._stream = stream
+        self._lock = Lock()
+
+    def write_batch(self, results):
+        stream = self._stream or sys.stdout
+        lines = ''.join(json.dumps(result_record(result), sort_keys=True) + '\n' for result in results)
+        with self._lock:
+            stream.write(lines)
+            stream.flush()
+
+
+class SQLiteSink(CookieSink):
+    """Stores every result as a row of a sqlite database, a batch is written in a single transaction"""
+
+    def __init__(self, database, table='cookie_jars'):
+        super(SQLiteSink, self).__init__()
+        self.database = database
+        self.table = table
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS {table} '
+                               '(account TEXT, cookie_file_name TEXT, harvested_at REAL, browser TEXT, '
+                               'engine TEXT, login_profile TEXT, cookies TEXT)'.format(table=self.table))
+
+    def _connect(self):
+        return sqlite3.connect(self.database, timeout=30)
+
+    def write_batch(self, results):
+        rows = [(record['account'], record['cookie_file_name'], record['harvested_at'], record['browser'],
+                 record['engine'], record['login_profile'], json.dumps(record['cookies'], sort_keys=True))
+                for record in map(result_record, results)]
+        self._logger.info('Storing %d cookie jars in "%s".', len(rows), self.database)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany('INSERT INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?)'.format(table=self.table),
+                                       rows)
+        finally:
+            connection.close()
+
+
+class HttpPostSink(CookieSink):
+    """Posts the results as a json list to an http endpoint, a batch is posted in a single request"""
+
+    def __init__(self, url, timeout=30):
+        super(HttpPostSink, self).__init__()
+        self.url = url
+        self.timeout = timeout
+        self._session = Session()
+
+    def write_batch(self, results):
+        self._logger.info('Posting %d cookie jars to %s.', len(results), self.url)
+        response = self._session.post(self.url, json=[result_record(result) for result in results],
+                                      timeout=self.timeout)
+        response.raise_for_status()
+
+    def close(self):
+        self._session.close()
+
+
+class CompositeSink(CookieSink):
+    """Fans every write out to many sinks concurrently
+
+    All the sinks are written to even if some of them fail, SinkFailed is raised afterwards naming the failed ones.
+    """
+
+    def __init__(self, sinks):
+        super(CompositeSink, self).__init__()
+        self.sinks = tuple(sinks)
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.sinks), 1))
+
+    def write_batch(self, results):
+        futures = [(sink, self._executor.submit(sink.write_batch, results)) for sink in self.sinks]
+        failed = []
+        for sink, future in futures:
+            error = future.exception()
+            if error is not None:
+                self._logger.error('Sink %s failed with %r.', sink.__class__.__name__, error)
+                failed.append(sink.__class__.__name__)
+        if failed:
+            raise SinkFailed(', '.join(failed))
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self._executor.shutdown()
+
+
+class BatchingSink(CookieSink):
+    """Buffers writes and passes them on to a sink in batches
+
+    A batch is written when it reaches the batch size or, on the next write, when its oldest result has waited
+    longer than the maximum delay. flush writes whatever is buffered and close flushes and closes the sink. The
+    optional on_written callable is called with every batch once the sink wrote it.
+    """
+
+    def __init__(self, sink, batch_size=16, max_delay=5.0, on_written=None):
+        super(BatchingSink, self).__init__()
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.on_written = on_written
+        self._lock = Lock()
+        self._buffer = []
+        self._oldest = None
+
+    def write_batch(self, results):
+        with self._lock:
+            if not self._buffer:
+                self._oldest = monotonic()
+            self._buffer.extend(results)
+            if len(self._buffer) < self.batch_size and monotonic() - self._oldest < self.max_delay:
+                return
+            batch, self._buffer = self._buffer, []
+        self._write(batch)
+
+    def _write(self, batch):
+        self.sink.write_batch(batch)
+        if self.on_written is not None:
+            self.on_written(batch)
+
+    def flush(self):
+        """Writes all the buffered results"""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.sink.close()
+
+
+def create_sink(specification):
+    """Creates a sink from a short textual specification
+
+    Args:
+        specification (str): "file", "file:<directory>", "stdout", "sqlite:<database>" or an http(s) url
+
+    Returns:
+        CookieSink: The sink described
+
+    """
+    kind, _, argument = specification.partition(':')
+    if kind in ('http', 'https'):
+        return HttpPostSink(specification)
+    if kind == 'file':
+        return FileSink(argument or None)
+    if kind == 'stdout':
+        return StdoutSink()
+    if kind == 'sqlite' and argument:
+        return SQLiteSink(argument)
+    raise ValueError('Unknown sink specification "{specification}".'.format(specification=specification))
@@ -36,6 +36,11 @@ import argparse
 import coloredlogs
 
 from mapscookiegettercli import CookieGetter
+from mapscookiegettercli.mapscookiegettercliexceptions import HarvestInProgress
+from mapscookiegettercli.library import (LOGIN_PROFILES, COOKIE_FILTERS, CookieKeepAlive, HarvestJournal,
+                                         HarvestCoordinator, HarvestWorker, WorkQueue, AdmissionController,
+                                         LaunchRateLimiter, METRICS, create_work_queue,
+                                         is_cookie_jar_fresh, create_sink, create_change_stream)
 
 __author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
 __docformat__ = '''google'''
@@ -75,10 +80,283 @@ def get_arguments():
                                  'WARNING',
                                  'ERROR',
                                  'CRITICAL'])
+    parser.add_argument('--login-profile',
+                        '-p',
+                        help='The continue target of the login process. "lightweight" lands on a small google page '
+                             'that still sets the required cookies. Defaults to maps.',
+                        dest='login_profile',
+                        action='store',
+                        default='maps',
+                        choices=sorted(LOGIN_PROFILES))
+    parser.add_argument('--fresh-margin',
+                        '-f',
+                        help='Skip the harvest and exit successfully if the authentication cookies of the existing '
+                             'cookie file are valid for at least this many more seconds.',
+                        dest='fresh_margin',
+                        action='store',
+                        type=int,
+                        default=None)
+    parser.add_argument('--max-file-age',
+                        help='With --fresh-margin also harvest again if the cookie file is older than this many '
+                             'seconds. Authentication cookies without an expiry are only trusted for this long.',
+                        dest='max_file_age',
+                        action='store',
+                        type=int,
+                        default=None)
+    parser.add_argument('--no-wait',
+                        '-n',
+                        help='Exit immediately instead of waiting if another harvest for the same cookie file is '
+                             'in progress.',
+                        dest='wait_for_lock',
+                        action='store_false',
+                        default=True)
+    parser.add_argument('--keep-alive',
+                        '-k',
+                        help='Keep the existing cookie file alive over http every provided number of seconds, '
+                             'falling back to a browser login only when that fails.',
+                        dest='keep_alive',
+                        action='store',
+                        type=int,
+                        default=None)
+    parser.add_argument('--reseed',
+                        '-r',
+                        help='Load the cookies of the existing cookie file into the browser and skip the interactive '
+                             'login if they are still valid.',
+                        dest='reseed',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--accounts',
+                        '-a',
+                        help='Log in many accounts sharing a single browser, the cookies of every account are '
+                             'exported to "<account>.cookies".',
+                        dest='accounts',
+                        action='store',
+                        nargs='+',
+                        default=None)
+    parser.add_argument('--browser-per-account',
+                        '-b',
+                        help='With --accounts start a browser per account instead of sharing one, tearing each browser '
+                             'down in the background while the next one launches.',
+                        dest='browser_per_account',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--preload',
+                        help='With --browser-per-account keep this many browsers parked on a loaded sign in page so '
+                             'every account gets a ready login form.',
+                        dest='preload',
+                        action='store',
+                        type=int,
+                        default=0)
+    parser.add_argument('--engine',
+                        '-e',
+                        help='The way the browser is driven, "devtools" speaks the devtools protocol to chrome '
+                             'directly without selenium and chromedriver, "bidi" reacts to navigation events over '
+                             'webdriver bidi on chrome and firefox. Defaults to selenium.',
+                        dest='engine',
+                        action='store',
+                        default='selenium',
+                        choices=['selenium', 'devtools', 'bidi'])
+    parser.add_argument('--user-data-root',
+                        help='The location of the per session browser profile directories. Defaults to /dev/shm '
+                             'when available, otherwise the temporary directory.',
+                        dest='user_data_root',
+                        action='store',
+                        default=None)
+    parser.add_argument('--http-cache-seed',
+                        help='A directory with an http cache every browser session starts from, so the sign in '
+                             'page loads from local disk.',
+                        dest='http_cache_seed',
+                        action='store',
+                        default=None)
+    parser.add_argument('--warm-up-http-cache',
+                        help='Load the sign in page once and export its http cache to the --http-cache-seed '
+                             'directory instead of harvesting cookies.',
+                        dest='warm_up_http_cache',
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--sink',
+                        '-s',
+                        help='Where the harvested cookies are written, can be repeated to write to many places at '
+                             'once. One of "file", "file:<directory>", "stdout", "sqlite:<database>" or an http url '
+                             'the cookies are posted to. Defaults to file.',
+                        dest='sinks',
+                        action='append',
+                        default=None)
+    parser.add_argument('--notify',
+                        help='Publish an event with the account, version and content hash whenever a cookie jar '
+                             'changes, on a unix socket with "unix:<path>" or as server sent events on '
+                             '"sse:<host>:<port>" under /events. Can be repeated.',
+                        dest='change_streams',
+                        action='append',
+                        default=None)
+    parser.add_argument('--cookie-filter',
+                        '-c',
+                        help='Compact the harvested cookies before they are written. "deduplicate" keeps every cookie '
+                             'once across ".google.com" and "www.google.com", "location-sharing" also drops all the '
+                             'cookies locationsharinglib does not need. Defaults to keeping all the cookies.',
+                        dest='cookie_filter',
+                        action='store',
+                        default=None,
+                        choices=sorted(COOKIE_FILTERS))
+    parser.add_argument('--journal',
+                        '-j',
+                        help='With --browser-per-account record the progress of the batch in this file, so a '
+                             'restarted batch only harvests the accounts that did not complete.',
+                        dest='journal',
+                        action='store',
+                        default=None)
+    parser.add_argument('--coordinator',
+                        help='With --accounts queue the harvests in this sqlite database for workers started with '
+                             '--worker and write their results to the sinks once all of them are done. The database '
+                             'has to be on a local file system, workers on other hosts need --listen.',
+                        dest='coordinator',
+                        action='store',
+                        default=None)
+    parser.add_argument('--listen',
+                        help='With --coordinator serve the queue over http on "<host>:<port>" for workers on other '
+                             'hosts. There is no authentication, only listen on a trusted network.',
+                        dest='listen',
+                        action='store',
+                        default=None)
+    parser.add_argument('--worker',
+                        help='Harvest the accounts queued by a coordinator until all of them are done, leasing them '
+                             'from its "http://<host>:<port>" or, on the same host, its sqlite database.',
+                        dest='worker',
+                        action='store',
+                        default=None)
+    parser.add_argument('--min-available-memory',
+                        help='Only launch a browser while this many megabytes of memory stay available after it and '
+                             'the host is not under memory or cpu pressure, waiting otherwise.',
+                        dest='min_available_memory',
+                        action='store',
+                        type=int,
+                        default=None)
+    parser.add_argument('--launch-rate',
+                        help='Start at most this many browsers per second, spreading bursts of launches out over '
+                             'time regardless of how many sessions run at once.',
+                        dest='launch_rate',
+                        action='store',
+                        type=float,
+                        default=None)
+    parser.add_argument('--launch-burst',
+                        help='With --launch-rate the number of browsers that may start back to back. Defaults to 1.',
+                        dest='launch_burst',
+                        action='store',
+                        type=int,
+                        default=1)
+    parser.add_argument('--resource-sampling-interval',
+                        help='Sample the memory, cpu time and io of the browser of every session every this many '
+                             'seconds. Every sample reads the state of all the processes of the host, so keep it '
+                             'coarse. Disabled by default.',
+                        dest='resource_sampling_interval',
+                        action='store',
+                        type=float,
+                        default=None)
+    parser.add_argument('--metrics-file',
+                        help='Write the metrics in the prometheus text format to this file on exit.',
+                        dest='metrics_file',
+                        action='store',
+                        default=None)
     args = parser.parse_args()
     return args
 
 
+def get_stale_accounts(args, accounts):
+    """
+    Gets us the accounts whose cookies are not fresh enough to skip the harvest.
+
+    Args:
+        args: The parsed cli arguments.
+        accounts (dict): The cookie file names by account to harvest.
+
+    Returns:
+        The stale cookie file names by account, the accounts unchanged if freshness is not checked or None if
+        nothing needs to be harvested.
+
+    """
+    if args.fresh_margin is None or args.keep_alive or args.warm_up_http_cache:
+        return accounts
+    cookie_files = accounts or {None: 'location_sharing.cookies'}
+    stale = {account: cookie_file_name for account, cookie_file_name in cookie_files.items()
+             if not is_cookie_jar_fresh(cookie_file_name, margin=args.fresh_margin, max_age=args.max_file_age)}
+    if not stale:
+        return None
+    return stale if accounts else accounts
+
+
+def get_cookie_getter(args):
+    """
+    Gets us the cookie getter configured with the login profile, sinks and scheduling of the cli arguments.
+
+    Args:
+        args: The parsed cli arguments.
+
+    Returns:
+        The configured CookieGetter.
+
+    """
+    admission = None
+    if args.min_available_memory is not None:
+        admission = AdmissionController(min_available=args.min_available_memory * 1024 * 1024)
+    launch_limiter = LaunchRateLimiter(args.launch_rate, args.launch_burst) if args.launch_rate else None
+    return CookieGetter(login_profile=LOGIN_PROFILES.get(args.login_profile),
+                        engine=args.engine,
+                        user_data_root=args.user_data_root,
+                        http_cache_seed=args.http_cache_seed,
+                        sinks=[create_sink(sink) for sink in args.sinks or []],
+                        change_streams=[create_change_stream(stream) for stream in args.change_streams or []],
+                        cookie_filter=COOKIE_FILTERS.get(args.cookie_filter),
+                        admission=admission,
+                        launch_limiter=launch_limiter,
+                        resource_sampling_interval=args.resource_sampling_interval)
+
+
+def harvest_accounts(args, getter, accounts):
+    """
+    Harvests many accounts through a coordinator, a browser per account or a shared browser.
+
+    Args:
+        args: The parsed cli arguments.
+        getter (CookieGetter): The cookie getter to harvest with.
+        accounts (dict): The cookie file names by account to harvest.
+
+    """
+    if args.coordinator:
+        HarvestCoordinator(WorkQueue(args.coordinator), listen=args.listen).run(accounts, sink=getter.sink)
+    elif args.browser_per_account:
+        getter.run_batch(accounts,
+                         reseed=args.reseed,
+                         preloaded_browsers=args.preload,
+                         journal=HarvestJournal(args.journal) if args.journal else None)
+    else:
+        getter.run_accounts(accounts, reseed=args.reseed)
+
+
+def run(args, getter, accounts):
+    """
+    Runs the mode of operation selected by the cli arguments.
+
+    Args:
+        args: The parsed cli arguments.
+        getter (CookieGetter): The cookie getter to harvest with.
+        accounts (dict): The cookie file names by account to harvest.
+
+    """
+    if args.warm_up_http_cache:
+        getter.warm_up_http_cache(args.http_cache_seed or 'http-cache-seed')
+    elif args.worker:
+        HarvestWorker(create_work_queue(args.worker), getter).run()
+    elif accounts:
+        harvest_accounts(args, getter, accounts)
+    elif args.keep_alive:
+        CookieKeepAlive(cookie_getter=getter).run(interval=args.keep_alive)
+    else:
+        try:
+            getter.run(reseed=args.reseed, wait_for_lock=args.wait_for_lock)
+        except HarvestInProgress as lock:
+            LOGGER.info('Another harvest holds "%s", exiting.', lock)
+
+
 def main():
     """
     Main method.
@@ -88,8 +366,18 @@ def main():
     """
     args = get_arguments()
     coloredlogs.install(level=args.log_level)
-    getter = CookieGetter()
-    getter.run()
+    accounts = get_stale_accounts(args, {account: '{account}.cookies'.format(account=account)
+                                         for account in args.accounts or []})
+    if accounts is None:
+        LOGGER.info('Existing cookies are still fresh, nothing to do.')
+        return
+    getter = get_cookie_getter(args)
+    try:
+        run(args, getter, accounts)
+    finally:
+        getter.close()
+    if args.metrics_file:
+        METRICS.write(args.metrics_file)
     # Main code goes here
 
 
@@ -48,3 +48,27 @@ class UnsupportedOS(Exception):
 
 class UnsupportedDefaultBrowser(Exception):
     """The browser could not be identified or is not supported."""
+
+
+class KeepAliveFailed(Exception):
+    """The session cookies could not be extended over http and a new login is required."""
+
+
+class WebSocketClosed(Exception):
+    """The websocket connection to the browser driver was closed."""
+
+
+class HarvestInProgress(Exception):
+    """Another harvest for the same cookie file is in progress."""
+
+
+class SinkFailed(Exception):
+    """One or more output sinks could not write the harvested cookies."""
+
+
+class AdmissionTimeout(Exception):
+    """A browser launch was not admitted in time because the host had no headroom."""
+
+
+class WorkQueueUnavailable(Exception):
+    """The work queue served by a coordinator could not be reached or rejected a request."""
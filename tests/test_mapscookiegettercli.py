@@ -33,7 +33,62 @@ Tests for `mapscookiegettercli` module.
 
 """
 
+import base64
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from multiprocessing import get_context
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from itertools import count
+from threading import Barrier, Event, Lock, Thread
+from time import monotonic, sleep, time
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
 from betamax.fixtures import unittest
+from requests.cookies import RequestsCookieJar
+from selenium.common.exceptions import NoSuchWindowException, WebDriverException
+
+from mapscookiegettercli import CookieGetter
+from mapscookiegettercli.browsers import DevToolsChrome, SharedChromeDriverService
+from mapscookiegettercli.browsers.bidi import BiDiSession
+from mapscookiegettercli.browsers.chrome import chrome_arguments
+from mapscookiegettercli.browsers.devtools import DevToolsPipe, webdriver_cookie
+from mapscookiegettercli.browsers.userdata import UserDataDirectory
+from mapscookiegettercli.browsers.websocket import WebSocket, WEBSOCKET_GUID
+from mapscookiegettercli.library import (CookieKeepAlive, KeepAliveRequest, LoginProfile, BatchingSink, CookieSink,
+                                         FileSink, SQLiteSink, StdoutSink)
+from mapscookiegettercli.library.admission import AdmissionController, MEGABYTE
+from mapscookiegettercli.library.compaction import LOCATION_SHARING_FILTER
+from mapscookiegettercli.library.contexts import BrowserContext
+from mapscookiegettercli.library.distributed import (HarvestCoordinator, HarvestWorker, RemoteWorkQueue, WorkQueue,
+                                                      WorkQueueServer, create_work_queue)
+from mapscookiegettercli.library.freshness import AUTH_COOKIE_NAMES, is_cookie_jar_fresh
+from mapscookiegettercli.library.jarfile import last_verified, load_cookie_jar, mark_verified, save_cookie_jar
+from mapscookiegettercli.library.keepalive import KEEP_ALIVE_REQUESTS
+from mapscookiegettercli.library.journal import HarvestJournal, COMPLETED, FAILED, QUEUED, RUNNING
+from mapscookiegettercli.library.loader import CookieJarIndex
+from mapscookiegettercli.library.loginprofile import LIGHTWEIGHT_PROFILE, LOGGED_IN_HEURISTIC, MAPS_PROFILE, SIGN_IN_URL
+from mapscookiegettercli.library.metrics import Metrics
+from mapscookiegettercli.library.pool import DriverPool
+from mapscookiegettercli.library.ratelimit import LaunchRateLimiter
+from mapscookiegettercli.library.resources import ResourceSampler, driver_root_pids
+from mapscookiegettercli.library.locking import HarvestLock
+from mapscookiegettercli.library.notifications import NotifyingSink, UnixSocketChangeStream
+from mapscookiegettercli.library.session import HarvestResult, HarvestSession
+from mapscookiegettercli.mapscookiegettercliexceptions import (KeepAliveFailed, HarvestInProgress, AdmissionTimeout,
+                                                               WebSocketClosed, WorkQueueUnavailable)
 
 __author__ = '''Costas Tyfoxylos <costas.tyf@gmail.com>'''
 __docformat__ = '''google'''
@@ -63,3 +118,1530 @@ class TestMapscookiegettercli(unittest.BetamaxTestCase):
         This is where you should tear down what you've setup in setUp before. This method is called after every test.
         """
         pass
+
+
+class RotatingCookieHandler(BaseHTTPRequestHandler):
+    """Stand in for google that rotates a valid SID cookie and redirects to a sign in page otherwise"""
+
+    valid_values = {'initial'}
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        # as a proxy the path is the absolute url of the request
+        if urlsplit(self.path).path.startswith('/ServiceLogin'):
+            self.send_response(200)
+            self.end_headers()
+            return
+        cookie = self.headers.get('Cookie', '')
+        value = cookie.partition('SID=')[2].split(';')[0]
+        if value not in self.valid_values:
+            self.send_response(302)
+            self.send_header('Location', '/ServiceLogin?continue=https%3A%2F%2Faccounts.google.com')
+            self.end_headers()
+            return
+        rotated = 'rotated-{}'.format(len(self.valid_values))
+        self.valid_values.add(rotated)
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'SID={}; Path=/'.format(rotated))
+        self.end_headers()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.do_GET()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class FakeCookieGetter:  # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        self.runs = []
+
+    def run(self, cookie_file_name='location_sharing.cookies'):
+        self.runs.append(cookie_file_name)
+
+
+class TestCookieKeepAlive(TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), RotatingCookieHandler)
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        handle, self.cookie_file = tempfile.mkstemp()
+        os.close(handle)
+        self.url = 'http://127.0.0.1:{}/refresh'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.cookie_file)
+
+    def _save_jar(self, value, domain='127.0.0.1'):
+        jar = RequestsCookieJar()
+        jar.set('SID', value, domain=domain, path='/')
+        save_cookie_jar(jar, self.cookie_file)
+
+    def _keep_alive(self, cookie_getter=None):
+        return CookieKeepAlive(self.cookie_file,
+                               keep_alive_requests=(KeepAliveRequest(self.url),),
+                               cookie_getter=cookie_getter)
+
+    def _default_keep_alive(self):
+        """Sends the default keep alive requests over plain http through the stand in server acting as a proxy"""
+        requests = tuple(KeepAliveRequest(request.url.replace('https://', 'http://'), request.method, request.data)
+                         for request in KEEP_ALIVE_REQUESTS)
+        proxy = {'http_proxy': 'http://127.0.0.1:{}'.format(self.server.server_port), 'no_proxy': ''}
+        patcher = patch.dict(os.environ, proxy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return CookieKeepAlive(self.cookie_file, keep_alive_requests=requests)
+
+    def test_refresh_writes_back_rotated_cookies(self):
+        self._save_jar('initial')
+        self._keep_alive().refresh()
+        first = load_cookie_jar(self.cookie_file).get('SID')
+        self.assertTrue(first.startswith('rotated-'))
+        self._keep_alive().refresh()
+        self.assertNotEqual(first, load_cookie_jar(self.cookie_file).get('SID'))
+
+    def test_default_requests_and_paths_refresh_a_signed_in_jar(self):
+        self._save_jar('initial', domain='.google.com')
+        self._default_keep_alive().refresh()
+        self.assertTrue(any(cookie.value.startswith('rotated-')
+                            for cookie in load_cookie_jar(self.cookie_file) if cookie.name == 'SID'))
+
+    def test_default_paths_detect_a_redirect_to_the_sign_in_page(self):
+        self._save_jar('expired', domain='.google.com')
+        with self.assertRaises(KeepAliveFailed):
+            self._default_keep_alive().refresh()
+
+    def test_expired_jar_escalates_to_browser_login(self):
+        self._save_jar('expired')
+        with self.assertRaises(KeepAliveFailed):
+            self._keep_alive().refresh()
+        getter = FakeCookieGetter()
+        self.assertFalse(self._keep_alive(getter).keep_alive())
+        self.assertEqual(getter.runs, [self.cookie_file])
+
+    def test_corrupt_jar_escalates_to_browser_login(self):
+        with open(self.cookie_file, 'wb') as corrupt:
+            corrupt.write(b'\x80\x04garbage')
+        getter = FakeCookieGetter()
+        self.assertFalse(self._keep_alive(getter).keep_alive())
+        self.assertEqual(getter.runs, [self.cookie_file])
+
+
+class FakeContextDriver:
+    """Emulates the devtools protocol browser context commands of a chrome driven by chromedriver"""
+
+    def __init__(self):
+        self.contexts = {}
+        self.targets = {}
+        self.window_handles = ['main']
+        self.current_window_handle = 'main'
+        self.switch_to = self
+        self.commands = {'Target.createBrowserContext': self._create_context,
+                         'Target.createTarget': self._create_target,
+                         'Target.disposeBrowserContext': self._dispose_context,
+                         'Storage.getCookies': self._get_cookies}
+
+    def window(self, handle):
+        self.current_window_handle = handle
+
+    def execute_cdp_cmd(self, command, arguments):
+        return self.commands[command](arguments)
+
+    def set_cookie(self, name, value):
+        context_id = self.targets[self.current_window_handle]
+        self.contexts[context_id].append({'name': name, 'value': value, 'domain': '.google.com',
+                                          'path': '/', 'expires': -1, 'session': True, 'size': 4})
+
+    def _create_context(self, _):
+        context_id = 'context-{}'.format(len(self.contexts))
+        self.contexts[context_id] = []
+        return {'browserContextId': context_id}
+
+    def _create_target(self, arguments):
+        target_id = 'target-{}'.format(len(self.targets))
+        self.targets['CDwindow-' + target_id] = arguments['browserContextId']
+        self.window_handles.append('CDwindow-' + target_id)
+        return {'targetId': target_id}
+
+    def _dispose_context(self, arguments):
+        del self.contexts[arguments['browserContextId']]
+        return {}
+
+    def _get_cookies(self, arguments):
+        return {'cookies': list(self.contexts[arguments['browserContextId']])}
+
+
+class TestBrowserContexts(TestCase):
+
+    def test_cookies_are_isolated_between_contexts(self):
+        driver = FakeContextDriver()
+        first, second = BrowserContext(driver, 'first'), BrowserContext(driver, 'second')
+        first.activate()
+        driver.set_cookie('SID', 'first-account')
+        second.activate()
+        driver.set_cookie('SID', 'second-account')
+        self.assertEqual([cookie['value'] for cookie in first.get_cookies()], ['first-account'])
+        self.assertEqual([cookie['value'] for cookie in second.get_cookies()], ['second-account'])
+        self.assertNotIn('size', first.get_cookies()[0])
+        first.dispose()
+        self.assertEqual([cookie['value'] for cookie in second.get_cookies()], ['second-account'])
+
+
+class TestHarvestLock(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cookie_file = os.path.join(self.directory, 'location_sharing.cookies')
+
+    def tearDown(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def test_second_harvest_does_not_wait_when_asked(self):
+        with HarvestLock(self.cookie_file):
+            with self.assertRaises(HarvestInProgress):
+                HarvestLock(self.cookie_file, wait=False).acquire()
+        with HarvestLock(self.cookie_file, wait=False) as lock:
+            self.assertFalse(lock.waited)
+
+    def test_held_lock_is_never_broken_for_its_age(self):
+        with HarvestLock(self.cookie_file):
+            with self.assertRaises(HarvestInProgress):
+                HarvestLock(self.cookie_file, wait=False, stale_after=-1).acquire()
+
+    def test_lock_of_a_dead_process_is_broken(self):
+        with open(self.cookie_file + '.lock', 'w') as lock_file:
+            lock_file.write('999999999 0')
+        with HarvestLock(self.cookie_file, wait=False):
+            self.assertTrue(os.path.exists(self.cookie_file + '.lock'))
+        self.assertFalse(os.path.exists(self.cookie_file + '.lock'))
+
+
+class FakeLoginDriver:
+    """A driver that is logged in as soon as it navigates, with a session cookie unique to the driver"""
+
+    ids = count()
+    lock = Lock()
+    created = []
+
+    def __init__(self):
+        with self.lock:
+            self.identifier = next(self.ids)
+            self.created.append(self)
+        self.current_url = 'about:blank'
+        self.quits = 0
+
+    def get(self, url):
+        sleep(0.05)
+        self.current_url = url
+
+    def get_cookies(self):
+        return [{'name': 'SID', 'value': 'driver-{}'.format(self.identifier), 'domain': '.google.com',
+                 'path': '/', 'secure': True, 'httpOnly': True}]
+
+    @staticmethod
+    def execute_script(*_):
+        return [0, 0, 0]
+
+    def close(self):
+        pass
+
+    def quit(self):
+        self.quits += 1
+
+
+class TestConcurrentHarvests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        FakeLoginDriver.created = []
+        profile = LoginProfile('fake', 'https://www.google.com/', lambda driver: driver.current_url != 'about:blank')
+        self.getter = CookieGetter(login_profile=profile,
+                                   browser='chrome',
+                                   user_data_root=self.directory,
+                                   driver_factory=FakeLoginDriver)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_concurrent_harvests_do_not_share_state(self):
+        cookie_files = [os.path.join(self.directory, '{}.cookies'.format(index)) for index in range(40)]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(self.getter.run, cookie_files))
+        values = [load_cookie_jar(cookie_file).get('SID') for cookie_file in cookie_files]
+        self.assertEqual(len(set(values)), len(cookie_files))
+        self.assertEqual(len(FakeLoginDriver.created), len(cookie_files))
+        self.assertTrue(all(driver.quits == 1 for driver in FakeLoginDriver.created))
+
+    def test_concurrent_harvests_of_the_same_file_are_coalesced(self):
+        cookie_file = os.path.join(self.directory, 'shared.cookies')
+        barrier = Barrier(8)
+
+        def harvest():
+            barrier.wait()
+            self.getter.run(cookie_file)
+
+        threads = [Thread(target=harvest) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(FakeLoginDriver.created), 1)
+
+    def test_harvests_of_different_cookie_getters_are_not_coalesced(self):
+        cookie_file = os.path.join(self.directory, 'shared.cookies')
+        writing = Event()
+
+        class SlowSink(RecordingSink):
+
+            def write_batch(self, results):
+                writing.set()
+                sleep(0.3)
+                super(SlowSink, self).write_batch(results)
+
+        first_sink, second_sink = SlowSink(), RecordingSink()
+        first = CookieGetter(login_profile=self.getter.login_profile, browser='chrome', user_data_root=self.directory,
+                             driver_factory=FakeLoginDriver, sinks=[first_sink])
+        second = CookieGetter(login_profile=self.getter.login_profile, browser='chrome', user_data_root=self.directory,
+                              driver_factory=FakeLoginDriver, sinks=[second_sink])
+        thread = Thread(target=first.run, args=(cookie_file,))
+        thread.start()
+        writing.wait(5)
+        second.run(cookie_file)
+        thread.join()
+        self.assertEqual(len(first_sink.batches), 1)
+        self.assertEqual(len(second_sink.batches), 1)
+        self.assertEqual(len(FakeLoginDriver.created), 2)
+
+    def test_cookies_verified_while_waiting_for_the_lock_are_reused(self):
+        cookie_file = os.path.join(self.directory, 'verified.cookies')
+        cookie_jar = RequestsCookieJar()
+        cookie_jar.set('SID', 'verified', domain='.google.com', path='/')
+        save_cookie_jar(cookie_jar, cookie_file)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with HarvestLock(cookie_file):
+                harvest = executor.submit(self.getter.run, cookie_file)
+                sleep(0.2)
+                mark_verified(cookie_file)
+            result = harvest.result()
+        self.assertTrue(result.reused)
+        self.assertEqual(result.cookie_jar.get('SID'), 'verified')
+        self.assertEqual(FakeLoginDriver.created, [])
+
+    def test_harvest_without_cookie_file_returns_the_jar(self):
+        result = self.getter.run(None)
+        self.assertEqual(result.cookie_jar.get('SID'), 'driver-{}'.format(FakeLoginDriver.created[0].identifier))
+        self.assertIsNone(result.cookie_file_name)
+        self.assertFalse(result.reused)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class RecordingSink(CookieSink):
+
+    def __init__(self):
+        super(RecordingSink, self).__init__()
+        self.batches = []
+
+    def write_batch(self, results):
+        self.batches.append(list(results))
+
+
+class TestSinks(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profile = LoginProfile('fake', 'https://www.google.com/',
+                                    lambda driver: driver.current_url != 'about:blank')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_one_harvest_fans_out_to_all_sinks(self):
+        stream = StringIO()
+        database = os.path.join(self.directory, 'cookies.db')
+        cookie_file = os.path.join(self.directory, 'account.cookies')
+        getter = CookieGetter(login_profile=self.profile,
+                              browser='chrome',
+                              user_data_root=self.directory,
+                              driver_factory=FakeLoginDriver,
+                              sinks=[FileSink(), StdoutSink(stream), SQLiteSink(database)])
+        result = getter.run(cookie_file)
+        getter.close()
+        value = result.cookie_jar.get('SID')
+        self.assertEqual(load_cookie_jar(cookie_file).get('SID'), value)
+        self.assertEqual(json.loads(stream.getvalue())['cookies'][0]['value'], value)
+        with sqlite3.connect(database) as connection:
+            rows = connection.execute('SELECT cookie_file_name FROM cookie_jars').fetchall()
+        self.assertEqual(rows, [(cookie_file,)])
+
+    def test_unchanged_cookie_jars_are_not_rewritten(self):
+        cookie_file = os.path.join(self.directory, 'account.cookies')
+        cookie_jar = RequestsCookieJar()
+        cookie_jar.set('SID', 'first', domain='.google.com', path='/')
+        cookie_jar.set('HSID', 'first', domain='.google.com', path='/')
+        sink = FileSink()
+        sink.write(HarvestResult(cookie_jar, cookie_file_name=cookie_file))
+        os.utime(cookie_file, (0, 0))
+        inode = os.stat(cookie_file).st_ino
+        sink.write(HarvestResult(cookie_jar.copy(), cookie_file_name=cookie_file))
+        self.assertEqual(os.stat(cookie_file).st_ino, inode)
+        self.assertEqual(os.stat(cookie_file).st_mtime, 0)
+        self.assertGreater(last_verified(cookie_file), 0)
+        cookie_jar.set('SID', 'second', domain='.google.com', path='/')
+        with self.assertLogs('sinks', level='INFO') as logs:
+            sink.write(HarvestResult(cookie_jar, cookie_file_name=cookie_file))
+        self.assertNotEqual(os.stat(cookie_file).st_ino, inode)
+        self.assertIn('changed: .google.com / SID', ''.join(logs.output))
+
+    def test_batching_sink_writes_in_batches(self):
+        recording = RecordingSink()
+        sink = BatchingSink(recording, batch_size=3, max_delay=60)
+        for index in range(7):
+            sink.write(index)
+        self.assertEqual(recording.batches, [[0, 1, 2], [3, 4, 5]])
+        sink.close()
+        self.assertEqual(recording.batches[-1], [6])
+
+
+class TestCookieJarIndex(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for account in ('first', 'second', 'third'):
+            cookie_jar = RequestsCookieJar()
+            cookie_jar.set('SID', account, domain='.google.com', path='/')
+            save_cookie_jar(cookie_jar, os.path.join(self.directory, '{}.cookies'.format(account)))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cookie_jars_are_loaded_lazily_and_evicted(self):
+        index = CookieJarIndex(self.directory, max_resident=2)
+        self.assertEqual(index.accounts, ['first', 'second', 'third'])
+        self.assertEqual(index.resident, [])
+        for account in ('first', 'second', 'third'):
+            self.assertEqual(index[account].get('SID'), account)
+        self.assertEqual(index.resident, ['second', 'third'])
+
+    def test_replaced_cookie_files_are_loaded_again(self):
+        index = CookieJarIndex(self.directory)
+        self.assertEqual(index['first'].get('SID'), 'first')
+        cookie_jar = RequestsCookieJar()
+        cookie_jar.set('SID', 'renewed', domain='.google.com', path='/')
+        cookie_file = index.entry('first').path
+        save_cookie_jar(cookie_jar, cookie_file)
+        os.utime(cookie_file, (0, 0))
+        self.assertEqual(index['first'].get('SID'), 'renewed')
+
+    def test_replacement_with_the_same_modification_time_is_loaded_again(self):
+        index = CookieJarIndex(self.directory)
+        cookie_file = index.entry('first').path
+        modified = os.stat(cookie_file).st_mtime_ns
+        self.assertEqual(index['first'].get('SID'), 'first')
+        cookie_jar = RequestsCookieJar()
+        cookie_jar.set('SID', 'tsrif', domain='.google.com', path='/')
+        save_cookie_jar(cookie_jar, cookie_file)
+        os.utime(cookie_file, ns=(modified, modified))
+        self.assertEqual(index['first'].get('SID'), 'tsrif')
+
+
+class TestChangeNotifications(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.stream = UnixSocketChangeStream(os.path.join(self.directory, 'events.sock'))
+        self.sink = NotifyingSink(FileSink(), [self.stream])
+        self.cookie_file = os.path.join(self.directory, 'account.cookies')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, value):
+        cookie_jar = RequestsCookieJar()
+        cookie_jar.set('SID', value, domain='.google.com', path='/')
+        self.sink.write(HarvestResult(cookie_jar, account='account', cookie_file_name=self.cookie_file))
+
+    def test_only_changes_are_published(self):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)  # pylint: disable=no-member
+        client.connect(self.stream.path)
+        while not self.stream._subscribers:  # pylint: disable=protected-access
+            sleep(0.01)
+        for value in ('first', 'first', 'second'):
+            self._write(value)
+        self.sink.close()
+        with client, client.makefile() as events:
+            events = [json.loads(line) for line in events if line.strip()]
+        self.assertEqual([(event['account'], event['version']) for event in events], [('account', 1), ('account', 2)])
+        self.assertNotEqual(events[0]['hash'], events[1]['hash'])
+        self.assertEqual(load_cookie_jar(self.cookie_file).get('SID'), 'second')
+
+
+class TestCookieFilter(TestCase):
+
+    def test_location_sharing_filter_keeps_required_cookies_once(self):
+        cookies = [{'name': 'SID', 'value': 'host', 'domain': 'www.google.com', 'path': '/'},
+                   {'name': 'SID', 'value': 'domain', 'domain': '.google.com', 'path': '/'},
+                   {'name': 'NID', 'value': 'nid', 'domain': '.google.com', 'path': '/'},
+                   {'name': '_ga', 'value': 'analytics', 'domain': '.google.com', 'path': '/'},
+                   {'name': 'CONSENT', 'value': 'yes', 'domain': '.google.com', 'path': '/'}]
+        compacted = LOCATION_SHARING_FILTER.apply(cookies)
+        self.assertEqual(sorted((cookie['name'], cookie['value']) for cookie in compacted),
+                         [('NID', 'nid'), ('SID', 'domain')])
+
+
+class TestHarvestJournal(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'batch.journal')
+        self.accounts = {account: os.path.join(self.directory, '{}.cookies'.format(account))
+                         for account in ('first', 'second', 'third')}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_restarted_batch_resumes_where_it_left_off(self):
+        journal = HarvestJournal(self.path)
+        self.assertEqual(list(journal.schedule(self.accounts)), ['first', 'second', 'third'])
+        journal.start('first')
+        journal.complete('first')
+        journal.start('second')
+        with open(self.path, 'a') as torn:
+            torn.write('{"account": "thi')
+        journal = HarvestJournal(self.path, compact_after=2)
+        self.assertEqual(list(journal.schedule(self.accounts)), ['second', 'third'])
+        journal.start('third')
+        journal.fail('third', 'crashed')
+        self.assertEqual(list(journal.schedule(self.accounts)), ['second'])
+        with open(self.path) as compacted:
+            self.assertEqual(len(compacted.readlines()), 3)
+
+    def test_journal_is_compacted_only_once_it_outgrows_its_jobs(self):
+        journal = HarvestJournal(self.path, compact_after=3)
+        journal.schedule({'account{}'.format(index): None for index in range(10)})
+        journal.start('account0')
+        journal.complete('account0')
+        with open(self.path) as appended:
+            self.assertEqual(len(appended.readlines()), 12)
+        journal.start('account1')
+        with open(self.path) as compacted:
+            self.assertEqual(len(compacted.readlines()), 10)
+
+    def test_completed_batch_clears_the_journal(self):
+        getter = CookieGetter(login_profile=LoginProfile('fake', 'https://www.google.com/',
+                                                         lambda driver: driver.current_url != 'about:blank'),
+                              browser='chrome',
+                              user_data_root=self.directory,
+                              driver_factory=FakeLoginDriver)
+        journal = HarvestJournal(self.path)
+        journal.schedule(self.accounts)
+        journal.start('first')
+        journal.complete('first')
+        results = getter.run_batch(self.accounts, journal=journal)
+        self.assertEqual(sorted(results), ['second', 'third'])
+        self.assertEqual(journal.jobs, {})
+        self.assertTrue(all(os.path.exists(self.accounts[account]) for account in results))
+
+
+HARVEST_DURATION = 0.3
+
+
+class SleepingCookieGetter:  # pylint: disable=too-few-public-methods
+
+    @staticmethod
+    def run_account(account, cookie_file_name=None, save=True):  # pylint: disable=unused-argument
+        sleep(HARVEST_DURATION)
+        cookie_jar = RequestsCookieJar()
+        cookie_jar.set('SID', account, domain='.google.com', path='/')
+        return HarvestResult(cookie_jar, account=account, cookie_file_name=cookie_file_name)
+
+
+def run_worker(specification, name):
+    HarvestWorker(create_work_queue(specification), SleepingCookieGetter(), name=name, poll_interval=0.05).run()
+
+
+class TestDistributedHarvests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database = os.path.join(self.directory, 'queue.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_concurrent_claims_get_distinct_jobs(self):
+        queue = WorkQueue(self.database)
+        queue.enqueue({'account{}'.format(index): None for index in range(8)})
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            claims = list(executor.map(queue.claim, ['worker{}'.format(index) for index in range(8)]))
+        self.assertEqual(sorted(account for account, _ in claims), sorted('account{}'.format(index)
+                                                                            for index in range(8)))
+        self.assertIsNone(queue.claim('late'))
+
+    def _harvest(self, workers, served=False):
+        """Harvests 16 accounts with worker processes, returning the results and the seconds the workers took"""
+        accounts = {'account{}'.format(index): os.path.join(self.directory, 'account{}.cookies'.format(index))
+                    for index in range(16)}
+        queue = WorkQueue(self.database)
+        with ThreadPoolExecutor(max_workers=1) as executor, WorkQueueServer(queue) as server:
+            coordinator = executor.submit(HarvestCoordinator(queue, poll_interval=0.05).run, accounts, FileSink())
+            while queue.counts().get('queued') != len(accounts):
+                sleep(0.01)
+            context = get_context('fork')
+            processes = [context.Process(target=run_worker, args=(server.url if served else self.database,
+                                                                  'worker{}'.format(index)))
+                         for index in range(workers)]
+            started = monotonic()
+            for process in processes:
+                process.start()
+            results = coordinator.result()
+            elapsed = monotonic() - started
+            # forked workers share the listening socket, they have to be gone before the server closes
+            for process in processes:
+                process.join()
+        self.assertEqual(sorted(results), sorted(accounts))
+        self.assertTrue(all(load_cookie_jar(cookie_file).get('SID') == account
+                            for account, cookie_file in accounts.items()))
+        return results, elapsed
+
+    def _harvests_per_worker(self):
+        with sqlite3.connect(self.database) as connection:
+            attempts = connection.execute('SELECT DISTINCT attempts FROM jobs').fetchall()
+            harvests = connection.execute('SELECT COUNT(*), COUNT(DISTINCT account) FROM cookie_jars').fetchone()
+            workers = connection.execute('SELECT COUNT(DISTINCT worker) FROM jobs').fetchone()[0]
+        self.assertEqual(attempts, [(1,)])
+        self.assertEqual(harvests, (16, 16))
+        return workers
+
+    def test_workers_share_the_queue_without_harvesting_an_account_twice(self):
+        self._harvest(4)
+        self.assertEqual(self._harvests_per_worker(), 4)
+
+    def test_workers_lease_the_jobs_over_http(self):
+        self._harvest(4, served=True)
+        self.assertEqual(self._harvests_per_worker(), 4)
+
+    def test_throughput_scales_with_workers(self):
+        _, elapsed = self._harvest(4, served=True)
+        # one worker needs 16 harvest durations, four of them at least twice the throughput even on a slow host
+        self.assertLess(elapsed, 16 * HARVEST_DURATION / 2)
+
+    def test_remote_queue_of_a_stopped_coordinator_is_unavailable(self):
+        with WorkQueueServer(WorkQueue(self.database)) as server:
+            queue = RemoteWorkQueue(server.url, timeout=1)
+            self.assertIsNone(queue.claim('worker'))
+        with self.assertRaises(WorkQueueUnavailable):
+            queue.claim('worker')
+
+    def test_queueing_again_leaves_leased_jobs_alone(self):
+        queue = WorkQueue(self.database)
+        queue.enqueue({'account': None})
+        self.assertEqual(queue.claim('worker'), ('account', None))
+        queue.enqueue({'account': None})
+        self.assertIsNone(queue.claim('other'))
+        self.assertTrue(queue.complete('worker', 'account'))
+        queue.enqueue({'account': None})
+        self.assertEqual(queue.claim('other'), ('account', None))
+
+    def test_expired_leases_are_reclaimed(self):
+        queue = WorkQueue(self.database, lease_duration=0.2)
+        queue.enqueue({'account': None})
+        self.assertEqual(queue.claim('dead'), ('account', None))
+        self.assertIsNone(queue.claim('alive'))
+        sleep(0.3)
+        self.assertEqual(queue.claim('alive'), ('account', None))
+        self.assertFalse(queue.complete('dead', 'account'))
+        self.assertTrue(queue.complete('alive', 'account'))
+        self.assertTrue(queue.is_done())
+
+    def test_expired_leases_fail_once_out_of_attempts(self):
+        queue = WorkQueue(self.database, lease_duration=0.05, max_attempts=2)
+        queue.enqueue({'account': None})
+        for worker in ('first', 'second'):
+            self.assertEqual(queue.claim(worker), ('account', None))
+            sleep(0.1)
+        self.assertIsNone(queue.claim('third'))
+        self.assertEqual(queue.counts(), {'failed': 1})
+        self.assertTrue(queue.is_done())
+
+
+class TestAdmissionController(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.directory, 'pressure'))
+        with open(os.path.join(self.directory, 'meminfo'), 'w') as meminfo:
+            meminfo.write('MemTotal:        4096000 kB\nMemAvailable:    1024000 kB\n')
+        self._pressure('memory', 0.0)
+        self._pressure('cpu', 0.0)
+        self.metrics = Metrics()
+        self.controller = AdmissionController(min_available=200 * MEGABYTE,
+                                              session_memory=300 * MEGABYTE,
+                                              poll_interval=0.01,
+                                              metrics=self.metrics,
+                                              proc_directory=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _pressure(self, resource, average):
+        with open(os.path.join(self.directory, 'pressure', resource), 'w') as pressure:
+            pressure.write('some avg10={:.2f} avg60=0.00 avg300=0.00 total=0\n'
+                           'full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n'.format(average))
+
+    def test_launches_are_admitted_while_memory_is_left(self):
+        self.controller.acquire(timeout=0)
+        self.controller.acquire(timeout=0)
+        with self.assertRaises(AdmissionTimeout):
+            self.controller.acquire(timeout=0.05)
+        self.assertEqual(self.metrics.get('admission_admitted_total'), 2)
+        self.assertEqual(self.metrics.get('admission_delayed_total', reason='memory'), 1)
+        self.assertIn('maps_cookie_getter_admission_rejected_total 1', self.metrics.to_prometheus())
+
+    def test_launches_wait_for_pressure_to_drop(self):
+        self._pressure('memory', 50.0)
+        Thread(target=lambda: (sleep(0.1), self._pressure('memory', 0.0))).start()
+        self.assertGreater(self.controller.acquire(timeout=5), 0.05)
+        self.assertEqual(self.metrics.get('admission_delayed_total', reason='memory_pressure'), 1)
+
+
+class TestLaunchRateLimiter(TestCase):
+
+    def test_bursts_are_spread_over_time(self):
+        limiter = LaunchRateLimiter(rate=20, burst=2, metrics=Metrics())
+        delays = [limiter.reserve() for _ in range(4)]
+        self.assertEqual(delays[:2], [0.0, 0.0])
+        self.assertAlmostEqual(delays[2], 0.05, delta=0.01)
+        self.assertAlmostEqual(delays[3], 0.10, delta=0.01)
+
+    def test_concurrent_launches_wait_for_their_token(self):
+        metrics = Metrics()
+        limiter = LaunchRateLimiter(rate=20, burst=1, metrics=metrics)
+        start = monotonic()
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            list(executor.map(lambda _: limiter.acquire(), range(5)))
+        self.assertGreaterEqual(monotonic() - start, 0.19)
+        self.assertEqual(metrics.get('launch_throttled_total'), 4)
+
+
+class FakeServiceDriver:  # pylint: disable=too-few-public-methods
+
+    def __init__(self, process):
+        self.service = type('Service', (), {'process': process})()
+
+
+@skipUnless(ResourceSampler.is_supported(), 'procfs is not available')
+class TestResourceSampler(TestCase):
+
+    def test_process_tree_of_the_driver_is_accounted(self):
+        script = ('import subprocess, sys, time\n'
+                  'child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(1)"])\n'
+                  'memory = bytearray(64 * 1024 * 1024)\n'
+                  'end = time.time() + 0.3\n'
+                  'while time.time() < end: pass\n'
+                  'child.wait()\n')
+        process = subprocess.Popen([sys.executable, '-c', script])
+        sampler = ResourceSampler(FakeServiceDriver(process), interval=0.05)
+        sampler.start()
+        process.wait()
+        usage = sampler.stop()
+        self.assertGreaterEqual(usage.processes, 2)
+        self.assertGreater(usage.peak_rss, 64 * 1024 * 1024)
+        self.assertGreater(usage.cpu_seconds, 0.2)
+
+    def test_root_processes_are_looked_up_once(self):
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(1)'])
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        driver = FakeServiceDriver(None)
+        sampler = ResourceSampler(driver)
+        sampler.sample()
+        driver.service.process = process
+        sampler.sample()
+        self.assertEqual(sampler.usage.processes, 0)
+
+    def test_shared_driver_service_is_not_accounted_to_the_session(self):
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(1)'])
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        driver = FakeServiceDriver(process)
+        driver.shared_service = driver.service
+        self.assertEqual(driver_root_pids(driver), set())
+        sampler = ResourceSampler(driver)
+        sampler.sample()
+        self.assertEqual(sampler.usage.processes, 0)
+
+
+class UrlDriver:  # pylint: disable=too-few-public-methods
+
+    def __init__(self, current_url, page_source=''):
+        self.current_url = current_url
+        self.page_source = page_source
+
+
+class TestLoginProfile(TestCase):
+
+    def test_login_url_carries_the_encoded_continue_target(self):
+        login_url = LIGHTWEIGHT_PROFILE.login_url
+        self.assertTrue(login_url.startswith(SIGN_IN_URL + '?'))
+        self.assertIn('continue=https%3A%2F%2Fwww.google.com%2Frobots.txt', login_url)
+        self.assertNotIn('continue=https://', login_url)
+
+    def test_lightweight_profile_is_logged_in_only_on_the_continue_target(self):
+        self.assertFalse(LIGHTWEIGHT_PROFILE.is_logged_in(UrlDriver(LIGHTWEIGHT_PROFILE.login_url)))
+        self.assertFalse(LIGHTWEIGHT_PROFILE.is_logged_in(UrlDriver('https://www.google.com/')))
+        self.assertTrue(LIGHTWEIGHT_PROFILE.is_logged_in(UrlDriver('https://www.google.com/robots.txt')))
+
+    def test_maps_profile_checks_the_page_source(self):
+        self.assertFalse(MAPS_PROFILE.is_logged_in(UrlDriver(MAPS_PROFILE.continue_url, 'Sign in')))
+        self.assertTrue(MAPS_PROFILE.is_logged_in(UrlDriver(MAPS_PROFILE.continue_url,
+                                                            '<meta content="Find local businesses, view maps and get '
+                                                            'driving directions in Google Maps.">')))
+
+
+class FakeSignInDriver(FakeContextDriver):
+    """A chrome in front of google that accepts the session cookie "valid"
+
+    The sign in page continues to its target only for an accepted session, otherwise the user signs in with
+    "interactive" while the login waits for a navigation. Like google every other page is served to anyone.
+    """
+
+    created = []
+
+    def __init__(self):
+        super(FakeSignInDriver, self).__init__()
+        self.created.append(self)
+        self.contexts['default'] = []
+        self.targets['main'] = 'default'
+        self.commands['Network.setCookies'] = self._set_cookies
+        self.urls = {}
+        self.visits = []
+        self.sign_ins = 0
+        self.quits = 0
+
+    @property
+    def current_url(self):
+        return self.urls.get(self.current_window_handle, 'about:blank')
+
+    def _context_cookies(self):
+        return self.contexts[self.targets[self.current_window_handle]]
+
+    def session_id_cookie(self):
+        return next((cookie['value'] for cookie in self._context_cookies() if cookie['name'] == 'SID'), None)
+
+    def _set_cookies(self, arguments):
+        for cookie in arguments['cookies']:
+            self.add_cookie(cookie)
+        return {}
+
+    def add_cookie(self, cookie):
+        cookies = self._context_cookies()
+        cookies[:] = [existing for existing in cookies if existing['name'] != cookie['name']]
+        cookies.append(dict(cookie, session=True))
+
+    @property
+    def page_source(self):
+        if self.current_url.startswith(SIGN_IN_URL):
+            return 'Sign in'
+        return '<meta content="{}">'.format(LOGGED_IN_HEURISTIC)
+
+    @staticmethod
+    def _continue_url(url):
+        return parse_qs(urlsplit(url).query)['continue'][0]
+
+    def get(self, url):
+        self.visits.append(url)
+        if url.startswith(SIGN_IN_URL) and self.session_id_cookie() == 'valid':
+            url = self._continue_url(url)
+        self.urls[self.current_window_handle] = url
+
+    def wait_for_navigation(self, _):
+        if self.current_url.startswith(SIGN_IN_URL):
+            self.sign_ins += 1
+            self.set_cookie('SID', 'interactive')
+            self.urls[self.current_window_handle] = self._continue_url(self.current_url)
+
+    def get_cookies(self):
+        return [webdriver_cookie(cookie) for cookie in self._context_cookies()]
+
+    def delete_all_cookies(self):
+        del self._context_cookies()[:]
+
+    @staticmethod
+    def execute_script(*_):
+        return [0, 0, 0]
+
+    def close(self):
+        pass
+
+    def quit(self):
+        self.quits += 1
+
+
+class TestReseed(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cookie_file = os.path.join(self.directory, 'account.cookies')
+        FakeSignInDriver.created = []
+        self.getter = CookieGetter(login_profile=LIGHTWEIGHT_PROFILE,
+                                   browser='chrome',
+                                   user_data_root=self.directory,
+                                   driver_factory=FakeSignInDriver,
+                                   resource_sampling_interval=None)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _save_session_cookie(self, value, cookie_file=None):
+        cookie_jar = RequestsCookieJar()
+        cookie_jar.set('SID', value, domain='.google.com', path='/')
+        save_cookie_jar(cookie_jar, cookie_file or self.cookie_file)
+
+    def test_accepted_cookies_skip_the_interactive_login(self):
+        self._save_session_cookie('valid')
+        result = self.getter.run(self.cookie_file, reseed=True)
+        self.assertEqual(result.cookie_jar.get('SID'), 'valid')
+        self.assertEqual(FakeSignInDriver.created[0].sign_ins, 0)
+
+    def test_rejected_cookies_fall_back_to_the_interactive_login(self):
+        self._save_session_cookie('stale')
+        result = self.getter.run(self.cookie_file, reseed=True)
+        self.assertEqual(result.cookie_jar.get('SID'), 'interactive')
+        self.assertEqual(FakeSignInDriver.created[0].sign_ins, 1)
+
+    def test_rejected_cookies_are_not_accepted_by_the_built_in_profiles(self):
+        for login_profile in (MAPS_PROFILE, LIGHTWEIGHT_PROFILE):
+            FakeSignInDriver.created = []
+            self._save_session_cookie('stale')
+            getter = CookieGetter(login_profile=login_profile,
+                                  browser='chrome',
+                                  user_data_root=self.directory,
+                                  driver_factory=FakeSignInDriver)
+            result = getter.run(self.cookie_file, reseed=True)
+            self.assertEqual(result.cookie_jar.get('SID'), 'interactive')
+            self.assertEqual(FakeSignInDriver.created[0].sign_ins, 1)
+
+    def test_cookies_the_browser_refuses_fall_back_to_the_interactive_login(self):
+        self._save_session_cookie('valid')
+        driver = FakeSignInDriver()
+        driver.commands['Network.setCookies'] = CrashingSignInDriver.refuse_cookies
+        driver.add_cookie = CrashingSignInDriver.refuse_cookies
+        harvest_session = HarvestSession(self.getter.configuration, self.cookie_file, driver=driver)
+        harvest_session.harvest(reseed=True)
+        self.assertEqual(harvest_session.session.cookies.get('SID'), 'interactive')
+        self.assertEqual(driver.sign_ins, 1)
+
+    def test_rejected_cookies_in_a_preloaded_browser_reload_the_sign_in_page(self):
+        self._save_session_cookie('stale')
+        driver = FakeSignInDriver()
+        driver.get(LIGHTWEIGHT_PROFILE.login_url)
+        driver.preloaded_url = LIGHTWEIGHT_PROFILE.login_url
+        harvest_session = HarvestSession(self.getter.configuration, self.cookie_file, driver=driver)
+        harvest_session.harvest(reseed=True)
+        self.assertEqual(harvest_session.session.cookies.get('SID'), 'interactive')
+        self.assertEqual(driver.visits.count(LIGHTWEIGHT_PROFILE.login_url), 3)
+
+    def test_accounts_sharing_a_browser_are_reseeded_in_their_own_context(self):
+        self._save_session_cookie('valid')
+        stale_cookie_file = os.path.join(self.directory, 'stale.cookies')
+        self._save_session_cookie('stale', stale_cookie_file)
+        results = self.getter.run_accounts({'valid': self.cookie_file, 'stale': stale_cookie_file}, reseed=True)
+        self.assertEqual(results['valid'].cookie_jar.get('SID'), 'valid')
+        self.assertEqual(results['stale'].cookie_jar.get('SID'), 'interactive')
+        self.assertEqual(FakeSignInDriver.created[0].sign_ins, 1)
+
+
+class FakeChromeDriverProcess:
+    """The process of a fake chromedriver service"""
+
+    def __init__(self):
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+
+class FakeChromeDriverService:
+    """A started chromedriver service that only records if it was stopped"""
+
+    def __init__(self, port):
+        self.service_url = 'http://localhost:{port}'.format(port=port)
+        self.process = FakeChromeDriverProcess()
+
+    def stop(self):
+        self.process.returncode = 0
+
+
+class UnresponsiveSharedService(SharedChromeDriverService):
+    """A shared service whose chromedriver answers its status endpoint only when told to"""
+
+    def __init__(self):
+        super(UnresponsiveSharedService, self).__init__()
+        self.ports = count(9515)
+        self.responding = True
+
+    def _start_service(self):
+        return FakeChromeDriverService(next(self.ports))
+
+    def is_responding(self):
+        return self.responding
+
+
+class TestSharedChromeDriverService(TestCase):
+
+    def test_unresponsive_service_is_kept_while_sessions_are_attached(self):
+        service = UnresponsiveSharedService()
+        first_url = service.attach()
+        service.responding = False
+        self.assertEqual(service.attach(), first_url)
+        self.assertEqual(service.sessions, 2)
+        service.detach()
+        service.detach()
+        self.assertNotEqual(service.attach(), first_url)
+        self.assertEqual(service.sessions, 1)
+
+    def test_dead_service_is_restarted(self):
+        service = UnresponsiveSharedService()
+        first_url = service.attach()
+        service.process.returncode = 1
+        self.assertNotEqual(service.attach(), first_url)
+        service.stop()
+        self.assertIsNone(service.process)
+
+    def test_chrome_sessions_of_a_cookie_getter_share_its_service(self):
+        directory = tempfile.mkdtemp()
+        try:
+            getter = CookieGetter(browser='chrome', user_data_root=directory, sinks=[RecordingSink()])
+            self.assertIsInstance(getter.configuration.driver_service, SharedChromeDriverService)
+            getter.close()
+            fake_getter = CookieGetter(browser='chrome', user_data_root=directory, driver_factory=FakeSignInDriver)
+            self.assertIsNone(fake_getter.configuration.driver_service)
+        finally:
+            shutil.rmtree(directory)
+
+
+FAKE_CHROME = '''
+import json
+import os
+import select
+import sys
+import time
+
+assert sys.argv[1] == '--remote-debugging-pipe'
+assert sum(argument.startswith('--user-data-dir=') for argument in sys.argv) <= 1
+navigations = []
+location = 'about:blank'
+
+
+def send(*messages, pause=0):
+    data = b''.join(json.dumps(message).encode('utf-8') + b'\\0' for message in messages)
+    if pause:
+        os.write(4, data[:len(data) // 2])
+        time.sleep(pause)
+        data = data[len(data) // 2:]
+    os.write(4, data)
+
+
+def load(loader_id):
+    return {'method': 'Page.lifecycleEvent', 'sessionId': 'session-1',
+            'params': {'frameId': 'page-1', 'loaderId': loader_id, 'name': 'load'}}
+
+
+buffer, pending_load = b'', None
+while True:
+    if pending_load is not None and time.time() >= pending_load[0]:
+        location = pending_load[2]
+        send(load(pending_load[1]))
+        pending_load = None
+    if not select.select([3], [], [], 0.05)[0]:
+        continue
+    chunk = os.read(3, 65536)
+    if not chunk:
+        break
+    buffer += chunk
+    *messages, buffer = buffer.split(b'\\0')
+    for message in map(json.loads, messages):
+        method, reply = message['method'], {'id': message['id'], 'result': {}}
+        if method == 'Test.exit' or method == 'Browser.close':
+            sys.exit(0)
+        elif method == 'Test.split':
+            send(reply, pause=0.1)
+        elif method == 'Test.fail':
+            send({'id': message['id'], 'error': {'message': 'no such method'}})
+        elif method == 'Test.event':
+            send({'method': 'Test.happened', 'params': message['params']}, reply)
+        elif method == 'Target.getTargets':
+            reply['result'] = {'targetInfos': [{'targetId': 'page-1', 'type': 'page'}]}
+            send(reply)
+        elif method == 'Target.attachToTarget':
+            reply['result'] = {'sessionId': 'session-1'}
+            send(reply)
+        elif method == 'Page.navigate':
+            navigations.append(message['params']['url'])
+            loader_id = 'loader-{}'.format(len(navigations))
+            reply['result'] = {'frameId': 'page-1', 'loaderId': loader_id}
+            send(load('loader-previous'), reply)
+            pending_load = (time.time() + 0.2, loader_id, message['params']['url'])
+        elif method == 'Runtime.evaluate':
+            value = location if 'location' in message['params']['expression'] else 'complete'
+            reply['result'] = {'result': {'value': value}}
+            send(reply)
+        else:
+            send(reply)
+'''
+
+
+@skipUnless(sys.platform != 'win32', 'remote debugging over a pipe is not supported on windows')
+class TestDevToolsPipe(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.binary = os.path.join(self.directory, 'chrome')
+        with open(self.binary, 'w') as binary:
+            binary.write('#!{interpreter}\n{script}'.format(interpreter=sys.executable, script=FAKE_CHROME))
+        os.chmod(self.binary, 0o755)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_messages_are_framed_by_null_bytes(self):
+        pipe = DevToolsPipe([], binary=self.binary)
+        events = []
+        pipe.add_listener(events.append)
+        self.assertEqual(pipe.send('Test.split'), {})
+        self.assertEqual(pipe.send('Test.event', {'text': 'with\nnewlines'}), {})
+        self.assertEqual(events, [{'method': 'Test.happened', 'params': {'text': 'with\nnewlines'}}])
+        with self.assertRaises(WebDriverException):
+            pipe.send('Test.fail')
+        pipe.close()
+
+    def test_closed_browser_fails_pending_commands(self):
+        pipe = DevToolsPipe([], binary=self.binary)
+        with self.assertRaises(NoSuchWindowException):
+            pipe.send('Test.exit', timeout=5)
+        self.assertTrue(pipe.closed)
+        pipe.close()
+
+    def test_navigation_waits_for_the_new_document(self):
+        driver = DevToolsChrome(['--user-data-dir=/ignored'], binary=self.binary, user_data_dir=self.directory)
+        driver.get('https://accounts.google.com/')
+        self.assertEqual(driver.current_url, 'https://accounts.google.com/')
+        driver.quit()
+
+
+class WebSocketServer(Thread):
+    """A websocket server accepting a single connection and handing it to a script once the handshake is done"""
+
+    def __init__(self, script, accept_key=None):
+        super(WebSocketServer, self).__init__(daemon=True)
+        self._script = script
+        self._accept_key = accept_key
+        self._listener = socket.socket()
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(1)
+        self.url = 'ws://127.0.0.1:{port}/session/bidi'.format(port=self._listener.getsockname()[1])
+        self.received = []
+        self.start()
+
+    def run(self):
+        connection, _ = self._listener.accept()
+        with connection, self._listener:
+            request = b''
+            while b'\r\n\r\n' not in request:
+                request += connection.recv(4096)
+            key = next(line.split(b':', 1)[1].strip() for line in request.split(b'\r\n')
+                       if line.lower().startswith(b'sec-websocket-key:')).decode('ascii')
+            accept = self._accept_key or base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii'))
+                                                          .digest()).decode('ascii')
+            connection.sendall('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                               'Sec-WebSocket-Accept: {accept}\r\n\r\n'.format(accept=accept).encode('ascii'))
+            self._script(self, connection)
+
+    @staticmethod
+    def frame(opcode, payload, final=True):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', opcode | (0x80 if final else 0), length)
+        elif length < 65536:
+            header = struct.pack('!BBH', opcode | (0x80 if final else 0), 126, length)
+        else:
+            header = struct.pack('!BBQ', opcode | (0x80 if final else 0), 127, length)
+        return header + payload
+
+    def receive(self, connection):
+        def exactly(size):
+            data = b''
+            while len(data) < size:
+                chunk = connection.recv(size - len(data))
+                if not chunk:
+                    raise EOFError
+                data += chunk
+            return data
+        first, second = exactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', exactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', exactly(8))[0]
+        mask = exactly(4) if second & 0x80 else None
+        payload = exactly(length)
+        if mask:
+            payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        self.received.append((first & 0x0F, mask is not None, payload))
+        return first & 0x0F, payload
+
+
+class TestWebSocket(TestCase):
+
+    def test_client_frames_are_masked_and_length_encoded(self):
+        messages = ['short', 'm' * 300, 'l' * 70000]
+
+        def echo(server, connection):
+            for _ in messages:
+                _, payload = server.receive(connection)
+                connection.sendall(server.frame(0x1, payload))
+
+        server = WebSocketServer(echo)
+        websocket = WebSocket(server.url)
+        for message in messages:
+            websocket.send(message)
+            self.assertEqual(websocket.receive(), message)
+        websocket.close()
+        server.join(5)
+        self.assertTrue(all(masked for _, masked, _ in server.received))
+        self.assertEqual([payload.decode('utf-8') for _, _, payload in server.received[:3]], messages)
+
+    def test_fragmented_message_is_reassembled_around_a_ping(self):
+        def fragments(server, connection):
+            connection.sendall(server.frame(0x1, 'καλη'.encode('utf-8')[:3], final=False) +
+                               server.frame(0x9, b'ping') +
+                               server.frame(0x0, 'καλη'.encode('utf-8')[3:]))
+            server.receive(connection)
+
+        server = WebSocketServer(fragments)
+        websocket = WebSocket(server.url)
+        self.assertEqual(websocket.receive(), 'καλη')
+        server.join(5)
+        self.assertEqual(server.received, [(0xA, True, b'ping')])
+        websocket.close()
+
+    def test_close_frame_is_answered_and_raises(self):
+        def close(server, connection):
+            connection.sendall(server.frame(0x8, struct.pack('!H', 1000)))
+            server.receive(connection)
+
+        server = WebSocketServer(close)
+        websocket = WebSocket(server.url)
+        with self.assertRaises(WebSocketClosed):
+            websocket.receive()
+        server.join(5)
+        self.assertEqual(server.received, [(0x8, True, struct.pack('!H', 1000))])
+        websocket.close()
+
+    def test_invalid_accept_key_fails_the_handshake(self):
+        server = WebSocketServer(lambda server, connection: None, accept_key='invalid')
+        with self.assertRaises(WebSocketClosed):
+            WebSocket(server.url)
+        server.join(5)
+
+
+class FakeRemoteDriver:
+    """Records the new session payload the way a selenium driver sends it"""
+
+    def __init__(self):
+        self.payload = None
+        self.capabilities = self.execute('newSession', {'capabilities': {'firstMatch': [{}], 'alwaysMatch': {}}})
+
+    def execute(self, _, params=None):
+        self.payload = params
+        return {}
+
+
+class FakeBiDiDriver(BiDiSession, FakeRemoteDriver):
+    """A driver without a bidi websocket"""
+
+
+class TestBiDiSession(TestCase):
+
+    def test_new_session_asks_for_a_websocket_url(self):
+        driver = FakeBiDiDriver()
+        self.assertTrue(driver.payload['capabilities']['alwaysMatch']['webSocketUrl'])
+        self.assertIsNone(driver.bidi)
+
+
+class CrashingSignInDriver(FakeSignInDriver):
+    """A chrome whose sign in page fails with the configured exception"""
+
+    error = RuntimeError('renderer crashed')
+
+    @staticmethod
+    def refuse_cookies(*_):
+        raise WebDriverException('invalid cookie domain')
+
+    def get(self, url):
+        if url == LIGHTWEIGHT_PROFILE.login_url:
+            raise self.error
+        super(CrashingSignInDriver, self).get(url)
+
+
+class TestBrowserTermination(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        FakeSignInDriver.created = []
+        CrashingSignInDriver.error = RuntimeError('renderer crashed')
+        self.getter = CookieGetter(login_profile=LIGHTWEIGHT_PROFILE,
+                                   browser='chrome',
+                                   user_data_root=self.directory,
+                                   driver_factory=CrashingSignInDriver,
+                                   sinks=[RecordingSink()],
+                                   resource_sampling_interval=None)
+        self.accounts = {'first': os.path.join(self.directory, 'first.cookies'),
+                         'second': os.path.join(self.directory, 'second.cookies')}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _quits(self):
+        return [driver.quits for driver in FakeSignInDriver.created]
+
+    def test_failed_harvest_terminates_its_browser(self):
+        with self.assertRaises(RuntimeError):
+            self.getter.run(None)
+        self.assertEqual(self._quits(), [1])
+
+    def test_closed_window_terminates_its_browser(self):
+        CrashingSignInDriver.error = NoSuchWindowException('window closed')
+        self.assertIsNone(self.getter.run(None))
+        self.assertEqual(self._quits(), [1])
+
+    def test_failed_batch_terminates_the_browser_of_the_failed_account(self):
+        with self.assertRaises(RuntimeError):
+            self.getter.run_batch(self.accounts)
+        self.assertEqual(self._quits(), [1])
+
+    def test_failed_shared_browser_is_terminated(self):
+        with self.assertRaises(RuntimeError):
+            self.getter.run_accounts(self.accounts)
+        self.assertEqual(self._quits(), [1])
+
+
+class FlakyBrowserFactory:
+    """Launches fake browsers after failing to launch the first and to load the sign in page in the second"""
+
+    def __init__(self):
+        self.launches = 0
+        self.drivers = []
+
+    def __call__(self):
+        self.launches += 1
+        if self.launches == 1:
+            raise AdmissionTimeout('no memory headroom')
+        driver = FakeSignInDriver()
+        if self.launches == 2:
+            driver.get = self._fail
+        self.drivers.append(driver)
+        return driver
+
+    @staticmethod
+    def _fail(_):
+        raise WebDriverException('chrome not reachable')
+
+
+class TestDriverPool(TestCase):
+
+    def test_pool_survives_failed_launches_and_terminates_broken_browsers(self):
+        factory = FlakyBrowserFactory()
+        with DriverPool(factory, LIGHTWEIGHT_PROFILE.login_url) as pool:
+            driver = pool.acquire(timeout=10)
+            self.assertIs(driver, factory.drivers[1])
+            self.assertEqual(driver.preloaded_url, LIGHTWEIGHT_PROFILE.login_url)
+            self.assertEqual(factory.drivers[0].quits, 1)
+            pool.release(driver)
+
+    def test_pool_launches_no_more_browsers_than_will_be_acquired(self):
+        launched = []
+
+        def factory():
+            launched.append(FakeSignInDriver())
+            return launched[-1]
+
+        with DriverPool(factory, LIGHTWEIGHT_PROFILE.login_url, size=3, demand=2) as pool:
+            drivers = [pool.acquire(timeout=10) for _ in range(2)]
+            sleep(0.2)
+            self.assertEqual(launched, drivers)
+
+    def test_resumed_batch_with_nothing_left_launches_no_browser(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        FakeSignInDriver.created = []
+        getter = CookieGetter(login_profile=LIGHTWEIGHT_PROFILE,
+                              browser='chrome',
+                              user_data_root=directory,
+                              driver_factory=FakeSignInDriver)
+        accounts = {'account': os.path.join(directory, 'account.cookies')}
+        journal = HarvestJournal(os.path.join(directory, 'batch.journal'))
+        journal.schedule(accounts)
+        journal.complete('account')
+        self.assertEqual(getter.run_batch(accounts, preloaded_browsers=2, journal=journal), {})
+        self.assertEqual(FakeSignInDriver.created, [])
+
+
+class TestChromeArguments(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.seed = os.path.join(self.directory, 'seed')
+        os.makedirs(os.path.join(self.seed, 'Cache_Data'))
+        with open(os.path.join(self.seed, 'Cache_Data', 'index'), 'w') as index:
+            index.write('warm')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_seeded_cache_is_the_disk_cache_of_chrome(self):
+        user_data = UserDataDirectory(self.directory, max_size=1024, cache_seed=self.seed)
+        arguments = chrome_arguments(user_data)
+        self.assertNotIn('--incognito', arguments)
+        self.assertIn('--user-data-dir={}'.format(user_data.path), arguments)
+        cache_path = next(argument.split('=', 1)[1] for argument in arguments
+                          if argument.startswith('--disk-cache-dir='))
+        with open(os.path.join(cache_path, 'Cache_Data', 'index')) as index:
+            self.assertEqual(index.read(), 'warm')
+        user_data.cleanup()
+
+
+class TestCookieJarFreshness(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cookie_file = os.path.join(self.directory, 'account.cookies')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _save(self, expires):
+        cookie_jar = RequestsCookieJar()
+        for name in AUTH_COOKIE_NAMES:
+            cookie_jar.set(name, 'value', domain='.google.com', path='/', expires=expires)
+        save_cookie_jar(cookie_jar, self.cookie_file)
+
+    def test_expiry_within_the_margin_is_stale(self):
+        self._save(int(time()) + 3600)
+        self.assertTrue(is_cookie_jar_fresh(self.cookie_file, margin=60))
+        self.assertFalse(is_cookie_jar_fresh(self.cookie_file, margin=7200))
+
+    def test_unknown_expiry_is_stale_without_a_maximum_age(self):
+        self._save(None)
+        self.assertFalse(is_cookie_jar_fresh(self.cookie_file, margin=60))
+
+    def test_unknown_expiry_falls_back_to_the_age_of_the_file(self):
+        self._save(None)
+        self.assertTrue(is_cookie_jar_fresh(self.cookie_file, margin=60, max_age=3600))
+        self.assertFalse(is_cookie_jar_fresh(self.cookie_file, margin=7200, max_age=3600))
+        modified = time() - 3000
+        os.utime(self.cookie_file, (modified, modified))
+        self.assertFalse(is_cookie_jar_fresh(self.cookie_file, margin=3600, max_age=3600))
+
+    def test_verified_cookies_are_fresh_without_touching_the_jar(self):
+        self._save(None)
+        modified = time() - 7200
+        os.utime(self.cookie_file, (modified, modified))
+        self.assertFalse(is_cookie_jar_fresh(self.cookie_file, margin=60, max_age=3600))
+        mark_verified(self.cookie_file)
+        self.assertTrue(is_cookie_jar_fresh(self.cookie_file, margin=60, max_age=3600))
+        self.assertEqual(os.path.getmtime(self.cookie_file), modified)
+
+
+class TestCookieFileLocking(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        FakeSignInDriver.created = []
+        self.getter = CookieGetter(login_profile=LIGHTWEIGHT_PROFILE,
+                                   browser='chrome',
+                                   user_data_root=self.directory,
+                                   driver_factory=FakeSignInDriver)
+        self.cookie_file = os.path.join(self.directory, 'account.cookies')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _assert_waits_for_the_lock(self, function, *args, **kwargs):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with HarvestLock(self.cookie_file):
+                harvest = executor.submit(function, *args, **kwargs)
+                sleep(0.3)
+                self.assertFalse(harvest.done())
+                self.assertFalse(os.path.exists(self.cookie_file))
+            harvest.result(timeout=10)
+        self.assertEqual(load_cookie_jar(self.cookie_file).get('SID'), 'interactive')
+
+    def test_batch_waits_for_the_harvest_of_the_same_cookie_file(self):
+        self._assert_waits_for_the_lock(self.getter.run_batch, {'account': self.cookie_file})
+
+    def test_accounts_sharing_a_browser_wait_for_the_harvest_of_the_same_cookie_file(self):
+        self._assert_waits_for_the_lock(self.getter.run_accounts, {'account': self.cookie_file})
+
+    def test_worker_harvest_waits_for_the_harvest_of_the_same_cookie_file(self):
+        self._assert_waits_for_the_lock(self.getter.run_account, 'account', self.cookie_file)
+
+
+class ThirdLoginCrashesDriver(FakeSignInDriver):
+    """A chrome whose sign in page fails in the third browser launched"""
+
+    def get(self, url):
+        if url == LIGHTWEIGHT_PROFILE.login_url and FakeSignInDriver.created.index(self) == 2:
+            raise RuntimeError('renderer crashed')
+        super(ThirdLoginCrashesDriver, self).get(url)
+
+    @staticmethod
+    def fail_to_write(_):
+        raise OSError('disk full')
+
+
+class TestFailedBatch(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        FakeSignInDriver.created = []
+        self.sink = RecordingSink()
+        self.getter = CookieGetter(login_profile=LIGHTWEIGHT_PROFILE,
+                                   browser='chrome',
+                                   user_data_root=self.directory,
+                                   driver_factory=ThirdLoginCrashesDriver,
+                                   sinks=[self.sink],
+                                   resource_sampling_interval=None)
+        self.accounts = OrderedDict((account, os.path.join(self.directory, '{}.cookies'.format(account)))
+                                    for account in 'abcd')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_results_harvested_before_a_failure_are_written(self):
+        with self.assertRaises(RuntimeError):
+            self.getter.run_batch(self.accounts)
+        self.assertEqual([sorted(result.account for result in batch) for batch in self.sink.batches], [['a', 'b']])
+
+    def test_accounts_are_journaled_once_their_cookies_are_written(self):
+        journal = HarvestJournal(os.path.join(self.directory, 'batch.journal'))
+        with self.assertRaises(RuntimeError):
+            self.getter.run_batch(self.accounts, journal=journal)
+        states = {account: job.state for account, job in HarvestJournal(journal.path).jobs.items()}
+        self.assertEqual(states, {'a': COMPLETED, 'b': COMPLETED, 'c': FAILED, 'd': QUEUED})
+
+    def test_accounts_whose_batch_was_not_written_are_harvested_again(self):
+        self.sink.write_batch = ThirdLoginCrashesDriver.fail_to_write
+        journal = HarvestJournal(os.path.join(self.directory, 'batch.journal'))
+        with self.assertRaises(OSError):
+            self.getter.run_batch(self.accounts, journal=journal)
+        journal = HarvestJournal(journal.path)
+        self.assertEqual({account: job.state for account, job in journal.jobs.items()},
+                         {'a': RUNNING, 'b': RUNNING, 'c': FAILED, 'd': QUEUED})
+        self.assertEqual(list(journal.schedule(self.accounts, now=0)), ['a', 'b', 'd'])